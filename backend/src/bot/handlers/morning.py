@@ -35,8 +35,9 @@ from src.bot.keyboards import (
 )
 from src.bot.states import AntipanicSession
 from src.core.use_cases.assign_morning_steps import assign_morning_steps_use_case
-from src.database.models import Goal, Stage, User
+from src.database.models import Goal, User
 from src.services.session import support_message
+from src.storage import goal_repo
 
 logger = logging.getLogger(__name__)
 
@@ -70,7 +71,7 @@ async def _get_or_create_onboarding_sprint_goal(user: User) -> Goal:
         deadline=deadline,
         status="onboarding",
     )
-    await Stage.create(
+    await goal_repo.create_stage(
         goal=goal,
         title="Мини-спринт",
         order=1,
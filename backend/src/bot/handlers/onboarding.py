@@ -19,8 +19,9 @@ from aiogram.types import Message
 
 from src.bot.keyboards import main_menu_keyboard
 from src.bot.states import OnboardingStates
-from src.database.models import Goal, Stage, User
+from src.database.models import Goal, User
 from src.services.reminders import setup_user_reminders
+from src.storage import goal_repo
 
 logger = logging.getLogger(__name__)
 
@@ -130,7 +131,7 @@ async def process_deadline(message: Message, state: FSMContext) -> None:
     )
 
     # AICODE-NOTE: Создаём 1 дефолтный этап "Начало" на весь срок
-    await Stage.create(
+    await goal_repo.create_stage(
         goal=goal,
         title="Начало",
         order=1,
@@ -20,6 +20,7 @@ from src.bot.keyboards import main_menu_keyboard
 from src.bot.states import OnboardingStates
 from src.config import config
 from src.database.models import Goal, User
+from src.storage import user_repo
 
 router = Router()
 
@@ -35,14 +36,11 @@ async def get_or_create_user(message: Message) -> User:
     if not message.from_user:
         raise ValueError("No user in message")
 
-    user, _ = await User.get_or_create(
+    return await user_repo.get_or_create_user(
         telegram_id=message.from_user.id,
-        defaults={
-            "username": message.from_user.username,
-            "first_name": message.from_user.first_name,
-        },
+        username=message.from_user.username,
+        first_name=message.from_user.first_name,
     )
-    return user
 
 
 @router.message(CommandStart())
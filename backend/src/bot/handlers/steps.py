@@ -42,9 +42,9 @@ from src.bot.states import (
 )
 from src.core.use_cases.complete_step import CompleteStepUseCase
 from src.core.use_cases.skip_step import SkipStepUseCase
-from src.database.models import DailyLog, Goal, Step, User
+from src.database.models import Goal, Step, User
 from src.services import session as session_service
-from src.storage import user_repo
+from src.storage import daily_log_repo, user_repo
 
 logger = logging.getLogger(__name__)
 
@@ -104,12 +104,9 @@ async def step_done(
     is_antipanic_micro = current_state == AntipanicSession.doing_micro_action
 
     # 4. Обновляем сообщение и показываем результат
-    today = date.today()
-    daily_log = await DailyLog.get_or_none(user=user, date=today)
-    assigned_ids = daily_log.assigned_step_ids if daily_log else []
+    steps = await daily_log_repo.get_day_steps(user, date.today())
 
-    if assigned_ids:
-        steps = await Step.filter(id__in=assigned_ids)
+    if steps:
         steps_text = "\n".join(
             f"{'✅' if s.status == 'completed' else '⬜'} {s.title}" for s in steps
         )
@@ -145,7 +142,8 @@ async def step_done(
                 from src.bot.keyboards import rating_keyboard
 
                 completed_steps = [s for s in steps if s.status == "completed"]
-                xp_earned = daily_log.xp_earned or 0
+                daily_log = await daily_log_repo.get_daily_log(user, date.today())
+                xp_earned = (daily_log.xp_earned or 0) if daily_log else 0
 
                 await callback.message.edit_text(
                     f"🌙 *Итоги дня*\n\n"
@@ -336,12 +334,9 @@ async def process_skip_reason(message: Message, state: FSMContext) -> None:
     await state.clear()
 
     # 3. Показываем обновлённый список
-    today = date.today()
-    daily_log = await DailyLog.get_or_none(user=user, date=today)
-    assigned_ids = daily_log.assigned_step_ids if daily_log else []
+    steps = await daily_log_repo.get_day_steps(user, date.today())
 
-    if assigned_ids:
-        steps = await Step.filter(id__in=assigned_ids)
+    if steps:
 
         def step_icon(status: str) -> str:
             if status == "completed":
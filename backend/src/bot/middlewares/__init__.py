@@ -1,5 +1,6 @@
 # Middlewares
 from .access import AccessMiddleware
 from .error_handler import ErrorHandlingMiddleware
+from .reachability import ReachabilityMiddleware
 
-__all__ = ["AccessMiddleware", "ErrorHandlingMiddleware"]
+__all__ = ["AccessMiddleware", "ErrorHandlingMiddleware", "ReachabilityMiddleware"]
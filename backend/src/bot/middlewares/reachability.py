@@ -0,0 +1,46 @@
+"""
+Reachability Middleware.
+
+Реактивация пользователей, помеченных недоступными рассылкой напоминаний
+(заблокировали бота, удалили чат): любой входящий апдейт от пользователя
+снимает флаг и заново планирует напоминания.
+"""
+
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from src.services import reminders
+
+logger = logging.getLogger(__name__)
+
+
+class ReachabilityMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на уровне Update (видит все типы апдейтов,
+    включая my_chat_member при разблокировке бота).
+
+    Использование:
+        dp.update.outer_middleware(ReachabilityMiddleware())
+
+    AICODE-NOTE: В обычном случае стоит одного чтения по уникальному
+    индексу telegram_id; ошибки БД не должны ломать обработку апдейта.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            try:
+                await reminders.mark_user_reachable(user.id)
+            except Exception as e:
+                logger.warning(f"Reachability check failed for {user.id}: {e}")
+
+        return await handler(event, data)
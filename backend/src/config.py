@@ -50,6 +50,34 @@ class Settings(BaseSettings):
     # Cron token for /cron/tick endpoint (generate random string)
     CRON_TOKEN: SecretStr | None = None
 
+    # Reminders fan-out: параллельные отправки + глобальный лимит Telegram (~30 msg/s)
+    REMINDER_CONCURRENCY: int = 20
+    REMINDER_RATE_LIMIT: float = 28.0
+    REMINDER_MAX_RETRIES: int = 3
+    # Размер страницы due-пользователей и пачки пакетного переназначения
+    REMINDER_BATCH_SIZE: int = 500
+    # Детерминированный сдвиг слота пользователя ±N минут (0 — без сдвига)
+    REMINDER_JITTER_MINUTES: int = 7
+    # Аренда захваченных тиком строк: недоставленное вернётся в due через столько секунд
+    REMINDER_CLAIM_LEASE_SECONDS: int = 600
+    # Outbox доставки: ретраи с экспоненциальным backoff, хранение завершённых
+    REMINDER_OUTBOX_MAX_ATTEMPTS: int = 5
+    REMINDER_RETRY_BASE_SECONDS: int = 60
+    REMINDER_RETRY_MAX_SECONDS: int = 3600
+    REMINDER_OUTBOX_RETENTION_DAYS: int = 14
+    # Догон после простоя: просроченные дольше N минут не отправляются,
+    # только переназначаются (0 — отправлять любые просроченные)
+    REMINDER_STALE_AFTER_MINUTES: int = 180
+    # Сколько шардов (telegram_id % N) /cron/tick обрабатывает параллельно
+    REMINDER_SHARDS: int = 1
+    # In-process планировщик вместо внешнего /cron/tick (выключен по умолчанию).
+    # В памяти держатся только напоминания ближайших HORIZON минут.
+    REMINDER_SCHEDULER_ENABLED: bool = False
+    REMINDER_SCHEDULER_HORIZON_MINUTES: int = 60
+    # Шард этой реплики для планировщика (telegram_id % REMINDER_SHARDS);
+    # None — планировщик обслуживает всех пользователей
+    REMINDER_SCHEDULER_SHARD: int | None = None
+
     # Telegram Mini App (TMA) URL
     TMA_URL: str | None = None
 
@@ -7,11 +7,21 @@ AICODE-NOTE: Чистые функции БЕЗ доступа к БД, БЕЗ s
 Extracted from handlers/evening.py for TMA migration Stage 2.4.
 """
 
-from src.database.models import DailyLog, Step
+from collections.abc import Sequence
+from typing import Protocol
+
+from src.database.models import DailyLog
+
+
+class StepView(Protocol):
+    """Шаг дня: модель Step или проекция daily_log_repo.DayStep."""
+
+    title: str
+    status: str
 
 
 def calculate_daily_progress(
-    daily_log: DailyLog | None, steps: list[Step]
+    daily_log: DailyLog | None, steps: Sequence[StepView]
 ) -> dict[str, int]:
     """
     Рассчитать статистику дня.
@@ -43,7 +53,7 @@ def calculate_daily_progress(
     }
 
 
-def format_steps_summary(steps: list[Step]) -> str:
+def format_steps_summary(steps: Sequence[StepView]) -> str:
     """
     Форматировать список шагов с эмодзи-отметками.
 
@@ -0,0 +1,33 @@
+"""
+Stage Rules Domain - прогресс и статус этапа по счётчикам шагов.
+
+AICODE-NOTE: Чистые функции БЕЗ доступа к БД, БЕЗ side-effects.
+Считают по Stage.total_count/completed_count/skipped_count, без загрузки
+шагов этапа.
+"""
+
+from src.database.models import Goal, Stage
+
+
+def calculate_stage_progress(stage: Stage) -> int:
+    """Прогресс этапа 0-100: доля выполненных шагов."""
+    if stage.total_count <= 0:
+        return 0
+    return min(100, int(stage.completed_count / stage.total_count * 100))
+
+
+def next_stage_status(stage: Stage, goal: Goal) -> str:
+    """
+    Статус этапа после выполнения или пропуска шага.
+
+    Правила:
+    - Все шаги завершены (completed/skipped) и хотя бы один выполнен →
+      completed (онбординговый этап остаётся active: в него добавляют шаги)
+    - pending-этап с выполненным шагом становится active
+    """
+    finished = stage.completed_count + stage.skipped_count
+    if finished >= stage.total_count and stage.completed_count > 0:
+        return "completed" if goal.status != "onboarding" else "active"
+    if stage.status == "pending" and stage.completed_count > 0:
+        return "active"
+    return stage.status
@@ -22,7 +22,7 @@ from src.core.domain.step_generation import (
 )
 from src.database.models import Goal, Stage, Step, User
 from src.services.ai import ai_service
-from src.storage import daily_log_repo, goal_repo, step_repo
+from src.storage import daily_log_repo, goal_repo, stage_repo, step_repo
 
 logger = logging.getLogger(__name__)
 
@@ -71,38 +71,30 @@ class AssignMorningStepsUseCase:
 
     async def ensure_active_stage(self, goal: Goal) -> StageEnsureResult:
         """
-        Ensure goal has exactly one active stage.
+        Ensure goal has an active stage.
 
         Handles:
-        - Multiple active stages (keeps latest, marks others pending)
         - Auto-complete stages at 100% progress (except onboarding goals)
         - Auto-activate next pending stage
         - Create default stage if none exist
         - Mark goal completed when all stages done
 
+        The active stage comes from the Goal.active_stage_id pointer (one
+        primary-key fetch on the common path). Repairing goals with several
+        active stages is done by scripts/check_stages, not here.
+
         Args:
             goal: Goal instance
 
         Returns:
             StageEnsureResult with active stage or error
         """
-        # Get all active stages
-        active_stages = await goal_repo.get_all_active_stages(goal)
-        current = active_stages[0] if active_stages else None
-
-        # Fix multiple active stages
-        if len(active_stages) > 1:
-            logger.warning(
-                f"Goal {goal.id} has {len(active_stages)} active stages, keeping latest"
-            )
-            stale_stages = active_stages[1:]
-            for stage in stale_stages:
-                await goal_repo.update_stage_status(stage, "pending")
+        current = await goal_repo.get_active_stage(goal)
 
         # Auto-complete stage at 100% progress (except onboarding)
         if current and current.progress >= 100:
             if goal.status != "onboarding":
-                current = await goal_repo.update_stage_status(current, "completed")
+                await goal_repo.update_stage_status(current, "completed")
                 current = None  # Need to find next stage
             # Onboarding goals keep adding steps to same stage
 
@@ -142,16 +134,19 @@ class AssignMorningStepsUseCase:
                     ):
                         # Mark goal as completed
                         goal.status = "completed"
-                        await goal_repo.save_goal(goal)
+                        await goal_repo.save_goal(goal, ["status"])
                         return StageEnsureResult(
                             success=False,
                             error_message="Все этапы цели завершены! Цель выполнена.",
                         )
-                    # Should not reach here, but return error
-                    return StageEnsureResult(
-                        success=False,
-                        error_message="Нет активных или ожидающих этапов",
-                    )
+                    # Active stage without a pointer (written outside the
+                    # repositories) - repair this goal, off the common path
+                    current = await stage_repo.repair_active_stage(goal.id)
+                    if not current:
+                        return StageEnsureResult(
+                            success=False,
+                            error_message="Нет активных или ожидающих этапов",
+                        )
 
         if not current:
             return StageEnsureResult(
@@ -159,6 +154,8 @@ class AssignMorningStepsUseCase:
                 error_message="Не удалось получить активный этап",
             )
 
+        # Keep the in-memory pointer fresh for the second call in the session
+        goal.active_stage_id = current.id
         return StageEnsureResult(success=True, stage=current)
 
     async def get_body_micro_action(self, user: User) -> str:
@@ -213,6 +210,8 @@ class AssignMorningStepsUseCase:
         energy_hint = energy_from_tension(tension)
         step = await step_repo.create_step(
             stage_id=stage.id,
+            goal_id=goal.id,
+            user_id=goal.user_id,
             title=action_text,
             difficulty="easy",
             estimated_minutes=2,
@@ -329,6 +328,8 @@ class AssignMorningStepsUseCase:
         # 4. Create step
         step = await step_repo.create_step(
             stage_id=stage.id,
+            goal_id=goal.id,
+            user_id=goal.user_id,
             title=step_title,
             difficulty=difficulty,
             estimated_minutes=minutes,
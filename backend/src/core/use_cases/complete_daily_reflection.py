@@ -18,7 +18,9 @@ from src.core.domain.reflection_rules import (
     format_steps_summary,
     format_streak_text,
 )
-from src.database.models import DailyLog, Step, User
+from src.database.models import DailyLog, User
+from src.storage import daily_log_repo, user_repo
+from src.storage.daily_log_repo import DayStep
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,7 @@ class DailySummaryResult:
 
     success: bool
     daily_log: DailyLog | None = None
-    steps: list[Step] | None = None
+    steps: list[DayStep] | None = None
     progress: dict | None = None
     steps_text: str = ""
     has_pending: bool = False
@@ -62,7 +64,7 @@ class CompleteDailyReflectionUseCase:
 
         Steps:
         1. Get DailyLog for today
-        2. Get steps from assigned_step_ids
+        2. Get assigned steps from daily_log_steps
         3. Calculate progress stats
         4. Format steps summary text
 
@@ -74,22 +76,16 @@ class CompleteDailyReflectionUseCase:
             DailySummaryResult with steps, stats, and formatted text
         """
         # Get daily log
-        daily_log = await DailyLog.get_or_none(user=user, date=today)
+        daily_log = await daily_log_repo.get_daily_log(user, today)
 
-        if not daily_log or not daily_log.assigned_step_ids:
-            return DailySummaryResult(
-                success=False,
-                error_message="Сегодня ещё не было старта дня. "
-                "Сначала сделай короткий утренний чек-ин через кнопку «Утро».",
-            )
-
-        # Get steps
-        steps = await Step.filter(id__in=daily_log.assigned_step_ids)
+        # Get steps (one JOIN through daily_log_steps)
+        steps = await daily_log_repo.get_logged_steps(daily_log.id) if daily_log else []
 
         if not steps:
             return DailySummaryResult(
                 success=False,
-                error_message="Не найдены шаги дня.",
+                error_message="Сегодня ещё не было старта дня. "
+                "Сначала сделай короткий утренний чек-ин через кнопку «Утро».",
             )
 
         # Calculate progress
@@ -142,10 +138,9 @@ class CompleteDailyReflectionUseCase:
         # Calculate new streak
         new_streak, streak_increased = calculate_streak(user, today)
 
-        # Update user
-        user.streak_days = new_streak
-        user.streak_last_date = today
-        await user.save()
+        # Update user (conditional: a day already counted keeps its streak)
+        user = await user_repo.update_streak(user, new_streak, today)
+        new_streak = user.streak_days
 
         # Format streak text
         streak_text = format_streak_text(new_streak)
@@ -7,12 +7,14 @@ Handlers вызывают use-case и получают результат.
 
 import logging
 from dataclasses import dataclass
-from datetime import date
+from datetime import date, datetime
 
 from src.core.domain.gamification import calculate_streak, calculate_xp_reward
+from src.core.domain.stage_rules import calculate_stage_progress, next_stage_status
 from src.core.domain.step_rules import can_complete_step
-from src.database.models import User
+from src.database.models import Stage, User
 from src.storage import daily_log_repo, stage_repo, step_repo, user_repo
+from src.storage.unit_of_work import unit_of_work
 
 logger = logging.getLogger(__name__)
 
@@ -49,40 +51,53 @@ class CompleteStepUseCase:
         if today is None:
             today = date.today()
 
-        # 1. Получить шаг
-        step = await step_repo.get_step(step_id)
-        if not step:
-            return StepCompletionResult(success=False, error_message="Шаг не найден")
-
-        # 2. Проверить правила (домейн)
-        if not can_complete_step(step):
-            return StepCompletionResult(
-                success=False,
-                error_message=f"Шаг уже завершен (статус: {step.status})",
-            )
-
-        # 3. Рассчитать XP (домейн)
-        xp_earned = calculate_xp_reward(step)
+        # AICODE-NOTE: Весь сценарий — одна транзакция (unit_of_work):
+        # шаг и этап читаются с блокировкой, изменения этапа пишутся одним
+        # UPDATE, при ошибке откатывается всё (без полу-засчитанных шагов).
+        async with unit_of_work():
+            # 1. Получить шаг (с блокировкой строки)
+            step = await step_repo.get_step_for_update(step_id)
+            if not step:
+                return StepCompletionResult(
+                    success=False, error_message="Шаг не найден"
+                )
 
-        # 4. Рассчитать streak (домейн)
-        new_streak, streak_updated = calculate_streak(user, today)
+            # 2. Проверить правила (домейн)
+            if not can_complete_step(step):
+                return StepCompletionResult(
+                    success=False,
+                    error_message=f"Шаг уже завершен (статус: {step.status})",
+                )
 
-        # 5. Обновить шаг (репозиторий)
-        await step_repo.mark_completed(step)
+            # 3. Рассчитать XP (домейн)
+            xp_earned = calculate_xp_reward(step)
 
-        # 6. Обновить прогресс этапа
-        await self._update_stage_progress(step.stage_id)
+            # 4. Рассчитать streak (домейн)
+            new_streak, streak_updated = calculate_streak(user, today)
 
-        # 7. Обновить DailyLog (репозиторий)
-        daily_log = await daily_log_repo.get_or_create_daily_log(user, today)
-        await daily_log_repo.log_step_completion(daily_log, step, xp_earned)
+            # 5. Обновить шаг и прогресс этапа (этап тоже заблокирован)
+            stage = await stage_repo.get_stage_for_update(step.stage_id)
+            if not stage:
+                return StepCompletionResult(
+                    success=False, error_message="Этап шага не найден"
+                )
+            counters = await step_repo.transition_locked(
+                step, stage, "completed", completed_at=datetime.now()
+            )
+            await self._update_stage_progress(stage, counters)
 
-        # 8. Обновить пользователя (репозиторий)
-        user = await user_repo.update_xp(user, xp_earned)
+            # 6. Обновить DailyLog (репозиторий)
+            daily_log = await daily_log_repo.get_or_create_daily_log(user, today)
+            await daily_log_repo.log_step_completion(daily_log, step, xp_earned)
 
-        if streak_updated:
-            user.streak_last_date = today
-            user = await user_repo.update_streak(user, new_streak)
+            # 7. Обновить пользователя (репозиторий): XP и streak одним UPDATE
+            if streak_updated:
+                user = await user_repo.update_xp_and_streak(
+                    user, xp_earned, new_streak, today
+                )
+                new_streak = user.streak_days
+            else:
+                user = await user_repo.update_xp(user, xp_earned)
 
         logger.info(
             f"Step {step_id} completed by user {user.telegram_id}: +{xp_earned} XP"
@@ -96,59 +111,31 @@ class CompleteStepUseCase:
             new_streak=new_streak,
         )
 
-    async def _update_stage_progress(self, stage_id: int) -> None:
+    async def _update_stage_progress(self, stage: Stage, counters: list[str]) -> None:
         """
-        Обновить прогресс этапа на основе выполненных шагов.
+        Сохранить счётчики, прогресс и статус этапа одним UPDATE.
 
-        Логика из steps.py:update_stage_progress().
+        Правила в core/domain/stage_rules (общие с SkipStepUseCase). Ошибки
+        не глушатся: внутри unit_of_work они откатывают весь сценарий.
         """
-        try:
-            # Получаем все шаги этапа
-            all_steps = await step_repo.get_steps_by_stage(stage_id)
-            total_count = len(all_steps)
-
-            if total_count == 0:
-                logger.warning(
-                    f"Stage {stage_id} has no steps, skipping progress update"
-                )
-                return
-
-            # Считаем выполненные шаги
-            completed_count = sum(1 for s in all_steps if s.status == "completed")
-
-            # Рассчитываем прогресс
-            new_progress = int((completed_count / total_count) * 100)
-
-            # Получаем этап и цель
-            stage = await stage_repo.get_stage(stage_id)
-            if not stage:
-                logger.error(f"Stage {stage_id} not found")
-                return
-
-            stage.progress = new_progress
-
-            # Проверяем, все ли шаги завершены
-            finished_count = sum(
-                1 for s in all_steps if s.status in ("completed", "skipped")
+        if stage.total_count == 0:
+            # Счётчики разошлись с шагами — чинит scripts/check_stages
+            logger.warning(f"Stage {stage.id} has no steps, skipping progress update")
+            await stage_repo.save_stage(stage, counters)
+            return
+
+        stage.progress = calculate_stage_progress(stage)
+        new_status = next_stage_status(stage, stage.goal)
+
+        if new_status != stage.status:
+            # Смена статуса двигает и указатель Goal.active_stage_id
+            await stage_repo.set_stage_status_locked(
+                stage, new_status, ["progress", *counters]
             )
+        else:
+            await stage_repo.save_stage(stage, ["progress", "status", *counters])
 
-            # Загружаем goal через await stage.goal (Tortoise ORM relation)
-            await stage.fetch_related("goal")
-            goal = stage.goal
-
-            if finished_count == total_count and completed_count > 0:
-                if goal.status != "onboarding":
-                    stage.status = "completed"
-                else:
-                    stage.status = "active"
-            elif stage.status == "pending" and completed_count > 0:
-                stage.status = "active"
-
-            await stage_repo.save_stage(stage)
-
-            logger.info(
-                f"Stage {stage_id} progress updated: {new_progress}% "
-                f"({completed_count}/{total_count})"
-            )
-        except Exception as e:
-            logger.error(f"Failed to update stage progress for stage {stage_id}: {e}")
+        logger.info(
+            f"Stage {stage.id} progress updated: {stage.progress}% "
+            f"({stage.completed_count}/{stage.total_count})"
+        )
@@ -21,9 +21,9 @@ from src.core.domain.stuck_rules import (
     get_blocker_description,
     normalize_blocker_type,
 )
-from src.database.models import DailyLog, Goal, Stage, Step, User
+from src.database.models import Goal, Stage, User
 from src.services.ai import ai_service
-from src.storage import goal_repo
+from src.storage import daily_log_repo, goal_repo
 
 logger = logging.getLogger(__name__)
 
@@ -84,21 +84,15 @@ class ResolveStuckUseCase:
             )
 
         # Check today's pending steps
-        today = date.today()
-        daily_log = await DailyLog.get_or_none(user=user, date=today)
-
         step_title = stage.title  # Fallback to stage title
         step_id = None
 
-        if daily_log and daily_log.assigned_step_ids:
-            # Get first pending step
-            steps = await Step.filter(
-                id__in=daily_log.assigned_step_ids, status="pending"
-            )
-            if steps:
-                first_step = steps[0]
-                step_title = first_step.title
-                step_id = first_step.id
+        # Get first pending step
+        steps = await daily_log_repo.get_day_steps(user, date.today(), status="pending")
+        if steps:
+            first_step = steps[0]
+            step_title = first_step.title
+            step_id = first_step.id
 
         return StuckContextResult(
             success=True,
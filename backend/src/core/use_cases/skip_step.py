@@ -9,9 +9,10 @@ import logging
 from dataclasses import dataclass
 from datetime import date
 
+from src.core.domain.stage_rules import calculate_stage_progress, next_stage_status
 from src.core.domain.step_rules import can_skip_step
 from src.database.models import User
-from src.storage import daily_log_repo, step_repo
+from src.storage import daily_log_repo, stage_repo, step_repo
 
 logger = logging.getLogger(__name__)
 
@@ -61,8 +62,9 @@ class SkipStepUseCase:
                 error_message=f"Шаг уже завершен (статус: {step.status})",
             )
 
-        # 3. Обновить шаг (репозиторий)
-        await step_repo.mark_skipped(step)
+        # 3. Обновить шаг (репозиторий); False — шаг уже перевёл другой запрос
+        if not await step_repo.mark_skipped(step):
+            return StepSkipResult(success=False, error_message="Шаг уже завершен")
 
         # 4. Обновить прогресс этапа
         await self._update_stage_progress(step.stage_id)
@@ -77,59 +79,36 @@ class SkipStepUseCase:
 
     async def _update_stage_progress(self, stage_id: int) -> None:
         """
-        Обновить прогресс этапа на основе выполненных шагов.
+        Обновить прогресс и статус этапа по его счётчикам шагов.
 
-        Логика та же что в CompleteStepUseCase (может быть вынесена в отдельный сервис).
+        Правила в core/domain/stage_rules (общие с CompleteStepUseCase).
         """
-        from src.storage import stage_repo
 
         try:
-            # Получаем все шаги этапа
-            all_steps = await step_repo.get_steps_by_stage(stage_id)
-            total_count = len(all_steps)
-
-            if total_count == 0:
-                logger.warning(
-                    f"Stage {stage_id} has no steps, skipping progress update"
-                )
-                return
-
-            # Считаем выполненные шаги
-            completed_count = sum(1 for s in all_steps if s.status == "completed")
-
-            # Рассчитываем прогресс
-            new_progress = int((completed_count / total_count) * 100)
-
-            # Получаем этап
+            # Счётчики ведёт step_repo при смене статуса: шаги этапа не читаем
             stage = await stage_repo.get_stage(stage_id)
             if not stage:
                 logger.error(f"Stage {stage_id} not found")
                 return
 
-            stage.progress = new_progress
-
-            # Проверяем, все ли шаги завершены
-            finished_count = sum(
-                1 for s in all_steps if s.status in ("completed", "skipped")
-            )
-
-            # Загружаем goal через await stage.goal
-            await stage.fetch_related("goal")
-            goal = stage.goal
+            if stage.total_count == 0:
+                logger.warning(
+                    f"Stage {stage_id} has no steps, skipping progress update"
+                )
+                return
 
-            if finished_count == total_count and completed_count > 0:
-                if goal.status != "onboarding":
-                    stage.status = "completed"
-                else:
-                    stage.status = "active"
-            elif stage.status == "pending" and completed_count > 0:
-                stage.status = "active"
+            stage.progress = calculate_stage_progress(stage)
+            new_status = next_stage_status(stage, stage.goal)
 
-            await stage_repo.save_stage(stage)
+            if new_status != stage.status:
+                # Смена статуса двигает и указатель Goal.active_stage_id
+                await stage_repo.set_stage_status(stage, new_status, ["progress"])
+            else:
+                await stage_repo.save_stage(stage, ["progress", "status"])
 
             logger.info(
-                f"Stage {stage_id} progress updated: {new_progress}% "
-                f"({completed_count}/{total_count})"
+                f"Stage {stage_id} progress updated: {stage.progress}% "
+                f"({stage.completed_count}/{stage.total_count})"
             )
         except Exception as e:
             logger.error(f"Failed to update stage progress for stage {stage_id}: {e}")
@@ -0,0 +1,316 @@
+"""
+Идемпотентные обновления схемы поверх generate_schemas().
+
+generate_schemas() создаёт только отсутствующие таблицы, поэтому новые
+колонки и индексы существующих таблиц добавляются здесь. Каждое обновление
+безопасно выполнять при каждом старте (IF NOT EXISTS).
+
+AICODE-NOTE: SQL зависит от диалекта — для каждого обновления указывается
+вариант для PostgreSQL и SQLite (None = не требуется для этого диалекта).
+SQLite не умеет ADD COLUMN IF NOT EXISTS — такие обновления помечаются
+sqlite_new_column и пропускаются, если колонка уже есть.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from src.storage import step_repo
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки при заполнении владельца старых шагов (backfill_step_owner)
+STEP_OWNER_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class SchemaUpdate:
+    """Одно обновление схемы с вариантами SQL по диалектам."""
+
+    name: str
+    postgres: str | None
+    sqlite: str | None
+    # (таблица, колонка), которую добавляет SQLite-вариант
+    sqlite_new_column: tuple[str, str] | None = None
+
+    def sql_for(self, dialect: str) -> str | None:
+        return self.postgres if dialect == "postgres" else self.sqlite
+
+
+# Частичные индексы для выборки due-напоминаний (reminder_repo.iter_due_reminders).
+# Порядок колонок (next_*_reminder_at, id) совпадает с keyset-пагинацией тика,
+# WHERE оставляет в индексе только пользователей с включёнными напоминаниями.
+# SQLite доказывает предикат индекса только в форме `reminders_enabled = 1`.
+REMINDER_INDEXES: list[SchemaUpdate] = [
+    SchemaUpdate(
+        name=f"idx_users_due_{kind}",
+        postgres=(
+            f"CREATE INDEX IF NOT EXISTS idx_users_due_{kind} "
+            f"ON users (next_{kind}_reminder_at, id) WHERE reminders_enabled"
+        ),
+        sqlite=(
+            f"CREATE INDEX IF NOT EXISTS idx_users_due_{kind} "
+            f"ON users (next_{kind}_reminder_at, id) WHERE reminders_enabled = 1"
+        ),
+    )
+    for kind in ("morning", "evening")
+]
+
+# Перенос устаревших JSON-списков DailyLog в daily_log_steps (таблицу создаёт
+# generate_schemas). Идемпотентен за счёт уникального (daily_log, role, step)
+# и ON CONFLICT DO NOTHING / INSERT OR IGNORE, поэтому выполняется на каждом
+# старте: неудачный первый прогон или откат на код, который ещё пишет JSON,
+# догоняются следующим стартом. Ссылки на удалённые шаги отбрасываются (FK).
+_DAILY_LOG_STEPS_BACKFILL = """
+    {insert} INTO daily_log_steps (daily_log_id, step_id, role, reason, created_at)
+    SELECT daily_log_id, step_id, role, reason, created_at FROM (
+        SELECT dl.id AS daily_log_id, CAST(e.value AS INTEGER) AS step_id,
+               'assigned' AS role, NULL AS reason, dl.created_at AS created_at
+        FROM daily_logs dl, {array_elements}(dl.assigned_step_ids) AS e
+        UNION ALL
+        SELECT dl.id, CAST(e.value AS INTEGER), 'completed', NULL, dl.created_at
+        FROM daily_logs dl, {array_elements}(dl.completed_step_ids) AS e
+        UNION ALL
+        SELECT dl.id, CAST(e.key AS INTEGER), 'skipped', e.value, dl.created_at
+        FROM daily_logs dl, {object_items}(dl.skip_reasons) AS e
+    ) AS legacy
+    WHERE step_id IN (SELECT id FROM steps)
+    {on_conflict};
+"""
+
+# Пересчёт счётчиков шагов этапа по таблице steps (тот же расчёт делает
+# stage_repo.reconcile_counters)
+_STAGE_COUNTERS_FILL = """
+    UPDATE stages SET
+        total_count = (SELECT COUNT(*) FROM steps WHERE stage_id = stages.id),
+        completed_count = (
+            SELECT COUNT(*) FROM steps
+            WHERE stage_id = stages.id AND status = 'completed'
+        ),
+        skipped_count = (
+            SELECT COUNT(*) FROM steps
+            WHERE stage_id = stages.id AND status = 'skipped'
+        );
+"""
+
+# Указатель на активный этап: последний active по (order, id), как раньше
+# выбирал goal_repo.get_active_stage
+_GOAL_ACTIVE_STAGE_FILL = """
+    UPDATE goals SET active_stage_id = (
+        SELECT s.id FROM stages s
+        WHERE s.goal_id = goals.id AND s.status = 'active'
+        ORDER BY s."order" DESC, s.id DESC
+        LIMIT 1
+    );
+"""
+
+SCHEMA_UPDATES: list[SchemaUpdate] = [
+    SchemaUpdate(
+        name="users_reminder_fields",
+        postgres="""
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS reminders_enabled BOOLEAN DEFAULT TRUE,
+            ADD COLUMN IF NOT EXISTS next_morning_reminder_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS next_evening_reminder_at TIMESTAMPTZ;
+        """,
+        sqlite=None,
+    ),
+    *REMINDER_INDEXES,
+    SchemaUpdate(
+        name="users_reachability",
+        postgres="""
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS is_reachable BOOLEAN NOT NULL DEFAULT TRUE,
+            ADD COLUMN IF NOT EXISTS unreachable_reason VARCHAR(32);
+        """,
+        sqlite="""
+            ALTER TABLE users ADD COLUMN is_reachable INT NOT NULL DEFAULT 1;
+            ALTER TABLE users ADD COLUMN unreachable_reason VARCHAR(32);
+        """,
+        sqlite_new_column=("users", "is_reachable"),
+    ),
+    SchemaUpdate(
+        name="users_timezone",
+        postgres="""
+            ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone VARCHAR(64);
+        """,
+        sqlite="""
+            ALTER TABLE users ADD COLUMN timezone VARCHAR(64);
+        """,
+        sqlite_new_column=("users", "timezone"),
+    ),
+    # Пакетный пересчёт перед переходом на летнее/зимнее время выбирает
+    # пользователей по зоне (reminder_repo.iter_zone_reminders)
+    SchemaUpdate(
+        name="idx_users_timezone",
+        postgres=(
+            "CREATE INDEX IF NOT EXISTS idx_users_timezone "
+            "ON users (timezone, id) WHERE timezone IS NOT NULL"
+        ),
+        sqlite=(
+            "CREATE INDEX IF NOT EXISTS idx_users_timezone "
+            "ON users (timezone, id) WHERE timezone IS NOT NULL"
+        ),
+    ),
+    SchemaUpdate(
+        name="steps_owner",
+        postgres="""
+            ALTER TABLE steps
+            ADD COLUMN IF NOT EXISTS user_id INT
+                REFERENCES users (id) ON DELETE CASCADE,
+            ADD COLUMN IF NOT EXISTS goal_id INT
+                REFERENCES goals (id) ON DELETE CASCADE;
+        """,
+        sqlite="""
+            ALTER TABLE steps ADD COLUMN user_id INT
+                REFERENCES users (id) ON DELETE CASCADE;
+            ALTER TABLE steps ADD COLUMN goal_id INT
+                REFERENCES goals (id) ON DELETE CASCADE;
+        """,
+        sqlite_new_column=("steps", "user_id"),
+    ),
+    # История выполненных шагов (step_repo.get_history) — один range scan
+    # по индексу в порядке completed_at DESC
+    SchemaUpdate(
+        name="idx_steps_user_history",
+        postgres=(
+            "CREATE INDEX IF NOT EXISTS idx_steps_user_history "
+            "ON steps (user_id, status, completed_at DESC)"
+        ),
+        sqlite=(
+            "CREATE INDEX IF NOT EXISTS idx_steps_user_history "
+            "ON steps (user_id, status, completed_at DESC)"
+        ),
+    ),
+    # Колонки добавляются и заполняются один раз: на PostgreSQL — внутри
+    # проверки information_schema, на SQLite — через sqlite_new_column
+    SchemaUpdate(
+        name="stages_step_counters",
+        postgres=f"""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'stages' AND column_name = 'total_count'
+                ) THEN
+                    ALTER TABLE stages
+                    ADD COLUMN total_count INT NOT NULL DEFAULT 0,
+                    ADD COLUMN completed_count INT NOT NULL DEFAULT 0,
+                    ADD COLUMN skipped_count INT NOT NULL DEFAULT 0;
+                    {_STAGE_COUNTERS_FILL}
+                END IF;
+            END $$;
+        """,
+        sqlite=f"""
+            ALTER TABLE stages ADD COLUMN total_count INT NOT NULL DEFAULT 0;
+            ALTER TABLE stages ADD COLUMN completed_count INT NOT NULL DEFAULT 0;
+            ALTER TABLE stages ADD COLUMN skipped_count INT NOT NULL DEFAULT 0;
+            {_STAGE_COUNTERS_FILL}
+        """,
+        sqlite_new_column=("stages", "total_count"),
+    ),
+    SchemaUpdate(
+        name="goals_active_stage",
+        postgres=f"""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'goals' AND column_name = 'active_stage_id'
+                ) THEN
+                    ALTER TABLE goals ADD COLUMN active_stage_id INT;
+                    {_GOAL_ACTIVE_STAGE_FILL}
+                END IF;
+            END $$;
+        """,
+        sqlite=f"""
+            ALTER TABLE goals ADD COLUMN active_stage_id INT;
+            {_GOAL_ACTIVE_STAGE_FILL}
+        """,
+        sqlite_new_column=("goals", "active_stage_id"),
+    ),
+    SchemaUpdate(
+        name="daily_log_steps_backfill",
+        postgres=_DAILY_LOG_STEPS_BACKFILL.format(
+            insert="INSERT",
+            array_elements="jsonb_array_elements_text",
+            object_items="jsonb_each_text",
+            on_conflict="ON CONFLICT DO NOTHING",
+        ),
+        sqlite=_DAILY_LOG_STEPS_BACKFILL.format(
+            insert="INSERT OR IGNORE",
+            array_elements="json_each",
+            object_items="json_each",
+            on_conflict="",
+        ),
+    ),
+]
+
+
+async def _sqlite_has_column(conn: BaseDBAsyncClient, table: str, column: str) -> bool:
+    rows = await conn.execute_query_dict(f"PRAGMA table_info({table})")
+    return any(row["name"] == column for row in rows)
+
+
+async def apply_schema_updates(conn: BaseDBAsyncClient | None = None) -> None:
+    """
+    Применить все обновления схемы для текущего диалекта.
+
+    Ошибка одного обновления логируется и не мешает остальным
+    (как и раньше в on_startup).
+    """
+    conn = conn or Tortoise.get_connection("default")
+    dialect = conn.capabilities.dialect
+
+    for update in SCHEMA_UPDATES:
+        sql = update.sql_for(dialect)
+        if not sql:
+            continue
+        if (
+            dialect == "sqlite"
+            and update.sqlite_new_column
+            and await _sqlite_has_column(conn, *update.sqlite_new_column)
+        ):
+            continue
+        try:
+            await conn.execute_script(sql)
+            logger.info(f"Schema update applied: {update.name}")
+        except Exception as e:
+            logger.warning(f"Schema update {update.name} skipped or failed: {e}")
+
+    try:
+        filled = await backfill_step_owner()
+        if filled:
+            logger.info(f"Step owner backfilled for {filled} steps")
+    except Exception as e:
+        logger.warning(f"Step owner backfill failed: {e}")
+
+
+async def backfill_step_owner(batch_size: int = STEP_OWNER_BATCH_SIZE) -> int:
+    """
+    Проставить user_id/goal_id всем шагам без владельца пачками по id.
+
+    AICODE-NOTE: Вызывается на каждом старте из apply_schema_updates:
+    история и проверка владельца читают только steps.user_id, и старые
+    шаги без него были бы не видны. Каждая пачка — отдельный UPDATE,
+    прерванное заполнение продолжится на следующем старте. Когда
+    заполнять нечего, это один запрос по индексу idx_steps_user_history.
+
+    Returns:
+        Количество заполненных шагов
+    """
+    total = 0
+    after_id = 0
+    while ids := await step_repo.backfill_owner(after_id, batch_size):
+        total += len(ids)
+        after_id = ids[-1]
+    return total
+
+
+async def drop_reminder_indexes(conn: BaseDBAsyncClient | None = None) -> None:
+    """Удалить индексы due-напоминаний (для бенчмарков и отката)."""
+    conn = conn or Tortoise.get_connection("default")
+    for update in REMINDER_INDEXES:
+        await conn.execute_script(f"DROP INDEX IF EXISTS {update.name}")
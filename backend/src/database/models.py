@@ -7,6 +7,8 @@
 - Stage: этап цели
 - Step: конкретный шаг (задача)
 - DailyLog: дневник дня (энергия, состояние, что сделано)
+- DailyLogStep: шаг в дневнике дня (назначен / выполнен / пропущен)
+- ReminderOutbox: очередь доставки напоминаний (outbox)
 """
 
 from tortoise import fields, models
@@ -30,7 +32,14 @@ class User(models.Model):
     reminder_morning = fields.CharField(max_length=5, default="09:00")
     reminder_evening = fields.CharField(max_length=5, default="21:00")
     timezone_offset = fields.IntField(default=3)  # UTC+3 (Moscow)
+    # IANA-зона ("Europe/Berlin"): если задана, важнее timezone_offset —
+    # учитывает переход на летнее время и зоны со сдвигом на полчаса
+    timezone = fields.CharField(max_length=64, null=True)
     reminders_enabled = fields.BooleanField(default=True)
+    # Недоступен для бота (заблокировал, удалил аккаунт): напоминания не шлём,
+    # пока не придёт новый апдейт от пользователя
+    is_reachable = fields.BooleanField(default=True)
+    unreachable_reason = fields.CharField(max_length=32, null=True)
 
     # Следующие напоминания (UTC datetime для cron)
     next_morning_reminder_at = fields.DatetimeField(null=True)
@@ -39,7 +48,9 @@ class User(models.Model):
     created_at = fields.DatetimeField(auto_now_add=True)
 
     goals: fields.ReverseRelation["Goal"]
+    steps: fields.ReverseRelation["Step"]
     daily_logs: fields.ReverseRelation["DailyLog"]
+    reminder_deliveries: fields.ReverseRelation["ReminderOutbox"]
 
     class Meta:
         table = "users"
@@ -63,9 +74,16 @@ class Goal(models.Model):
     # Статус: active, completed, paused, abandoned
     status = fields.CharField(max_length=20, default="active")
 
+    # AICODE-NOTE: Текущий активный этап — goal_repo.get_active_stage читает
+    # его по первичному ключу. Меняется в одной транзакции со статусом этапа
+    # (stage_repo.set_stage_status, goal_repo.create_stage). Без FK: goals и
+    # stages ссылались бы друг на друга. Расхождения чинит scripts/check_stages.
+    active_stage_id = fields.IntField(null=True)
+
     created_at = fields.DatetimeField(auto_now_add=True)
 
     stages: fields.ReverseRelation["Stage"]
+    steps: fields.ReverseRelation["Step"]
 
     class Meta:
         table = "goals"
@@ -89,6 +107,13 @@ class Stage(models.Model):
     # Прогресс (0-100)
     progress = fields.IntField(default=0)
 
+    # Счётчики шагов этапа: step_repo меняет их атомарными инкрементами при
+    # создании и смене статуса шага, прогресс считается по ним за O(1).
+    # Расхождения находит и чинит scripts/check_stages.
+    total_count = fields.IntField(default=0)
+    completed_count = fields.IntField(default=0)
+    skipped_count = fields.IntField(default=0)
+
     # Статус: pending, active, completed
     status = fields.CharField(max_length=20, default="pending")
 
@@ -109,6 +134,18 @@ class Step(models.Model):
         "models.Stage", related_name="steps", on_delete=fields.CASCADE
     )
 
+    # AICODE-NOTE: Денормализованный владелец (= stage.goal и stage.goal.user).
+    # Заполняет step_repo.create_step, старые строки — apply_schema_updates
+    # на старте (migrations.backfill_step_owner). История и проверка
+    # владельца читают шаги без обхода stage -> goal
+    # (индекс idx_steps_user_history).
+    user = fields.ForeignKeyField(
+        "models.User", related_name="steps", null=True, on_delete=fields.CASCADE
+    )
+    goal = fields.ForeignKeyField(
+        "models.Goal", related_name="steps", null=True, on_delete=fields.CASCADE
+    )
+
     title = fields.CharField(max_length=500)
 
     # Сложность: easy (5-10 мин), medium (15-30 мин), hard (45-90 мин)
@@ -127,6 +164,8 @@ class Step(models.Model):
     status = fields.CharField(max_length=20, default="pending")
     completed_at = fields.DatetimeField(null=True)
 
+    daily_log_links: fields.ReverseRelation["DailyLogStep"]
+
     class Meta:
         table = "steps"
 
@@ -148,13 +187,11 @@ class DailyLog(models.Model):
     energy_level = fields.IntField(null=True)  # 1-10
     mood_text = fields.CharField(max_length=100, null=True)  # "тревожно", "бодро"
 
-    # Назначенные шаги (JSON: список ID шагов)
+    # AICODE-NOTE: Устаревшие JSON-списки шагов. Источник правды —
+    # daily_log_steps (DailyLogStep), новые записи сюда не пишутся;
+    # колонки оставлены для отката и перенесены backfill-миграцией.
     assigned_step_ids = fields.JSONField(default=[])
-
-    # Выполненные шаги (JSON: список ID шагов)
     completed_step_ids = fields.JSONField(default=[])
-
-    # Причины пропуска (JSON: {"step_id": "причина"})
     skip_reasons = fields.JSONField(default={})
 
     # Вечерняя оценка дня (1-5 или emoji)
@@ -165,6 +202,79 @@ class DailyLog(models.Model):
 
     created_at = fields.DatetimeField(auto_now_add=True)
 
+    step_links: fields.ReverseRelation["DailyLogStep"]
+
     class Meta:
         table = "daily_logs"
         unique_together = (("user", "date"),)
+
+
+class DailyLogStep(models.Model):
+    """
+    Шаг в дневнике дня.
+
+    Одна строка — одна отметка: шаг назначен, выполнен или пропущен.
+    Добавление — один INSERT без чтения и перезаписи DailyLog
+    (см. daily_log_repo), агрегаты по дням считаются в БД.
+    """
+
+    id = fields.IntField(primary_key=True)
+    daily_log = fields.ForeignKeyField(
+        "models.DailyLog", related_name="step_links", on_delete=fields.CASCADE
+    )
+    step = fields.ForeignKeyField(
+        "models.Step", related_name="daily_log_links", on_delete=fields.CASCADE
+    )
+
+    # Роль: assigned, completed, skipped
+    role = fields.CharField(max_length=16)
+
+    # Причина пропуска (только для skipped)
+    reason = fields.TextField(null=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "daily_log_steps"
+        # (daily_log, role) — префикс для выборки шагов дня нужной роли
+        unique_together = (("daily_log", "role", "step"),)
+        indexes = (("step",),)
+
+
+class ReminderOutbox(models.Model):
+    """
+    Доставка одного напоминания (transactional outbox).
+
+    Тик кладёт сюда напоминание в той же транзакции, в которой переназначает
+    next_*_reminder_at пользователя; отправляет отдельный drain с ретраями.
+    Ключ идемпотентности — (user, kind, local_date): одно напоминание
+    каждого вида в локальный день пользователя.
+    """
+
+    id = fields.IntField(primary_key=True)
+    user = fields.ForeignKeyField(
+        "models.User", related_name="reminder_deliveries", on_delete=fields.CASCADE
+    )
+    telegram_id = fields.BigIntField()  # chat_id, чтобы drain не делал JOIN
+
+    # Вид: morning, evening
+    kind = fields.CharField(max_length=16)
+    local_date = fields.DateField()
+
+    # Статус: pending, sent, failed (failed — исчерпаны попытки)
+    status = fields.CharField(max_length=16, default="pending")
+    attempts = fields.IntField(default=0)
+    next_attempt_at = fields.DatetimeField()
+
+    # Последняя ошибка: тип исключения + текст (для метрик причин отказа)
+    error_kind = fields.CharField(max_length=64, null=True)
+    last_error = fields.TextField(null=True)
+
+    due_at = fields.DatetimeField()  # когда напоминание должно было уйти
+    sent_at = fields.DatetimeField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "reminder_outbox"
+        unique_together = (("user", "kind", "local_date"),)
+        indexes = (("status", "next_attempt_at"), ("local_date",))
@@ -10,9 +10,9 @@ from fastapi import APIRouter, HTTPException, Query
 
 from src.core.use_cases.complete_step import CompleteStepUseCase
 from src.core.use_cases.resolve_stuck import resolve_stuck_use_case
-from src.database.models import DailyLog, Goal, Stage, Step, User
+from src.database.models import Step, User
 from src.interfaces.api import schemas
-from src.storage import goal_repo, step_repo
+from src.storage import daily_log_repo, goal_repo, step_repo
 
 router = APIRouter(prefix="/dev", tags=["development"])
 
@@ -51,6 +51,7 @@ async def dev_get_me(telegram_id: int = Query(..., description="User's telegram_
         level=user.level,
         streak_days=user.streak_days,
         timezone_offset=user.timezone_offset,
+        timezone=user.timezone,
     )
 
 
@@ -61,7 +62,7 @@ async def dev_get_goals(telegram_id: int = Query(...)):
     if not goal:
         raise HTTPException(status_code=404, detail="No active goal")
 
-    stage = await goal_repo.get_active_stage(goal.id)
+    stage = await goal_repo.get_active_stage(goal)
 
     return schemas.GoalResponse(
         id=goal.id,
@@ -89,7 +90,7 @@ async def dev_generate_microhit(
     if not goal:
         raise HTTPException(status_code=404, detail="No active goal")
 
-    stage = await goal_repo.get_active_stage(goal.id)
+    stage = await goal_repo.get_active_stage(goal)
     if not stage:
         raise HTTPException(status_code=404, detail="No active stage")
 
@@ -110,6 +111,8 @@ async def dev_generate_microhit(
     # Create step
     step = await step_repo.create_step(
         stage_id=stage.id,
+        goal_id=goal.id,
+        user_id=goal.user_id,
         title=step_title,
         difficulty="easy",
         estimated_minutes=5,
@@ -140,12 +143,7 @@ async def dev_complete_microhit(
     if not step:
         raise HTTPException(status_code=404, detail="Step not found")
 
-    stage = await step_repo.get_stage(step.stage_id)
-    if not stage:
-        raise HTTPException(status_code=404, detail="Stage not found")
-
-    goal = await goal_repo.get_goal_by_id(stage.goal_id)
-    if not goal or goal.user_id != telegram_id:
+    if step.user_id != telegram_id:
         raise HTTPException(status_code=403, detail="Not your step")
 
     # Complete step
@@ -176,22 +174,25 @@ async def dev_get_stats(telegram_id: int = Query(...)):
     week_start = today - timedelta(days=today.weekday())
 
     # Today
-    today_log = await DailyLog.filter(user_id=telegram_id, date=today).first()
+    today_log = await daily_log_repo.get_day_totals(telegram_id, today)
+    step_counts = await daily_log_repo.count_steps_by_day(
+        telegram_id, week_start, today
+    )
+    today_counts = step_counts.get(today, {})
     today_stats = schemas.TodayStatsResponse(
         energy_level=today_log.energy_level if today_log else None,
-        steps_assigned=len(today_log.assigned_step_ids) if today_log else 0,
-        steps_completed=len(today_log.completed_step_ids) if today_log else 0,
+        steps_assigned=today_counts.get(daily_log_repo.ROLE_ASSIGNED, 0),
+        steps_completed=today_counts.get(daily_log_repo.ROLE_COMPLETED, 0),
         xp_earned=today_log.xp_earned if today_log else 0,
     )
 
     # Week
-    week_logs = await DailyLog.filter(
-        user_id=telegram_id, date__gte=week_start, date__lte=today
-    ).all()
-
-    active_days = sum(1 for log in week_logs if len(log.completed_step_ids) > 0)
-    total_xp_week = sum(log.xp_earned for log in week_logs)
-    total_steps_week = sum(len(log.completed_step_ids) for log in week_logs)
+    completed_by_day = [
+        counts.get(daily_log_repo.ROLE_COMPLETED, 0) for counts in step_counts.values()
+    ]
+    active_days = sum(1 for completed in completed_by_day if completed > 0)
+    total_xp_week = await daily_log_repo.sum_xp(telegram_id, week_start, today)
+    total_steps_week = sum(completed_by_day)
 
     week_stats = schemas.WeekStatsResponse(
         active_days=active_days,
@@ -208,22 +209,7 @@ async def dev_get_history(
     limit: int = Query(default=20, ge=1, le=100),
 ):
     """Get history without auth (dev only)."""
-    goals = await Goal.filter(user_id=telegram_id).all()
-    goal_ids = [goal.id for goal in goals]
-
-    stages = await Stage.filter(goal_id__in=goal_ids).all()
-    stage_ids = [stage.id for stage in stages]
-
-    completed_steps = (
-        await Step.filter(
-            stage_id__in=stage_ids,
-            status="completed",
-            completed_at__isnull=False,
-        )
-        .order_by("-completed_at")
-        .limit(limit)
-        .all()
-    )
+    completed_steps = await step_repo.get_history(telegram_id, limit)
 
     steps = [
         schemas.StepHistoryItem(
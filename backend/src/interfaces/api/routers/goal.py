@@ -28,7 +28,7 @@ async def get_active_goal(user: User = Depends(get_current_user)):
         )
 
     # Get active stage
-    stage = await goal_repo.get_active_stage(goal.id)
+    stage = await goal_repo.get_active_stage(goal)
 
     return schemas.GoalResponse(
         id=goal.id,
@@ -2,9 +2,10 @@
 
 from fastapi import APIRouter, Depends, Query
 
-from src.database.models import Goal, Stage, Step, User
+from src.database.models import User
 from src.interfaces.api import schemas
 from src.interfaces.api.auth import get_current_user
+from src.storage import step_repo
 
 router = APIRouter()
 
@@ -23,25 +24,8 @@ async def get_history(
     Returns:
         HistoryResponse: List of completed steps
     """
-    # Get all user's goals
-    goals = await Goal.filter(user_id=user.telegram_id).all()
-    goal_ids = [goal.id for goal in goals]
-
-    # Get all stages for user's goals
-    stages = await Stage.filter(goal_id__in=goal_ids).all()
-    stage_ids = [stage.id for stage in stages]
-
-    # Get completed steps, ordered by completion date
-    completed_steps = (
-        await Step.filter(
-            stage_id__in=stage_ids,
-            status="completed",
-            completed_at__isnull=False,
-        )
-        .order_by("-completed_at")
-        .limit(limit)
-        .all()
-    )
+    # Completed steps, newest first (one range scan over the owner index)
+    completed_steps = await step_repo.get_history(user.telegram_id, limit)
 
     # Format response
     steps = [
@@ -39,7 +39,7 @@ async def generate_microhit(
             detail="No active goal. Please create a goal in the bot first.",
         )
 
-    stage = await goal_repo.get_active_stage(goal.id)
+    stage = await goal_repo.get_active_stage(goal)
     if not stage:
         raise HTTPException(
             status_code=404,
@@ -70,6 +70,8 @@ async def generate_microhit(
     # Create step with the stuck context
     step = await step_repo.create_step(
         stage_id=stage.id,
+        goal_id=goal.id,
+        user_id=goal.user_id,
         title=request.step_title,
         difficulty="easy",
         estimated_minutes=5,
@@ -107,18 +109,12 @@ async def complete_microhit(
     Raises:
         HTTPException: If step not found or completion fails
     """
-    # Verify step belongs to user
+    # Verify step belongs to user (one lookup by the denormalized owner)
     step = await Step.filter(id=request.step_id).first()
     if not step:
         raise HTTPException(status_code=404, detail="Step not found")
 
-    # Get stage to verify ownership
-    stage = await step_repo.get_stage(step.stage_id)
-    if not stage:
-        raise HTTPException(status_code=404, detail="Stage not found")
-
-    goal = await goal_repo.get_goal_by_id(stage.goal_id)
-    if not goal or goal.user_id != user.telegram_id:
+    if step.user_id != user.telegram_id:
         raise HTTPException(
             status_code=403,
             detail="You don't have permission to complete this step",
@@ -4,9 +4,10 @@ from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends
 
-from src.database.models import DailyLog, User
+from src.database.models import User
 from src.interfaces.api import schemas
 from src.interfaces.api.auth import get_current_user
+from src.storage import daily_log_repo
 
 router = APIRouter()
 
@@ -21,35 +22,34 @@ async def get_stats(user: User = Depends(get_current_user)):
     today = date.today()
     week_start = today - timedelta(days=today.weekday())
 
-    # Get today's daily log
-    today_log = await DailyLog.filter(
-        user_id=user.telegram_id,
-        date=today,
-    ).first()
+    # Today's energy and XP (only the two columns we return)
+    today_log = await daily_log_repo.get_day_totals(user.telegram_id, today)
+
+    # Step counts by day and role (aggregated in SQL)
+    step_counts = await daily_log_repo.count_steps_by_day(
+        user.telegram_id, week_start, today
+    )
+    today_counts = step_counts.get(today, {})
 
     # Today stats
     today_stats = schemas.TodayStatsResponse(
         energy_level=today_log.energy_level if today_log else None,
-        steps_assigned=len(today_log.assigned_step_ids) if today_log else 0,
-        steps_completed=len(today_log.completed_step_ids) if today_log else 0,
+        steps_assigned=today_counts.get(daily_log_repo.ROLE_ASSIGNED, 0),
+        steps_completed=today_counts.get(daily_log_repo.ROLE_COMPLETED, 0),
         xp_earned=today_log.xp_earned if today_log else 0,
     )
 
-    # Week stats
-    week_logs = await DailyLog.filter(
-        user_id=user.telegram_id,
-        date__gte=week_start,
-        date__lte=today,
-    ).all()
+    # Total XP for the week
+    total_xp_week = await daily_log_repo.sum_xp(user.telegram_id, week_start, today)
 
     # Count active days (days with at least one completed step)
-    active_days = sum(1 for log in week_logs if len(log.completed_step_ids) > 0)
-
-    # Total XP for the week
-    total_xp_week = sum(log.xp_earned for log in week_logs)
+    completed_by_day = [
+        counts.get(daily_log_repo.ROLE_COMPLETED, 0) for counts in step_counts.values()
+    ]
+    active_days = sum(1 for completed in completed_by_day if completed > 0)
 
     # Total completed steps for the week
-    total_steps_week = sum(len(log.completed_step_ids) for log in week_logs)
+    total_steps_week = sum(completed_by_day)
 
     week_stats = schemas.WeekStatsResponse(
         active_days=active_days,
@@ -1,10 +1,11 @@
 """User profile API endpoints."""
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 
 from src.database.models import User
 from src.interfaces.api import schemas
 from src.interfaces.api.auth import get_current_user
+from src.services import reminders
 
 router = APIRouter()
 
@@ -24,4 +25,22 @@ async def get_me(user: User = Depends(get_current_user)):
         level=user.level,
         streak_days=user.streak_days,
         timezone_offset=user.timezone_offset,
+        timezone=user.timezone,
     )
+
+
+@router.put("/me/timezone", response_model=schemas.UserProfileResponse)
+async def set_timezone(
+    request: schemas.TimezoneUpdateRequest,
+    user: User = Depends(get_current_user),
+):
+    """Set IANA timezone and reschedule reminders.
+
+    Returns:
+        UserProfileResponse: Updated profile
+    """
+    try:
+        await reminders.set_user_timezone(user, request.timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return await get_me(user)
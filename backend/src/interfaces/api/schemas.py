@@ -19,11 +19,18 @@ class UserProfileResponse(BaseModel):
     level: int = 1
     streak_days: int = 0
     timezone_offset: int = 0
+    timezone: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class TimezoneUpdateRequest(BaseModel):
+    """Set user IANA timezone."""
+
+    timezone: str = Field(..., description="IANA timezone name, e.g. Europe/Berlin")
+
+
 # ===== Goal Schemas =====
 
 
@@ -17,8 +17,10 @@ from tortoise import Tortoise
 from src.bot.handlers import register_routers
 from src.bot.middlewares.access import AccessMiddleware
 from src.bot.middlewares.error_handler import ErrorHandlingMiddleware
+from src.bot.middlewares.reachability import ReachabilityMiddleware
 from src.config import config
 from src.database.config import TORTOISE_ORM
+from src.database.migrations import apply_schema_updates
 from src.services import reminders
 
 # Настройка логов
@@ -34,29 +36,22 @@ async def on_startup(bot: Bot) -> None:
     await Tortoise.generate_schemas()
     logger.info("Database initialized")
 
-    # Миграция: добавляем новые поля для напоминаний (если их нет)
-    try:
-        conn = Tortoise.get_connection("default")
-        # Проверяем и добавляем колонки если их нет
-        await conn.execute_script(
-            """
-            ALTER TABLE users
-            ADD COLUMN IF NOT EXISTS reminders_enabled BOOLEAN DEFAULT TRUE,
-            ADD COLUMN IF NOT EXISTS next_morning_reminder_at TIMESTAMPTZ,
-            ADD COLUMN IF NOT EXISTS next_evening_reminder_at TIMESTAMPTZ;
-        """
-        )
-        logger.info("Database schema updated (reminders fields)")
-    except Exception as e:
-        logger.warning(f"Schema migration skipped or failed: {e}")
+    # Миграции: новые колонки и индексы существующих таблиц
+    await apply_schema_updates()
+    logger.info("Database schema updated")
 
     # Инициализация reminders service
     reminders.set_bot(bot)
     logger.info("Reminders service initialized")
 
+    # In-process планировщик: куча строится из БД при каждом старте
+    if config.REMINDER_SCHEDULER_ENABLED:
+        reminders.start_scheduler()
+
 
 async def on_shutdown() -> None:
     """Закрытие при остановке."""
+    await reminders.stop_scheduler()
     await Tortoise.close_connections()
     logger.info("Database connections closed")
 
@@ -87,6 +82,8 @@ async def main():
     dp = Dispatcher(storage=storage)
 
     # Глобальные middleware
+    # Реактивация недоступных для напоминаний пользователей — на любой апдейт
+    dp.update.outer_middleware(ReachabilityMiddleware())
     dp.message.middleware(AccessMiddleware())
     dp.callback_query.middleware(AccessMiddleware())
 
@@ -160,13 +157,42 @@ async def main():
             if not config.CRON_TOKEN or token != config.CRON_TOKEN.get_secret_value():
                 return web.json_response({"error": "Unauthorized"}, status=401)
 
+            # Шардирование: ?shard=i&shards=N — только срез i (отдельный воркер),
+            # ?shards=N — все N шардов параллельно в этом процессе
+            try:
+                shards = int(request.query.get("shards", config.REMINDER_SHARDS))
+                shard_index = request.query.get("shard")
+                shard = (
+                    reminders.Shard(int(shard_index), shards)
+                    if shard_index is not None
+                    else None
+                )
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
+
             # Process reminders
-            stats = await reminders.process_reminders()
+            if shard is not None:
+                stats = await reminders.process_reminders(shard)
+            else:
+                stats = await reminders.process_reminders_sharded(shards)
             return web.json_response({"status": "ok", "stats": stats})
 
+        # Метрики рассылки (опоздание, длительность тика, ошибки) для Prometheus
+        async def cron_metrics(request: web.Request) -> web.Response:
+            from src.services import metrics
+
+            token = request.query.get("token")
+            if not config.CRON_TOKEN or token != config.CRON_TOKEN.get_secret_value():
+                return web.json_response({"error": "Unauthorized"}, status=401)
+
+            return web.Response(
+                text=metrics.render_prometheus(), content_type="text/plain"
+            )
+
         app.router.add_get("/", root)
         app.router.add_get("/health", health)
         app.router.add_get("/cron/tick", cron_tick)
+        app.router.add_get("/cron/metrics", cron_metrics)
 
         # Mount FastAPI app for TMA API endpoints
         # FastAPI handles /api/* routes
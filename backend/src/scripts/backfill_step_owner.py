@@ -0,0 +1,59 @@
+"""
+Заполнение денормализованного владельца (user_id, goal_id) у старых шагов.
+
+Шаги, созданные до появления колонок, не видны в истории и проверке
+владельца, пока у них user_id IS NULL. Их заполняет apply_schema_updates
+на каждом старте (migrations.backfill_step_owner); скрипт делает то же
+вручную с прогрессом и выбором размера пачки. Шаги проходятся пачками
+по id (каждая пачка — один UPDATE в своей транзакции), поэтому его можно
+прервать и запустить снова.
+
+Запуск:
+    python -m src.scripts.backfill_step_owner
+    python -m src.scripts.backfill_step_owner --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from tortoise import Tortoise
+
+from src.database.config import TORTOISE_ORM
+from src.database.migrations import apply_schema_updates
+from src.storage import step_repo
+
+
+async def backfill(batch_size: int) -> int:
+    """Заполнить владельца всем шагам без него; вернуть число строк."""
+    total = 0
+    after_id = 0
+    started = time.perf_counter()
+    while True:
+        ids = await step_repo.backfill_owner(after_id, batch_size)
+        if not ids:
+            break
+        total += len(ids)
+        after_id = ids[-1]
+        elapsed = time.perf_counter() - started
+        print(f"  {total:,} steps (up to id {after_id}), {total / elapsed:,.0f} rows/s")
+    return total
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        # Колонки и индекс должны существовать до заполнения
+        await apply_schema_updates()
+        total = await backfill(args.batch_size)
+        print(f"Backfilled owner for {total:,} steps")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
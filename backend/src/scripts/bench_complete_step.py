@@ -0,0 +1,162 @@
+"""
+Бенчмарк выполнения шага: запросы, коммиты и задержка на одно выполнение.
+
+Засевает N пользователей с целью, активным этапом и шагами и выполняет по
+два шага на пользователя через CompleteStepUseCase: первый создаёт DailyLog
+дня, второй — обычный повтор. Печатает по каждому случаю среднее число
+SQL-операторов (round trip'ов, включая BEGIN/COMMIT/SAVEPOINT), коммитов и
+задержку (среднюю и p95).
+
+Запуск:
+    python -m src.scripts.bench_complete_step
+    python -m src.scripts.bench_complete_step --users 1000 \\
+        --db-url sqlite:///tmp/bench.sqlite3
+
+AICODE-NOTE: Только SQLite — операторы считаются trace callback'ом
+соединения (sqlite3.set_trace_callback): в DEBUG-лог tortoise.db_client
+не попадают BEGIN/COMMIT. Коммит — это COMMIT транзакции или пишущий
+оператор вне транзакции (autocommit).
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+
+from tortoise import Tortoise
+
+from src.core.use_cases.complete_step import CompleteStepUseCase
+from src.database.migrations import apply_schema_updates
+from src.database.models import Goal, Step, User
+from src.storage import goal_repo, step_repo
+
+_WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class SqlTrace:
+    """Считает операторы и коммиты соединения SQLite."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.commits = 0
+        self._in_transaction = False
+
+    def __call__(self, sql: str) -> None:
+        self.statements += 1
+        keyword = sql.lstrip().split(None, 1)[0].upper()
+        if keyword == "BEGIN":
+            self._in_transaction = True
+        elif keyword in ("COMMIT", "END"):
+            self._in_transaction = False
+            self.commits += 1
+        elif keyword == "ROLLBACK" and not sql.upper().startswith("ROLLBACK TO"):
+            self._in_transaction = False
+        elif keyword in _WRITES and not self._in_transaction:
+            self.commits += 1
+
+    def snapshot(self) -> tuple[int, int]:
+        return self.statements, self.commits
+
+
+async def seed(users: int) -> list[tuple[User, list[Step]]]:
+    """Пользователи с активной целью, этапом из 4 шагов и вчерашним streak."""
+    seeded = []
+    today = date.today()
+    for i in range(users):
+        user = await User.create(
+            telegram_id=9_000_000 + i,
+            streak_days=3,
+            streak_last_date=today - timedelta(days=1),
+        )
+        goal = await Goal.create(
+            user=user,
+            title="Цель",
+            start_date=today,
+            deadline=today + timedelta(days=14),
+        )
+        stage = await goal_repo.create_stage(
+            goal=goal,
+            title="Этап",
+            order=1,
+            start_date=today,
+            end_date=goal.deadline,
+            status="active",
+        )
+        steps = [
+            await step_repo.create_step(
+                stage_id=stage.id,
+                goal_id=goal.id,
+                user_id=user.id,
+                title=f"Шаг {n}",
+                difficulty="easy",
+                estimated_minutes=5,
+                xp_reward=10,
+                scheduled_date=today,
+            )
+            for n in range(4)
+        ]
+        seeded.append((user, steps))
+    return seeded
+
+
+def _report(name: str, samples: list[tuple[int, int, float]]) -> None:
+    statements = statistics.mean(s[0] for s in samples)
+    commits = statistics.mean(s[1] for s in samples)
+    latencies = sorted(s[2] * 1000 for s in samples)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"  {name:<14} statements {statements:5.1f}  commits {commits:4.1f}  "
+        f"latency {statistics.mean(latencies):6.2f} ms (p95 {p95:6.2f} ms)"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["src.database.models"]})
+    try:
+        conn = Tortoise.get_connection("default")
+        if conn.capabilities.dialect != "sqlite":
+            raise SystemExit("bench_complete_step supports SQLite only")
+        await Tortoise.generate_schemas()
+        await apply_schema_updates()
+
+        started = time.perf_counter()
+        seeded = await seed(args.users)
+        print(f"{args.users:,} users seeded in {time.perf_counter() - started:.1f}s")
+
+        trace = SqlTrace()
+        await conn._connection.set_trace_callback(trace)
+        use_case = CompleteStepUseCase()
+        samples: dict[str, list[tuple[int, int, float]]] = {
+            "first of day": [],
+            "repeat": [],
+        }
+        for user, steps in seeded:
+            for name, step in zip(samples, steps, strict=False):
+                before = trace.snapshot()
+                started = time.perf_counter()
+                result = await use_case.execute(step.id, user)
+                elapsed = time.perf_counter() - started
+                after = trace.snapshot()
+                assert result.success, result.error_message
+                samples[name].append(
+                    (after[0] - before[0], after[1] - before[1], elapsed)
+                )
+        await conn._connection.set_trace_callback(None)
+
+        print("Per completion:")
+        for name, rows in samples.items():
+            _report(name, rows)
+    finally:
+        await Tortoise.close_connections()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    await run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,220 @@
+"""
+Бенчмарк выборки due-напоминаний с частичными индексами и без них.
+
+Для каждого размера таблицы users засевает синтетических пользователей
+(доля due — --due-ratio), затем прогоняет полный проход
+reminder_repo.iter_due_reminders по обоим видам напоминаний без индексов
+и с индексами idx_users_due_*.
+
+Запуск:
+    python -m src.scripts.bench_due_reminders
+    python -m src.scripts.bench_due_reminders --sizes 10000 100000 --repeat 3
+    python -m src.scripts.bench_due_reminders --db-url postgres://... --truncate
+
+AICODE-NOTE: По умолчанию база — SQLite в памяти, пересоздаётся на каждый размер.
+С --db-url таблица users очищается, поэтому нужен явный --truncate.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from tortoise import Tortoise
+
+from src.database.migrations import apply_schema_updates, drop_reminder_indexes
+from src.database.models import User
+from src.services.reminders import zone_offset_hours
+from src.storage import reminder_repo
+
+SEED_BATCH_SIZE = 10_000
+
+_SEED_COLUMNS = (
+    "telegram_id",
+    "xp",
+    "level",
+    "streak_days",
+    "reminder_morning",
+    "reminder_evening",
+    "timezone_offset",
+    "timezone",
+    "reminders_enabled",
+    "is_reachable",
+    "next_morning_reminder_at",
+    "next_evening_reminder_at",
+    "created_at",
+)
+
+
+def _placeholders(dialect: str, count: int) -> str:
+    if dialect == "postgres":
+        return ", ".join(f"${i}" for i in range(1, count + 1))
+    return ", ".join("?" for _ in range(count))
+
+
+async def seed_users(count: int, due_ratio: float, now_utc: datetime) -> None:
+    """
+    Засеять `count` пользователей raw INSERT-ами пачками.
+
+    Время напоминаний и часовые пояса — реалистичные (большинство в 09:00/21:00
+    по Москве, часть с IANA-зоной), `due_ratio` пользователей просрочены,
+    остальные — в ближайшие сутки, ~10% с выключенными напоминаниями.
+    """
+    conn = Tortoise.get_connection("default")
+    dialect = conn.capabilities.dialect
+    fields = User._meta.fields_map
+    to_db = {
+        name: fields[name].to_db_value
+        for name in (
+            "next_morning_reminder_at",
+            "next_evening_reminder_at",
+            "created_at",
+        )
+    }
+    sql = (
+        f"INSERT INTO users ({', '.join(_SEED_COLUMNS)}) "
+        f"VALUES ({_placeholders(dialect, len(_SEED_COLUMNS))})"
+    )
+    rng = random.Random(42)
+    mornings = ["09:00"] * 6 + ["07:30", "08:00", "10:00"]
+    evenings = ["21:00"] * 6 + ["20:00", "22:00", "22:30"]
+    # (timezone_offset, timezone): старые пользователи — только смещение
+    zone_names = ["Europe/Moscow", "Europe/Berlin", "Asia/Kolkata", "America/New_York"]
+    zones = [(3, None)] * 3 + [(0, None), (5, None)]
+    zones += [(zone_offset_hours(name, now_utc), name) for name in zone_names]
+
+    def due_or_future() -> datetime:
+        if rng.random() < due_ratio:
+            return now_utc - timedelta(seconds=rng.randint(1, 600))
+        return now_utc + timedelta(seconds=rng.randint(60, 86_400))
+
+    for start in range(0, count, SEED_BATCH_SIZE):
+        rows = []
+        for telegram_id in range(start + 1, min(start + SEED_BATCH_SIZE, count) + 1):
+            offset, zone = rng.choice(zones)
+            rows.append(
+                [
+                    telegram_id,
+                    0,
+                    1,
+                    0,
+                    rng.choice(mornings),
+                    rng.choice(evenings),
+                    offset,
+                    zone,
+                    rng.random() > 0.1,
+                    True,
+                    to_db["next_morning_reminder_at"](due_or_future(), User),
+                    to_db["next_evening_reminder_at"](due_or_future(), User),
+                    to_db["created_at"](now_utc, User),
+                ]
+            )
+        await conn.execute_many(sql, rows)
+
+
+async def _drain_due(now_utc: datetime) -> int:
+    """Полный проход по due-пользователям обоих видов (только чтение)."""
+    total = 0
+    for kind in reminder_repo.REMINDER_FIELDS:
+        async for chunk in reminder_repo.iter_due_reminders(kind, now_utc):
+            total += len(chunk)
+    return total
+
+
+async def _measure(now_utc: datetime, repeat: int) -> tuple[float, int]:
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = await _drain_due(now_utc)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, rows
+
+
+async def _first_page_plan(now_utc: datetime) -> str:
+    """
+    План первой страницы (только SQLite — EXPLAIN QUERY PLAN).
+
+    SQL повторяет запрос iter_due_reminders с теми же bound-параметрами:
+    SQLite сопоставляет предикат частичного индекса с их значениями.
+    """
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect != "sqlite":
+        return "-"
+    due_at = User._meta.fields_map["next_morning_reminder_at"].to_db_value(
+        now_utc, User
+    )
+    rows = await conn.execute_query_dict(
+        "EXPLAIN QUERY PLAN SELECT id FROM users "
+        "WHERE reminders_enabled = ? AND next_morning_reminder_at <= ? "
+        "ORDER BY next_morning_reminder_at, id LIMIT ?",
+        [True, due_at, reminder_repo.DUE_CHUNK_SIZE],
+    )
+    return "; ".join(row["detail"] for row in rows)
+
+
+async def bench_size(
+    db_url: str, size: int, due_ratio: float, repeat: int, truncate: bool
+) -> None:
+    await Tortoise.init(db_url=db_url, modules={"models": ["src.database.models"]})
+    await Tortoise.generate_schemas()
+    conn = Tortoise.get_connection("default")
+
+    if truncate:
+        await conn.execute_script("DELETE FROM users")
+
+    now_utc = datetime.utcnow()
+    started = time.perf_counter()
+    await seed_users(size, due_ratio, now_utc)
+    print(f"\n{size:>9,} users seeded in {time.perf_counter() - started:.1f}s")
+
+    await drop_reminder_indexes(conn)
+    await conn.execute_script("ANALYZE")
+    plain_ms, rows = await _measure(now_utc, repeat)
+    plain_plan = await _first_page_plan(now_utc)
+
+    await apply_schema_updates(conn)
+    await conn.execute_script("ANALYZE")
+    indexed_ms, _ = await _measure(now_utc, repeat)
+    indexed_plan = await _first_page_plan(now_utc)
+
+    speedup = plain_ms / indexed_ms if indexed_ms else float("inf")
+    print(f"  due rows (both kinds): {rows:,}")
+    print(f"  without indexes: {plain_ms:9.1f} ms   plan: {plain_plan}")
+    print(f"  with indexes:    {indexed_ms:9.1f} ms   plan: {indexed_plan}")
+    print(f"  speedup: x{speedup:.1f}")
+
+    if truncate:
+        await conn.execute_script("DELETE FROM users")
+    await Tortoise.close_connections()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--due-ratio", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="очистить users перед засевом (обязательно для --db-url не в памяти)",
+    )
+    args = parser.parse_args()
+
+    in_memory = args.db_url == "sqlite://:memory:"
+    if not in_memory and not args.truncate:
+        parser.error("--db-url requires --truncate: the users table will be wiped")
+
+    for size in args.sizes:
+        await bench_size(
+            args.db_url, size, args.due_ratio, args.repeat, truncate=not in_memory
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
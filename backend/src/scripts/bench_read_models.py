@@ -0,0 +1,162 @@
+"""
+Бенчмарк проекций чтения: dataclass из values_list против полных моделей ORM.
+
+Засевает пользователя с N выполненными шагами, привязанными к дню, и для
+истории (step_repo.get_history) и списка шагов дня
+(daily_log_repo.get_day_steps) сравнивает тот же запрос с полными
+экземплярами Step. Печатает среднюю задержку и аллокации одного вызова.
+
+Запуск:
+    python -m src.scripts.bench_read_models
+    python -m src.scripts.bench_read_models --rows 100 1000 10000 --repeat 50
+
+AICODE-NOTE: Аллокации — tracemalloc на отдельном прогоне: блоки памяти,
+живые после вызова (то есть удерживаемые результатом), и пик во время
+вызова. Задержка меряется без tracemalloc.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime, timedelta
+
+from tortoise import Tortoise
+
+from src.database.migrations import apply_schema_updates
+from src.database.models import DailyLog, DailyLogStep, Goal, Stage, Step, User
+from src.storage import daily_log_repo, step_repo
+
+Query = Callable[[], Awaitable[list]]
+
+
+async def seed(rows: int) -> User:
+    """Пользователь с N выполненными шагами, назначенными на сегодня."""
+    today = date.today()
+    user = await User.create(telegram_id=8_000_000 + rows)
+    goal = await Goal.create(
+        user=user, title="Цель", start_date=today, deadline=today + timedelta(days=14)
+    )
+    stage = await Stage.create(
+        goal=goal, title="Этап", order=1, start_date=today, end_date=goal.deadline
+    )
+    now = datetime.now()
+    await Step.bulk_create(
+        [
+            Step(
+                stage=stage,
+                goal=goal,
+                user=user,
+                title=f"Шаг {i}",
+                status="completed",
+                completed_at=now - timedelta(minutes=i),
+                scheduled_date=today,
+            )
+            for i in range(rows)
+        ],
+        batch_size=1000,
+    )
+    log = await DailyLog.create(user=user, date=today)
+    step_ids = await Step.filter(user=user).values_list("id", flat=True)
+    await DailyLogStep.bulk_create(
+        [
+            DailyLogStep(daily_log=log, step_id=step_id, role="assigned")
+            for step_id in step_ids
+        ],
+        batch_size=1000,
+    )
+    return user
+
+
+def _queries(user: User, rows: int) -> dict[str, tuple[Query, Query]]:
+    """Сценарий -> (полные модели, проекция)."""
+    today = date.today()
+
+    async def history_orm() -> list:
+        return (
+            await Step.filter(
+                user_id=user.id, status="completed", completed_at__isnull=False
+            )
+            .order_by("-completed_at")
+            .limit(rows)
+        )
+
+    async def day_steps_orm() -> list:
+        return await Step.filter(
+            daily_log_links__daily_log__user_id=user.id,
+            daily_log_links__daily_log__date=today,
+            daily_log_links__role="assigned",
+        ).order_by("id")
+
+    return {
+        "history": (history_orm, lambda: step_repo.get_history(user.id, rows)),
+        "day steps": (
+            day_steps_orm,
+            lambda: daily_log_repo.get_day_steps(user, today),
+        ),
+    }
+
+
+async def _latency_ms(query: Query, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await query()
+        timings.append(time.perf_counter() - started)
+    return statistics.mean(timings) * 1000
+
+
+async def _allocations(query: Query) -> tuple[int, float]:
+    """(живых блоков после вызова, пик KiB во время вызова)."""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.reset_peak()
+    result = await query()
+    peak = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.stop()
+    blocks = sum(
+        stat.count_diff
+        for stat in after.compare_to(before, "filename")
+        if stat.count_diff > 0
+    )
+    del result
+    return blocks, peak / 1024
+
+
+async def run(args: argparse.Namespace) -> None:
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["src.database.models"]})
+    try:
+        await Tortoise.generate_schemas()
+        await apply_schema_updates()
+        for rows in args.rows:
+            user = await seed(rows)
+            print(f"{rows:,} rows:")
+            for name, (orm, projection) in _queries(user, rows).items():
+                # Прогрев: кэш запросов pypika/executor и страницы SQLite
+                await orm()
+                await projection()
+                for label, query in (("models", orm), ("projection", projection)):
+                    latency = await _latency_ms(query, args.repeat)
+                    blocks, peak_kib = await _allocations(query)
+                    print(
+                        f"  {name:<10} {label:<11} {latency:8.2f} ms  "
+                        f"{blocks:8,} blocks  peak {peak_kib:9.1f} KiB"
+                    )
+    finally:
+        await Tortoise.close_connections()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    await run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,16 +1,30 @@
-"""Проверка статуса этапов."""
+"""
+Проверка статуса этапов и согласованности денормализованных полей.
 
+Stage.total_count/completed_count/skipped_count обновляются инкрементально
+(step_repo) и могут разойтись с таблицей steps после ручных правок БД или
+удаления шагов. Goal.active_stage_id может разойтись со статусами этапов
+(несколько active, active без указателя). Скрипт показывает такие этапы и
+цели, с --fix — пересчитывает счётчики по steps и оставляет у цели один
+активный этап (тот, на который указывает цель, иначе последний по order).
+
+Запуск:
+    python -m src.scripts.check_stages
+    python -m src.scripts.check_stages --fix
+    python -m src.scripts.check_stages --list   # статус и прогресс всех этапов
+"""
+
+import argparse
 import asyncio
 
 from tortoise import Tortoise
 
 from src.database.config import TORTOISE_ORM
 from src.database.models import Stage
+from src.storage import stage_repo
 
 
-async def main():
-    await Tortoise.init(config=TORTOISE_ORM)
-
+async def list_stages() -> None:
     stages = await Stage.all().order_by("id")
     print("Current stages status:")
     print("-" * 60)
@@ -19,7 +33,60 @@ async def main():
         print(f"   status={s.status}, progress={s.progress}%")
     print("-" * 60)
 
-    await Tortoise.close_connections()
+
+async def check_counters(fix: bool) -> int:
+    """Вывести этапы с расхождением счётчиков; вернуть их количество."""
+    drifts = await stage_repo.find_counter_drift()
+    for d in drifts:
+        print(
+            f"Stage {d.stage_id}: "
+            f"total {d.total_count}→{d.actual_total}, "
+            f"completed {d.completed_count}→{d.actual_completed}, "
+            f"skipped {d.skipped_count}→{d.actual_skipped}"
+        )
+    if not drifts:
+        print("Stage counters are consistent")
+    elif fix:
+        fixed = await stage_repo.reconcile_counters([d.stage_id for d in drifts])
+        print(f"Reconciled counters for {fixed} stages")
+    else:
+        print(f"{len(drifts)} stages drifted, run with --fix to reconcile")
+    return len(drifts)
+
+
+async def check_active_stages(fix: bool) -> int:
+    """Вывести цели с расхождением active_stage_id; вернуть их количество."""
+    conflicts = await stage_repo.find_active_stage_conflicts()
+    for c in conflicts:
+        print(
+            f"Goal {c.goal_id}: active_stage_id={c.active_stage_id}, "
+            f"{c.active_count} active stages"
+        )
+    if not conflicts:
+        print("Active stage pointers are consistent")
+    elif fix:
+        for c in conflicts:
+            await stage_repo.repair_active_stage(c.goal_id)
+        print(f"Repaired active stage for {len(conflicts)} goals")
+    else:
+        print(f"{len(conflicts)} goals inconsistent, run with --fix to repair")
+    return len(conflicts)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fix", action="store_true", help="исправить расхождения")
+    parser.add_argument("--list", action="store_true", help="показать все этапы")
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        if args.list:
+            await list_stages()
+        await check_counters(args.fix)
+        await check_active_stages(args.fix)
+    finally:
+        await Tortoise.close_connections()
 
 
 if __name__ == "__main__":
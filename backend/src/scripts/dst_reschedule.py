@@ -0,0 +1,45 @@
+"""
+Пакетный пересчёт напоминаний перед переходом на летнее/зимнее время.
+
+Находит IANA-зоны пользователей, у которых смещение меняется в ближайшие
+(и прошедшие) --hours часов, и пересчитывает next_*_reminder_at всем
+пользователям этих зон — по одному UPDATE на группу, без save() по одному.
+
+Запуск (раз в сутки, например вместе с tune_reminders):
+    python -m src.scripts.dst_reschedule
+    python -m src.scripts.dst_reschedule --hours 72
+"""
+
+import argparse
+import asyncio
+from datetime import timedelta
+
+from tortoise import Tortoise
+
+from src.database.config import TORTOISE_ORM
+from src.services import reminders
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--hours", type=int, default=48, help="окно поиска перехода, часов"
+    )
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        counts = await reminders.reschedule_dst_zones(
+            horizon=timedelta(hours=args.hours)
+        )
+        print(
+            f"{counts['zones']} zones with a clock change, "
+            f"{counts['rescheduled']} reminders rescheduled, "
+            f"{counts['offsets_synced']} offsets synced"
+        )
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""
+Нагрузочный тест рассылки: process_reminders на синтетических пользователях.
+
+Засевает N пользователей (bench_due_reminders.seed_users: реалистичные
+времена и часовые пояса), подменяет Bot фейком с настраиваемой задержкой
+и долей ошибок и прогоняет один тик. Печатает длительность тика,
+отправок в секунду, запросов к БД на отправку и пиковую память.
+
+Запуск:
+    python -m src.scripts.load_test_reminders
+    python -m src.scripts.load_test_reminders --users 100000 --due-ratio 0.2 \\
+        --latency-ms 80 --error-rate 0.01 --blocked-rate 0.005 --shards 4
+    python -m src.scripts.load_test_reminders --db-url postgres://... --truncate
+
+AICODE-NOTE: По умолчанию лимит скорости снят (--rate-limit 0) — меряем
+сам конвейер, а не лимит Telegram. Запросы считаются по DEBUG-логу
+tortoise.db_client (одна запись — один round trip к БД). Пиковая память —
+tracemalloc во время тика (замедляет тик, отключается --no-tracemalloc)
+и max RSS процесса.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from tortoise import Tortoise
+from tortoise.log import db_client_logger
+
+from src.config import config
+from src.database.migrations import apply_schema_updates
+from src.scripts.bench_due_reminders import seed_users
+from src.services import reminders
+
+
+class FakeBot:
+    """Bot с send_message: задержка сети и случайные ошибки."""
+
+    def __init__(
+        self,
+        latency_ms: float,
+        error_rate: float,
+        blocked_rate: float,
+        seed: int = 42,
+    ) -> None:
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.blocked_rate = blocked_rate
+        self.sent = 0
+        self._rng = random.Random(seed)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        # Задержка ±50% вокруг средней
+        await asyncio.sleep(self.latency * self._rng.uniform(0.5, 1.5))
+        roll = self._rng.random()
+        if roll < self.blocked_rate:
+            raise TelegramForbiddenError(
+                method=SendMessage(chat_id=chat_id, text=text),
+                message="Forbidden: bot was blocked by the user",
+            )
+        if roll < self.blocked_rate + self.error_rate:
+            raise RuntimeError("synthetic network error")
+        self.sent += 1
+
+
+class QueryCounter(logging.Handler):
+    """Считает запросы к БД по DEBUG-записям tortoise.db_client."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = str(record.msg)
+        if not message.startswith(("Created connection", "Closed connection")):
+            self.count += 1
+
+    def __enter__(self) -> "QueryCounter":
+        self._saved = (db_client_logger.level, db_client_logger.propagate)
+        db_client_logger.setLevel(logging.DEBUG)
+        db_client_logger.propagate = False
+        db_client_logger.addHandler(self)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        db_client_logger.removeHandler(self)
+        db_client_logger.setLevel(self._saved[0])
+        db_client_logger.propagate = self._saved[1]
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — килобайты, macOS — байты
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+async def run(args: argparse.Namespace) -> None:
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["src.database.models"]})
+    try:
+        await _run(args)
+    finally:
+        await Tortoise.close_connections()
+
+
+async def _run(args: argparse.Namespace) -> None:
+    await Tortoise.generate_schemas()
+    await apply_schema_updates()
+    conn = Tortoise.get_connection("default")
+    if args.truncate:
+        await conn.execute_script("DELETE FROM reminder_outbox")
+        await conn.execute_script("DELETE FROM users")
+
+    now_utc = datetime.utcnow()
+    started = time.perf_counter()
+    await seed_users(args.users, args.due_ratio, now_utc)
+    await conn.execute_script("ANALYZE")
+    print(f"{args.users:,} users seeded in {time.perf_counter() - started:.1f}s")
+
+    # Синтетические ошибки ожидаемы — не засоряем вывод предупреждениями о ретраях
+    logging.getLogger(reminders.__name__).setLevel(logging.ERROR)
+    bot = FakeBot(args.latency_ms, args.error_rate, args.blocked_rate)
+    reminders.set_bot(bot)
+    reminders._rate_limiter = reminders.TokenBucket(rate=args.rate_limit or 1e9)
+    config.REMINDER_CONCURRENCY = args.concurrency
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    with QueryCounter() as queries:
+        started = time.perf_counter()
+        stats = await reminders.process_reminders_sharded(args.shards)
+        duration = time.perf_counter() - started
+    peak_mb = 0.0
+    if args.tracemalloc:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    attempts = bot.sent + stats["failed"]
+    print(f"  due reminders enqueued: {stats['enqueued']:,}")
+    print(
+        f"  sent: {bot.sent:,}  failed: {stats['failed']:,} "
+        f"(retry {stats['retry_scheduled']:,}, unreachable {stats['unreachable']:,})"
+    )
+    print(f"  tick duration:   {duration:8.2f} s")
+    print(f"  sends/sec:       {bot.sent / duration:8.1f}")
+    print(f"  DB queries:      {queries.count:8,}")
+    if attempts:
+        print(f"  queries/send:    {queries.count / attempts:8.3f}")
+    if args.tracemalloc:
+        print(f"  peak memory:     {peak_mb:8.1f} MB (tracemalloc, during tick)")
+    print(f"  max RSS:         {_max_rss_mb():8.1f} MB (process, incl. seeding)")
+
+    if args.truncate:
+        await conn.execute_script("DELETE FROM reminder_outbox")
+        await conn.execute_script("DELETE FROM users")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument(
+        "--due-ratio", type=float, default=0.1, help="доля due-пользователей"
+    )
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--blocked-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=0.0,
+        help="сообщений в секунду (0 — без лимита)",
+    )
+    parser.add_argument("--concurrency", type=int, default=config.REMINDER_CONCURRENCY)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="очистить users и reminder_outbox (обязательно для --db-url)",
+    )
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false")
+    args = parser.parse_args()
+
+    if args.db_url != "sqlite://:memory:" and not args.truncate:
+        parser.error("--db-url requires --truncate: users will be wiped")
+
+    await run(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,58 +1,113 @@
 """
 Скрипт для пересчёта прогресса всех этапов.
-Запуск: python -m src.scripts.recalc_progress
+
+Этапы обрабатываются пачками по id: на пачку один GROUP BY по steps и один
+bulk UPDATE только изменившихся этапов (плюс Goal.active_stage_id для
+сменивших статус), каждая пачка — в своей короткой транзакции. Поэтому скрипт можно запускать на живой базе, прерывать и
+запускать снова.
+
+Запуск:
+    python -m src.scripts.recalc_progress
+    python -m src.scripts.recalc_progress --dry-run   # только показать разницу
+    python -m src.scripts.recalc_progress --batch-size 5000
 """
 
+import argparse
 import asyncio
+import time
 
 from tortoise import Tortoise
+from tortoise.transactions import in_transaction
 
+from src.core.domain.stage_rules import calculate_stage_progress, next_stage_status
 from src.database.config import TORTOISE_ORM
-from src.database.models import Stage, Step
-
-
-async def recalculate_all_stages():
-    """Пересчитывает прогресс для всех этапов."""
-    await Tortoise.init(config=TORTOISE_ORM)
-
-    stages = await Stage.all()
-    print(f"Found {len(stages)} stages to recalculate")
-
-    for stage in stages:
-        # Получаем все шаги этапа
-        all_steps = await Step.filter(stage_id=stage.id)
-        total_count = len(all_steps)
-
-        if total_count == 0:
-            print(f"  Stage {stage.id} '{stage.title}': no steps, skipping")
-            continue
-
-        # Считаем выполненные шаги
-        completed_count = sum(1 for s in all_steps if s.status == "completed")
-
-        # Рассчитываем прогресс
-        new_progress = int((completed_count / total_count) * 100)
-        old_progress = stage.progress
-
-        stage.progress = new_progress
-
-        # Проверяем статус
-        finished_count = sum(
-            1 for s in all_steps if s.status in ("completed", "skipped")
+from src.database.models import Goal, Stage
+from src.storage import stage_repo
+from src.storage.stage_repo import StageStepCounts
+
+
+def _recalculated(row: StageStepCounts) -> Stage | None:
+    """Этап с новыми progress/status или None, если менять нечего."""
+    if row.total_count == 0:
+        return None
+    stage = Stage(
+        id=row.stage_id,
+        goal_id=row.goal_id,
+        status=row.status,
+        total_count=row.total_count,
+        completed_count=row.completed_count,
+        skipped_count=row.skipped_count,
+    )
+    stage.progress = calculate_stage_progress(stage)
+    stage.status = next_stage_status(stage, Goal(status=row.goal_status))
+    if (stage.progress, stage.status) == (row.progress, row.status):
+        return None
+    return stage
+
+
+async def _process_batch(
+    after_id: int, batch_size: int, dry_run: bool
+) -> tuple[list[StageStepCounts], list[Stage]]:
+    """Пересчитать одну пачку; вернуть её строки и изменённые этапы."""
+    rows = await stage_repo.get_step_counts_batch(after_id, batch_size, lock=True)
+    changed = [stage for row in rows if (stage := _recalculated(row))]
+    old = {row.stage_id: row for row in rows}
+    if dry_run:
+        for stage in changed:
+            row = old[stage.id]
+            print(
+                f"  Stage {stage.id}: {row.progress}% -> {stage.progress}%, "
+                f"{row.status} -> {stage.status} "
+                f"({row.completed_count}/{row.total_count} completed)"
+            )
+    else:
+        await stage_repo.bulk_update_stages(changed, ["progress", "status"])
+        # Сменившие статус этапы двигают указатель цели в той же транзакции
+        await stage_repo.move_active_pointers(
+            [stage for stage in changed if stage.status != old[stage.id].status]
         )
-        if finished_count == total_count and completed_count > 0:
-            stage.status = "completed"
-        elif stage.status == "pending" and completed_count > 0:
-            stage.status = "active"
-
-        await stage.save()
+    return rows, changed
+
+
+async def recalculate_all_stages(batch_size: int, dry_run: bool = False) -> int:
+    """Пересчитать прогресс всех этапов; вернуть число изменённых."""
+    processed = 0
+    updated = 0
+    after_id = 0
+    started = time.perf_counter()
+    while True:
+        # Блокировка строк пачки держится только до конца её транзакции
+        async with in_transaction():
+            rows, changed = await _process_batch(after_id, batch_size, dry_run)
+        if not rows:
+            break
+        processed += len(rows)
+        updated += len(changed)
+        after_id = rows[-1].stage_id
+        elapsed = time.perf_counter() - started
         print(
-            f"  Stage {stage.id} '{stage.title}': {old_progress}% -> {new_progress}% ({completed_count}/{total_count} completed)"
+            f"  {processed:,} stages (up to id {after_id}), {updated:,} changed, "
+            f"{processed / elapsed:,.0f} rows/s"
         )
+    return updated
+
 
-    await Tortoise.close_connections()
-    print("\nDone!")
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="показать разницу без записи"
+    )
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        updated = await recalculate_all_stages(args.batch_size, args.dry_run)
+        verb = "would change" if args.dry_run else "updated"
+        print(f"\nDone! {updated:,} stages {verb}")
+    finally:
+        await Tortoise.close_connections()
 
 
 if __name__ == "__main__":
-    asyncio.run(recalculate_all_stages())
+    asyncio.run(main())
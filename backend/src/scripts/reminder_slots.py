@@ -0,0 +1,92 @@
+"""
+Гистограмма запланированных слотов напоминаний по минутам (UTC).
+
+Показывает, насколько равномерно разнесены next_*_reminder_at после
+сдвига слотов (REMINDER_JITTER_MINUTES): без сдвига почти все пользователи
+попадают в одну минуту 09:00 / 21:00 по своему часовому поясу.
+
+Запуск:
+    python -m src.scripts.reminder_slots                  # из БД, ближайшие 24 часа
+    python -m src.scripts.reminder_slots --simulate 10000 # без БД, синтетические id
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+from tortoise import Tortoise
+
+from src.database.config import TORTOISE_ORM
+from src.services.reminders import calculate_next_reminder_time
+from src.storage import reminder_repo
+
+BAR_WIDTH = 50
+
+
+async def slots_from_db(now_utc: datetime) -> dict[str, Counter]:
+    """Минутные слоты next_*_reminder_at на ближайшие сутки, по видам."""
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        slots: dict[str, Counter] = {}
+        for kind in reminder_repo.REMINDER_FIELDS:
+            counter: Counter = Counter()
+            async for chunk in reminder_repo.iter_due_reminders(
+                kind, now_utc + timedelta(days=1)
+            ):
+                # Tortoise отдаёт время в UTC — оставляем naive для вывода
+                counter.update(
+                    r.due_at.replace(tzinfo=None, second=0, microsecond=0)
+                    for r in chunk
+                )
+            slots[kind] = counter
+        return slots
+    finally:
+        await Tortoise.close_connections()
+
+
+def simulate_slots(count: int, now_utc: datetime) -> dict[str, Counter]:
+    """Слоты для `count` пользователей с настройками по умолчанию (09:00 / 21:00, UTC+3)."""
+    slots: dict[str, Counter] = {}
+    for kind, reminder_time in (("morning", "09:00"), ("evening", "21:00")):
+        slots[kind] = Counter(
+            calculate_next_reminder_time(reminder_time, 3, now_utc, user_id)
+            for user_id in range(1, count + 1)
+        )
+    return slots
+
+
+def print_histogram(kind: str, counter: Counter) -> None:
+    total = sum(counter.values())
+    print(f"\n{kind}: {total} reminders in {len(counter)} distinct minutes")
+    if not counter:
+        return
+    peak = max(counter.values())
+    for slot in sorted(counter):
+        bar = "#" * max(1, round(counter[slot] / peak * BAR_WIDTH))
+        print(f"  {slot:%m-%d %H:%M}  {counter[slot]:>7}  {bar}")
+    print(f"  peak minute: {peak} ({peak / total:.1%} of {kind})")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--simulate",
+        type=int,
+        metavar="N",
+        help="не читать БД, посчитать слоты для N синтетических пользователей",
+    )
+    args = parser.parse_args()
+
+    now_utc = datetime.utcnow()
+    if args.simulate:
+        slots = simulate_slots(args.simulate, now_utc)
+    else:
+        slots = await slots_from_db(now_utc)
+
+    for kind, counter in slots.items():
+        print_histogram(kind, counter)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""
+Ночной подбор времени утреннего напоминания по активности пользователей.
+
+Без --apply только печатает предложения. С --apply записывает новое
+reminder_morning тем, кто остался на 09:00 по умолчанию (с --override —
+всем), и пересчитывает next_morning_reminder_at.
+
+Запуск (например, Railway cron раз в сутки ночью):
+    python -m src.scripts.tune_reminders                  # отчёт
+    python -m src.scripts.tune_reminders --apply          # применить
+    python -m src.scripts.tune_reminders --apply --days 14 --override
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+
+from tortoise import Tortoise
+
+from src.database.config import TORTOISE_ORM
+from src.services import reminder_timing
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=reminder_timing.HISTORY_DAYS,
+        help="за сколько дней смотреть активность",
+    )
+    parser.add_argument("--apply", action="store_true", help="записать новые времена")
+    parser.add_argument(
+        "--override",
+        action="store_true",
+        help="менять и время, выбранное пользователем вручную",
+    )
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        suggestions = await reminder_timing.compute_suggestions(days=args.days)
+        print(f"{len(suggestions)} users would get a different morning time")
+        moves = Counter((s.current, s.suggested) for s in suggestions)
+        for (current, suggested), count in moves.most_common(20):
+            print(f"  {current} -> {suggested}: {count}")
+
+        if args.apply:
+            updated = await reminder_timing.apply_suggestions(
+                suggestions, override=args.override
+            )
+            print(f"Applied to {updated} users")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
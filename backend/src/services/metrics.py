@@ -0,0 +1,164 @@
+"""
+Метрики процесса — счётчики и гистограммы в памяти.
+
+Без внешних зависимостей: значения живут в процессе (на каждой реплике свои)
+и отдаются в текстовом формате Prometheus через /cron/metrics.
+
+Использование:
+    SENT = Counter("reminder_sent_total", "Доставленные напоминания", ("kind",))
+    SENT.inc(kind="morning")
+
+    LATENESS = Histogram("reminder_lateness_seconds", "...", LATENESS_BUCKETS)
+    LATENESS.observe(12.5)
+"""
+
+import bisect
+import math
+from collections import defaultdict
+
+# Все созданные метрики в порядке объявления (для экспозиции)
+_REGISTRY: list["Counter | Histogram"] = []
+
+
+def _label_key(labelnames: tuple[str, ...], labels: dict[str, str]) -> tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с необязательными метками."""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = defaultdict(float)
+        _REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        self._values[_label_key(self.labelnames, labels)] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def reset(self) -> None:
+        self._values.clear()
+
+    def expose(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for key, value in sorted(self._values.items()):
+            labels = _format_labels(list(zip(self.labelnames, key, strict=True)))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, buckets: int) -> None:
+        self.counts = [0] * buckets
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными верхними границами корзин (le).
+
+    Экспозиция кумулятивная, как в Prometheus; +Inf добавляется сама.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...],
+        labelnames: tuple[str, ...] = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(map(float, buckets))) + (math.inf,)
+        self._series: dict[tuple[str, ...], _HistogramSeries] = {}
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(self.labelnames, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _HistogramSeries(len(self.buckets))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.count += 1
+        series.sum += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series.count if series else 0
+
+    def quantile(self, q: float, **labels: str) -> float | None:
+        """Оценка квантиля: верхняя граница корзины, в которую он попадает."""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series.count:
+            return None
+        rank = q * series.count
+        seen = 0
+        for bound, n in zip(self.buckets, series.counts, strict=True):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def reset(self) -> None:
+        self._series.clear()
+
+    def expose(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, series in sorted(self._series.items()):
+            pairs = list(zip(self.labelnames, key, strict=True))
+            cumulative = 0
+            for bound, n in zip(self.buckets, series.counts, strict=True):
+                cumulative += n
+                labels = _format_labels(pairs + [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(pairs)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """Все метрики процесса в текстовом формате Prometheus."""
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+def reset_all() -> None:
+    """Обнулить все метрики (для тестов)."""
+    for metric in _REGISTRY:
+        metric.reset()
@@ -0,0 +1,158 @@
+"""
+Подбор времени утреннего напоминания по реальной активности.
+
+Ночной батч (scripts/tune_reminders.py):
+1. Для всех пользователей сразу строим гистограмму локального часа первой
+   активности за день (выполненный Step, DailyLog) за последние HISTORY_DAYS
+   — агрегация в БД, см. reminder_repo.first_activity_hours
+2. Предлагаем reminder_morning = начало самого частого «утреннего» часа
+3. С --apply массово записываем новые времена и пересчитываем
+   next_morning_reminder_at — по одному UPDATE на группу
+
+Напоминание приходит, когда пользователь обычно и так начинает день,
+а не в 09:00 по умолчанию, — меньше отправок уходит впустую.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from tortoise.transactions import in_transaction
+
+from src.services import reminders
+from src.storage import reminder_repo
+from src.storage.reminder_repo import DueReminder
+
+logger = logging.getLogger(__name__)
+
+# За сколько дней смотреть активность
+HISTORY_DAYS = 28
+
+# Минимум дней с первой активностью в утреннем окне для предложения
+MIN_ACTIVE_DAYS = 5
+
+# Утреннее окно (локальные часы, [start, end)): вне его reminder_morning не ставим
+MORNING_WINDOW = (5, 12)
+
+# Значение по умолчанию: такие пользователи времени сами не выбирали
+DEFAULT_MORNING = "09:00"
+
+
+@dataclass(slots=True)
+class TimeSuggestion:
+    """Предложенное время утреннего напоминания для пользователя."""
+
+    user_id: int
+    current: str
+    suggested: str
+    active_days: int  # дней с первой активностью в утреннем окне
+
+
+def build_histograms(rows: list[tuple[int, int, int]]) -> dict[int, list[int]]:
+    """[(user_id, час, дней), ...] -> {user_id: [дней по часам 0-23]}."""
+    histograms: dict[int, list[int]] = defaultdict(lambda: [0] * 24)
+    for user_id, hour, days in rows:
+        histograms[user_id][hour] += days
+    return dict(histograms)
+
+
+def suggest_morning_time(
+    histogram: list[int], min_days: int = MIN_ACTIVE_DAYS
+) -> str | None:
+    """
+    Время HH:00 самого частого часа первой активности в утреннем окне.
+
+    При равенстве берётся более ранний час. None — данных мало.
+    """
+    start, end = MORNING_WINDOW
+    window = histogram[start:end]
+    if sum(window) < min_days:
+        return None
+    peak = max(range(len(window)), key=lambda i: (window[i], -i))
+    return f"{start + peak:02d}:00"
+
+
+async def compute_suggestions(
+    now_utc: datetime | None = None, days: int = HISTORY_DAYS
+) -> list[TimeSuggestion]:
+    """
+    Предложения для всех пользователей, у которых время стоит сменить.
+
+    Returns:
+        Только пользователи, чьё предложенное время отличается от текущего
+    """
+    now_utc = now_utc or datetime.utcnow()
+    rows = await reminder_repo.first_activity_hours(
+        now_utc - timedelta(days=days), now_utc
+    )
+    histograms = build_histograms(rows)
+
+    candidates: dict[int, tuple[str, int]] = {}
+    start, end = MORNING_WINDOW
+    for user_id, histogram in histograms.items():
+        suggested = suggest_morning_time(histogram)
+        if suggested is not None:
+            candidates[user_id] = (suggested, sum(histogram[start:end]))
+
+    settings = await reminder_repo.get_reminder_settings("morning", list(candidates))
+    return [
+        TimeSuggestion(s.user_id, s.reminder_time, *candidates[s.user_id])
+        for s in settings
+        if s.reminder_time != candidates[s.user_id][0]
+    ]
+
+
+async def apply_suggestions(
+    suggestions: list[TimeSuggestion],
+    now_utc: datetime | None = None,
+    override: bool = False,
+) -> int:
+    """
+    Записать предложенные времена одним проходом.
+
+    Args:
+        suggestions: Результат compute_suggestions
+        override: Менять и время, выбранное пользователем вручную
+            (по умолчанию — только у тех, кто остался на DEFAULT_MORNING)
+
+    Returns:
+        Количество пользователей с новым временем
+    """
+    now_utc = now_utc or datetime.utcnow()
+    chosen = [s for s in suggestions if override or s.current == DEFAULT_MORNING]
+    if not chosen:
+        return 0
+
+    by_time: dict[str, list[int]] = defaultdict(list)
+    for suggestion in chosen:
+        by_time[suggestion.suggested].append(suggestion.user_id)
+    suggested_by_user = {s.user_id: s.suggested for s in chosen}
+
+    settings = await reminder_repo.get_reminder_settings(
+        "morning", list(suggested_by_user)
+    )
+    # Пересчитываем next_* только активным: у выключенных и недоступных он NULL
+    to_reschedule = [
+        DueReminder(
+            "morning",
+            s.user_id,
+            s.telegram_id,
+            suggested_by_user[s.user_id],
+            s.timezone_offset,
+            now_utc,
+            s.timezone,
+        )
+        for s in settings
+        if s.active
+    ]
+
+    async with in_transaction():
+        updated = await reminder_repo.set_reminder_times("morning", by_time)
+        await reminders.reschedule_reminders("morning", to_reschedule, now_utc)
+
+    logger.info(
+        f"Morning reminder time tuned for {updated} users "
+        f"({len(by_time)} distinct times)"
+    )
+    return updated
@@ -4,25 +4,113 @@ Reminder Service — напоминания через cron tick.
 Простая архитектура:
 1. Храним next_morning_reminder_at и next_evening_reminder_at в User (UTC)
 2. /cron/tick вызывается каждые N минут (например, каждые 5 минут)
-3. Выбираем всех пользователей где next_*_reminder_at <= now
-4. Отправляем напоминание
-5. Пересчитываем next_*_reminder_at на следующий день
+3. Захватываем страницы пользователей где next_*_reminder_at <= now
+   (next_* сдвигается на время аренды — параллельные тики не пересекаются)
+4. В одной транзакции кладём их в reminder_outbox (ключ — user, kind, локальная
+   дата) и пересчитываем next_*_reminder_at на следующий день — одним UPDATE
+   на группу (reminder_time, timezone_offset), только колонку напоминания
+5. Рассылаем доставки outbox пулом воркеров с общим лимитом скорости Telegram;
+   неудачные повторяются с экспоненциальным backoff до max attempts
+
+Догон после простоя: напоминания, просроченные дольше
+REMINDER_STALE_AFTER_MINUTES, только переназначаются; у кого просрочены
+и утро, и вечер — получает одно объединённое сообщение (kind="digest").
 
 Без APScheduler, без greenlet, без libstdc++.so.6 — чистая математика дат.
+
+Опционально (REMINDER_SCHEDULER_ENABLED) вместо внешнего cron работает
+ReminderScheduler — min-heap ближайших напоминаний в памяти процесса,
+который будит рассылку ровно в момент due.
 """
 
+import asyncio
+import hashlib
+import heapq
+import itertools
 import logging
-from datetime import datetime, time, timedelta
+import time as time_module
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from datetime import UTC, date, datetime, time, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from tortoise.transactions import in_transaction
 
+from src.config import config
 from src.database.models import User
+from src.services import metrics
+from src.storage import outbox_repo, reminder_repo
+from src.storage.outbox_repo import OutboxDelivery
+from src.storage.reminder_repo import DueReminder, Shard
 
 logger = logging.getLogger(__name__)
 
+MORNING_REMINDER_TEXT = (
+    "🌅 *Доброе утро!*\n\n"
+    "Как твоя энергия сегодня? Давай спланируем день.\n\n"
+    "Напиши /morning"
+)
+
+EVENING_REMINDER_TEXT = (
+    "🌙 *Вечер!*\n\nКак прошёл день? Давай подведём итоги.\n\nНапиши /evening"
+)
+
+DIGEST_REMINDER_TEXT = (
+    "🌗 *Я ненадолго пропал — наверстаем!*\n\n"
+    "Как твоя энергия и как идёт день? Спланируй остаток дня "
+    "или подведи итоги.\n\n"
+    "Напиши /morning или /evening"
+)
+
+# Объединённое напоминание: у пользователя просрочены сразу утро и вечер
+DIGEST_KIND = "digest"
+
+# SLO-метрики рассылки (экспозиция — /cron/metrics)
+REMINDER_LATENESS = metrics.Histogram(
+    "reminder_lateness_seconds",
+    "Опоздание доставки: фактическая отправка минус next_*_reminder_at",
+    (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+    ("kind",),
+)
+REMINDER_TICK_DURATION = metrics.Histogram(
+    "reminder_tick_duration_seconds",
+    "Длительность тика рассылки",
+    (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600),
+)
+REMINDER_USERS_SCANNED = metrics.Counter(
+    "reminder_users_scanned_total",
+    "Захвачено due-пользователей (поставлено в outbox)",
+    ("kind",),
+)
+REMINDER_SENT = metrics.Counter(
+    "reminder_sent_total", "Доставленные напоминания", ("kind",)
+)
+REMINDER_SKIPPED_STALE = metrics.Counter(
+    "reminder_skipped_stale_total",
+    "Просроченные дольше REMINDER_STALE_AFTER_MINUTES: только переназначены",
+    ("kind",),
+)
+REMINDER_FAILURES = metrics.Counter(
+    "reminder_failures_total",
+    "Неудачные попытки отправки по классу ошибки",
+    ("error_class",),
+)
+
 # Глобальный Bot для отправки сообщений
 _bot: Bot | None = None
 
+# Глобальный лимитер отправки (создаётся лениво из config)
+_rate_limiter: "TokenBucket | None" = None
+
+# In-process планировщик (None — напоминания шлёт только /cron/tick)
+_scheduler: "ReminderScheduler | None" = None
+
 
 def set_bot(bot: Bot) -> None:
     """Установить инстанс бота для использования в напоминаниях."""
@@ -37,8 +125,96 @@ def get_bot() -> Bot:
     return _bot
 
 
+class TokenBucket:
+    """
+    Token bucket для глобального лимита отправки сообщений.
+
+    Telegram допускает ~30 сообщений в секунду на бота, поэтому лимит
+    общий для всех воркеров рассылки. `pause()` останавливает выдачу
+    токенов на время retry_after после ответа 429.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time_module.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Не выдавать токены следующие `seconds` секунд."""
+        self._paused_until = max(self._paused_until, time_module.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated_at = self._paused_until
+
+    async def acquire(self) -> None:
+        """Дождаться свободного токена."""
+        async with self._lock:
+            while True:
+                now = time_module.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                elapsed = max(0.0, now - self._updated_at)
+                self._updated_at = now
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Получить глобальный лимитер отправки напоминаний."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket(rate=config.REMINDER_RATE_LIMIT)
+    return _rate_limiter
+
+
+def reminder_jitter(user_id: int) -> timedelta:
+    """
+    Детерминированный сдвиг напоминаний пользователя: целые минуты
+    в [-REMINDER_JITTER_MINUTES, +REMINDER_JITTER_MINUTES].
+
+    Почти все пользователи оставляют 09:00 / 21:00 по умолчанию — без сдвига
+    они становятся due в одну минуту (пик отправок, а следом пик /morning
+    с запросами к OpenAI). Сдвиг равномерно размазывает их по окну
+    и не меняется от дня к дню (хэш от user.id, а не random).
+    """
+    spread = config.REMINDER_JITTER_MINUTES
+    if spread <= 0:
+        return timedelta(0)
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=4).digest()
+    return timedelta(minutes=int.from_bytes(digest, "big") % (2 * spread + 1) - spread)
+
+
+def resolve_zone(timezone_offset: int, tz_name: str | None = None) -> tzinfo:
+    """Часовой пояс пользователя: IANA-зона, если задана, иначе фиксированный сдвиг."""
+    if tz_name:
+        return ZoneInfo(tz_name)
+    return timezone(timedelta(hours=timezone_offset))
+
+
+def _zone_offset(tz_name: str, at_utc: datetime) -> timedelta:
+    """Смещение зоны от UTC в момент at_utc (naive UTC)."""
+    return at_utc.replace(tzinfo=UTC).astimezone(ZoneInfo(tz_name)).utcoffset()
+
+
+def zone_offset_hours(tz_name: str, at_utc: datetime) -> int:
+    """Смещение зоны в момент at_utc в целых часах (вниз, для timezone_offset)."""
+    return int(_zone_offset(tz_name, at_utc).total_seconds() // 3600)
+
+
 def calculate_next_reminder_time(
-    reminder_time: str, timezone_offset: int, from_datetime: datetime | None = None
+    reminder_time: str,
+    timezone_offset: int,
+    from_datetime: datetime | None = None,
+    user_id: int | None = None,
+    tz_name: str | None = None,
 ) -> datetime:
     """
     Вычислить следующее время напоминания в UTC.
@@ -47,6 +223,10 @@ def calculate_next_reminder_time(
         reminder_time: Время в формате HH:MM (в часовом поясе пользователя)
         timezone_offset: Смещение часового пояса от UTC (например, +3 для МСК)
         from_datetime: От какого времени считать (по умолчанию — сейчас UTC)
+        user_id: Если указан — применяется сдвиг reminder_jitter(user_id)
+        tz_name: IANA-зона ("Europe/Berlin") — если задана, вместо
+            timezone_offset; смещение берётся на дату напоминания,
+            поэтому переход на летнее время учитывается
 
     Returns:
         datetime в UTC когда нужно отправить напоминание
@@ -58,20 +238,23 @@ def calculate_next_reminder_time(
     hour, minute = map(int, reminder_time.split(":"))
     local_time = time(hour, minute)
 
-    # Получаем сегодняшнюю дату в часовом поясе пользователя
-    # from_datetime - это UTC, прибавляем offset чтобы получить local
-    user_local_now = from_datetime + timedelta(hours=timezone_offset)
-    user_local_date = user_local_now.date()
-
-    # Создаём datetime в локальном времени пользователя
-    local_reminder_dt = datetime.combine(user_local_date, local_time)
+    # Сегодняшняя дата в часовом поясе пользователя
+    zone = resolve_zone(timezone_offset, tz_name)
+    user_local_date = from_datetime.replace(tzinfo=UTC).astimezone(zone).date()
+    jitter = reminder_jitter(user_id) if user_id is not None else timedelta(0)
 
-    # Если это время уже прошло сегодня — берём завтра
-    if local_reminder_dt <= user_local_now:
-        local_reminder_dt += timedelta(days=1)
-
-    # Конвертируем обратно в UTC
-    utc_reminder_dt = local_reminder_dt - timedelta(hours=timezone_offset)
+    # Сегодня в HH:MM по местным часам (со сдвигом слота); если уже прошло —
+    # завтра. Перевод в UTC — по смещению зоны на эту дату, а не на сегодня.
+    for days in (0, 1):
+        local_reminder_dt = (
+            datetime.combine(user_local_date + timedelta(days=days), local_time)
+            + jitter
+        )
+        utc_reminder_dt = (
+            local_reminder_dt.replace(tzinfo=zone).astimezone(UTC).replace(tzinfo=None)
+        )
+        if utc_reminder_dt > from_datetime:
+            break
 
     return utc_reminder_dt
 
@@ -82,6 +265,8 @@ async def setup_user_reminders(user: User) -> None:
     Вычисляет next_morning_reminder_at и next_evening_reminder_at.
     """
     if not user.reminders_enabled:
+        if _scheduler is not None:
+            _scheduler.schedule_user(user)
         logger.info(f"Reminders disabled for user {user.telegram_id}")
         return
 
@@ -89,15 +274,20 @@ async def setup_user_reminders(user: User) -> None:
 
     # Вычисляем следующее утреннее напоминание
     user.next_morning_reminder_at = calculate_next_reminder_time(
-        user.reminder_morning, user.timezone_offset, now_utc
+        user.reminder_morning, user.timezone_offset, now_utc, user.id, user.timezone
     )
 
     # Вычисляем следующее вечернее напоминание
     user.next_evening_reminder_at = calculate_next_reminder_time(
-        user.reminder_evening, user.timezone_offset, now_utc
+        user.reminder_evening, user.timezone_offset, now_utc, user.id, user.timezone
     )
 
-    await user.save()
+    await user.save(
+        update_fields=["next_morning_reminder_at", "next_evening_reminder_at"]
+    )
+
+    if _scheduler is not None:
+        _scheduler.schedule_user(user)
 
     logger.info(
         f"Reminders set for user {user.telegram_id}: "
@@ -105,88 +295,847 @@ async def setup_user_reminders(user: User) -> None:
     )
 
 
-async def send_morning_reminder(user: User) -> None:
-    """Отправить утреннее напоминание пользователю."""
+async def _send_reminder(chat_id: int, text: str) -> None:
+    """
+    Отправить напоминание с учётом глобального лимита Telegram.
+
+    На 429 Telegram присылает retry_after — ставим весь bucket на паузу
+    (лимит общий для бота) и повторяем, пока не исчерпаем REMINDER_MAX_RETRIES.
+    Остальные ошибки пробрасываются вызывающему.
+    """
     bot = get_bot()
-    try:
-        await bot.send_message(
-            chat_id=user.telegram_id,
-            text=(
-                "🌅 *Доброе утро!*\n\n"
-                "Как твоя энергия сегодня? Давай спланируем день.\n\n"
-                "Напиши /morning"
-            ),
-            parse_mode="Markdown",
+    limiter = get_rate_limiter()
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown")
+            return
+        except TelegramRetryAfter as e:
+            attempt += 1
+            if attempt > config.REMINDER_MAX_RETRIES:
+                raise
+            logger.warning(
+                f"Telegram flood limit for {chat_id}: retry after {e.retry_after}s "
+                f"(attempt {attempt}/{config.REMINDER_MAX_RETRIES})"
+            )
+            limiter.pause(e.retry_after)
+
+
+_REMINDER_TEXTS: dict[str, str] = {
+    "morning": MORNING_REMINDER_TEXT,
+    "evening": EVENING_REMINDER_TEXT,
+    DIGEST_KIND: DIGEST_REMINDER_TEXT,
+}
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    """Tortoise отдаёт aware-datetime, расчёты ведутся в naive UTC — приводим к одному."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(UTC).replace(tzinfo=None)
+
+
+def reminder_local_date(reminder: DueReminder) -> date:
+    """Локальная дата пользователя, на которую пришлось напоминание."""
+    zone = resolve_zone(reminder.timezone_offset, reminder.timezone)
+    due_at = _as_naive_utc(reminder.due_at).replace(tzinfo=UTC)
+    return due_at.astimezone(zone).date()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальный backoff: base, 2*base, 4*base... но не больше max."""
+    delay = config.REMINDER_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(delay, config.REMINDER_RETRY_MAX_SECONDS))
+
+
+async def reschedule_reminders(
+    kind: str, reminders: list[DueReminder], now_utc: datetime
+) -> int:
+    """
+    Переназначить следующее напоминание для поставленных в outbox.
+
+    Следующее время зависит только от (reminder_time, часовой пояс,
+    сдвиг пользователя), поэтому считаем его один раз на группу и пишем
+    одним UPDATE на группу. Сдвиг — целые минуты, так что групп не больше
+    чем слотов × (2 * REMINDER_JITTER_MINUTES + 1).
+
+    Returns:
+        Количество обновлённых строк
+    """
+    by_slot: dict[tuple[str, int, str | None, timedelta], list[int]] = defaultdict(list)
+    for reminder in reminders:
+        key = (
+            reminder.reminder_time,
+            reminder.timezone_offset,
+            reminder.timezone,
+            reminder_jitter(reminder.user_id),
         )
-        logger.info(f"Morning reminder sent to user {user.telegram_id}")
+        by_slot[key].append(reminder.user_id)
 
-        # Пересчитываем следующее утреннее напоминание (завтра)
-        user.next_morning_reminder_at = calculate_next_reminder_time(
-            user.reminder_morning, user.timezone_offset
+    groups: dict[datetime, list[int]] = defaultdict(list)
+    for (reminder_time, timezone_offset, tz_name, _), user_ids in by_slot.items():
+        # У всех в группе одинаковый сдвиг — считаем по первому
+        next_at = calculate_next_reminder_time(
+            reminder_time, timezone_offset, now_utc, user_ids[0], tz_name
         )
-        await user.save()
+        groups[next_at].extend(user_ids)
 
-    except Exception as e:
-        logger.error(f"Failed to send morning reminder to {user.telegram_id}: {e}")
+    return await reminder_repo.set_next_reminders(kind, groups)
 
 
-async def send_evening_reminder(user: User) -> None:
-    """Отправить вечернее напоминание пользователю."""
-    bot = get_bot()
+async def set_user_timezone(user: User, tz_name: str) -> None:
+    """
+    Задать пользователю IANA-зону и перепланировать напоминания.
+
+    timezone_offset синхронизируется с текущим смещением зоны (для старого
+    кода и SQL-агрегаций по локальному часу).
+
+    Raises:
+        ValueError: Неизвестная зона
+    """
     try:
-        await bot.send_message(
-            chat_id=user.telegram_id,
-            text=(
-                "🌙 *Вечер!*\n\n"
-                "Как прошёл день? Давай подведём итоги.\n\n"
-                "Напиши /evening"
-            ),
-            parse_mode="Markdown",
+        ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"Unknown timezone: {tz_name}") from e
+
+    user.timezone = tz_name
+    user.timezone_offset = zone_offset_hours(tz_name, datetime.utcnow())
+    # Сохраняем отдельно: setup_user_reminders пишет только next_*
+    # и ничего не пишет при выключенных напоминаниях
+    await user.save(update_fields=["timezone", "timezone_offset"])
+    await setup_user_reminders(user)
+
+
+def transitioning_zones(
+    zones: list[str], now_utc: datetime, horizon: timedelta
+) -> list[str]:
+    """
+    Зоны, у которых смещение меняется в окне [now - horizon, now + horizon].
+
+    Переходы бывают пару раз в год, поэтому достаточно сравнить края окна.
+    """
+    start, end = now_utc - horizon, now_utc + horizon
+    return [
+        zone for zone in zones if _zone_offset(zone, start) != _zone_offset(zone, end)
+    ]
+
+
+async def reschedule_dst_zones(
+    now_utc: datetime | None = None, horizon: timedelta = timedelta(hours=48)
+) -> dict[str, int]:
+    """
+    Пакетный пересчёт напоминаний у зон с близким переходом часов.
+
+    calculate_next_reminder_time уже учитывает смещение на дату напоминания,
+    так что это страховка для next_*, посчитанных до перехода по старому
+    смещению (старый код, обновление tzdata). Пользователи выбираются
+    страницами по зоне, пересчитываются через reschedule_reminders —
+    один UPDATE на группу (время, зона, сдвиг), без save() по одному.
+    timezone_offset синхронизируется с текущим смещением зоны.
+
+    Returns:
+        {"zones": N, "rescheduled": N, "offsets_synced": N}
+    """
+    now_utc = now_utc or datetime.utcnow()
+    zones = transitioning_zones(
+        await reminder_repo.distinct_timezones(), now_utc, horizon
+    )
+    counts = {"zones": len(zones), "rescheduled": 0, "offsets_synced": 0}
+    if not zones:
+        return counts
+
+    for kind in reminder_repo.REMINDER_FIELDS:
+        async for chunk in reminder_repo.iter_zone_reminders(
+            kind, zones, now_utc, config.REMINDER_BATCH_SIZE
+        ):
+            counts["rescheduled"] += await reschedule_reminders(kind, chunk, now_utc)
+
+    counts["offsets_synced"] = await reminder_repo.set_timezone_offsets(
+        {zone: zone_offset_hours(zone, now_utc) for zone in zones}
+    )
+    logger.info(
+        f"DST reschedule: {counts['rescheduled']} reminders in "
+        f"{len(zones)} zones ({', '.join(zones)})"
+    )
+    return counts
+
+
+async def _iter_due(
+    now_utc: datetime, lease_until: datetime, shard: Shard | None = None
+) -> AsyncIterator[list[DueReminder]]:
+    """
+    Захватить все просроченные напоминания: сначала утренние, потом вечерние.
+
+    Строки захватываются арендой (см. reminder_repo.claim_due_reminders),
+    поэтому несколько реплик или двойной вызов cron делят due-множество
+    без пересечений.
+    """
+    for kind in reminder_repo.REMINDER_FIELDS:
+        async for chunk in reminder_repo.iter_claimed_reminders(
+            kind, now_utc, lease_until, config.REMINDER_BATCH_SIZE, shard
+        ):
+            yield chunk
+
+
+def is_stale(reminder: DueReminder, now_utc: datetime) -> bool:
+    """Просрочено дольше REMINDER_STALE_AFTER_MINUTES — отправлять поздно."""
+    stale_after = config.REMINDER_STALE_AFTER_MINUTES
+    if stale_after <= 0:
+        return False
+    return now_utc - _as_naive_utc(reminder.due_at) > timedelta(minutes=stale_after)
+
+
+def plan_catch_up(
+    reminders: list[DueReminder], now_utc: datetime
+) -> tuple[list[tuple[DueReminder, date]], int, int]:
+    """
+    Решить, что из захваченного отправлять.
+
+    - устаревшие (is_stale) не отправляются — только переназначаются;
+    - если у пользователя осталось больше одного напоминания, они
+      сливаются в одно DIGEST_KIND: локальная дата — последнего из них,
+      due_at — самого раннего (опоздание считается честно).
+
+    Returns:
+        ([(напоминание, локальная дата), ...] для outbox,
+        количество пропущенных устаревших, количество объединённых)
+    """
+    by_user: dict[int, list[DueReminder]] = defaultdict(list)
+    stale = 0
+    for reminder in reminders:
+        if is_stale(reminder, now_utc):
+            REMINDER_SKIPPED_STALE.inc(kind=reminder.kind)
+            stale += 1
+            continue
+        by_user[reminder.user_id].append(reminder)
+
+    items: list[tuple[DueReminder, date]] = []
+    merged = 0
+    for fresh in by_user.values():
+        if len(fresh) == 1:
+            items.append((fresh[0], reminder_local_date(fresh[0])))
+            continue
+        fresh.sort(key=lambda r: _as_naive_utc(r.due_at))
+        latest = fresh[-1]
+        digest = DueReminder(
+            DIGEST_KIND,
+            latest.user_id,
+            latest.telegram_id,
+            latest.reminder_time,
+            latest.timezone_offset,
+            fresh[0].due_at,
+            latest.timezone,
         )
-        logger.info(f"Evening reminder sent to user {user.telegram_id}")
+        items.append((digest, reminder_local_date(latest)))
+        merged += len(fresh)
+    return items, stale, merged
+
+
+async def enqueue_due_reminders(
+    now_utc: datetime, shard: Shard | None = None
+) -> dict[str, int]:
+    """
+    Фаза 1 тика: due-напоминания -> outbox.
+
+    Каждая захваченная страница в одной транзакции кладётся в outbox
+    и переназначается на следующий день. Пользователь больше не висит
+    в due-множестве из-за неудачной отправки — ретраями занимается outbox.
+
+    Для страницы утренних напоминаний тем же пользователям сразу
+    захватываются просроченные вечерние (после простоя это пары) —
+    plan_catch_up сливает их в одно сообщение и отбрасывает устаревшие.
+    Переназначаются все захваченные, включая пропущенные, тем же
+    групповым UPDATE, поэтому тик после простоя не дороже обычного.
+    В обычной работе это один лишний индексный UPDATE на страницу.
+
+    Returns:
+        {"enqueued": N, "skipped_stale": N, "merged": N}
+    """
+    lease_until = now_utc + timedelta(seconds=config.REMINDER_CLAIM_LEASE_SECONDS)
+    first_kind, *other_kinds = reminder_repo.REMINDER_FIELDS
+    counts = {"enqueued": 0, "skipped_stale": 0, "merged": 0}
+    async for chunk in _iter_due(now_utc, lease_until, shard):
+        by_kind = {chunk[0].kind: chunk}
+        if chunk[0].kind == first_kind:
+            user_ids = [reminder.user_id for reminder in chunk]
+            for kind in other_kinds:
+                by_kind[kind] = await reminder_repo.claim_reminders_for_users(
+                    kind, user_ids, now_utc, lease_until
+                )
 
-        # Пересчитываем следующее вечернее напоминание (завтра)
-        user.next_evening_reminder_at = calculate_next_reminder_time(
-            user.reminder_evening, user.timezone_offset
+        claimed = [reminder for group in by_kind.values() for reminder in group]
+        items, stale, merged = plan_catch_up(claimed, now_utc)
+        async with in_transaction():
+            await outbox_repo.enqueue_deliveries(items, now_utc)
+            for kind, reminders in by_kind.items():
+                if reminders:
+                    await reschedule_reminders(kind, reminders, now_utc)
+
+        counts["enqueued"] += len(items)
+        counts["skipped_stale"] += stale
+        counts["merged"] += merged
+        for kind, reminders in by_kind.items():
+            if reminders:
+                REMINDER_USERS_SCANNED.inc(len(reminders), kind=kind)
+    return counts
+
+
+async def _iter_deliveries(
+    now_utc: datetime, shard: Shard | None = None
+) -> AsyncIterator[list[OutboxDelivery]]:
+    """Захватывать страницы доставок с наступившей попыткой, пока они есть."""
+    lease_until = now_utc + timedelta(seconds=config.REMINDER_CLAIM_LEASE_SECONDS)
+    while True:
+        chunk = await outbox_repo.claim_deliveries(
+            now_utc, lease_until, config.REMINDER_BATCH_SIZE, shard
+        )
+        if not chunk:
+            return
+        yield chunk
+
+
+async def deliver_reminder(delivery: OutboxDelivery) -> None:
+    """Отправить одну доставку. Ошибки пробрасываются — их учитывает drain."""
+    await _send_reminder(delivery.telegram_id, _REMINDER_TEXTS[delivery.kind])
+    logger.info(
+        f"{delivery.kind.capitalize()} reminder sent to user {delivery.telegram_id}"
+    )
+
+
+def classify_send_error(error: Exception) -> str | None:
+    """
+    Причина постоянной недоступности пользователя или None.
+
+    Пользователь заблокировал бота / удалил аккаунт / чат не существует —
+    ретраи бессмысленны. Всё остальное (сеть, 5xx, 429) считаем временным.
+    """
+    if isinstance(error, TelegramForbiddenError):
+        if "deactivated" in error.message.lower():
+            return "deactivated"
+        return "blocked"
+    if isinstance(error, TelegramBadRequest):
+        if "chat not found" in error.message.lower():
+            return "chat_not_found"
+    return None
+
+
+async def _record_failure(delivery: OutboxDelivery, error: Exception) -> str:
+    """
+    Записать неудачную временную ошибку: backoff или окончательный отказ.
+
+    Returns:
+        "gave_up" если попытки исчерпаны (доставка помечена failed),
+        иначе "retry_scheduled"
+    """
+    error_kind = type(error).__name__
+    message = str(error)[:500]
+    if delivery.attempts >= config.REMINDER_OUTBOX_MAX_ATTEMPTS:
+        await outbox_repo.mark_failed([delivery.id], error_kind, message)
+        logger.error(
+            f"Giving up {delivery.kind} reminder for {delivery.telegram_id} "
+            f"after {delivery.attempts} attempts: {error_kind}: {message}"
         )
-        await user.save()
+        return "gave_up"
+
+    retry_at = datetime.utcnow() + retry_delay(delivery.attempts)
+    await outbox_repo.mark_retry(delivery.id, retry_at, error_kind, message)
+    logger.warning(
+        f"Failed to send {delivery.kind} reminder to {delivery.telegram_id} "
+        f"(attempt {delivery.attempts}), retry at {retry_at:%H:%M:%S}: {error}"
+    )
+    return "retry_scheduled"
+
+
+# Финальный flush тика: попыток и пауза между ними (секунды, растёт линейно)
+_FLUSH_ATTEMPTS = 3
+_FLUSH_RETRY_DELAY = 0.2
+
+
+async def _fan_out(
+    chunks: AsyncIterator[list[OutboxDelivery]],
+    concurrency: int,
+) -> dict[str, int | float]:
+    """
+    Фаза 2 тика: разослать доставки outbox пулом из `concurrency` воркеров.
 
-    except Exception as e:
-        logger.error(f"Failed to send evening reminder to {user.telegram_id}: {e}")
+    Страницы из БД подаются в ограниченную очередь, поэтому следующая
+    страница захватывается, пока воркеры отправляют текущую, а в памяти
+    одновременно живёт не больше пары страниц. Скорость ограничивает общий
+    TokenBucket, воркеры лишь перекрывают сетевые задержки. Доставленные
+    отмечаются sent, недоступные пользователи — unreachable пачками
+    по REMINDER_BATCH_SIZE. Каждая отправка пишет опоздание
+    в REMINDER_LATENESS, каждая ошибка — класс в REMINDER_FAILURES.
+    Ошибка БД при записи отметок не останавливает рассылку: отметки
+    повторяются следующим flush.
 
+    Returns:
+        {"<kind>_sent": N, "failed": N, "retry_scheduled": N, "gave_up": N,
+        "unreachable": N, "lateness_max_sec": S}
+    """
+    batch_size = config.REMINDER_BATCH_SIZE
+    queue: asyncio.Queue[OutboxDelivery | None] = asyncio.Queue(maxsize=batch_size)
+    sent_ids: list[int] = []
+    # причина -> [(delivery.id, user_id), ...]
+    unreachable: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    counts: dict[str, int | float] = {f"{kind}_sent": 0 for kind in _REMINDER_TEXTS}
+    counts.update(failed=0, retry_scheduled=0, gave_up=0, unreachable=0)
+    counts["lateness_max_sec"] = 0.0
+
+    async def flush() -> None:
+        """Записать накопленные отметки; при ошибке БД они ждут следующего flush."""
+        nonlocal sent_ids
+        batch, sent_ids = sent_ids, []
+        if batch:
+            try:
+                await outbox_repo.mark_sent(batch, datetime.utcnow())
+            except Exception:
+                sent_ids.extend(batch)
+                raise
+
+        for reason in list(unreachable):
+            pairs = unreachable.pop(reason)
+            try:
+                await outbox_repo.mark_failed([d for d, _ in pairs], reason, reason)
+                await reminder_repo.mark_unreachable(reason, [u for _, u in pairs])
+            except Exception:
+                unreachable[reason].extend(pairs)
+                raise
+
+    async def flush_in_worker() -> None:
+        # Ошибка записи не должна ронять воркер: отметки останутся в памяти
+        # и уйдут следующим flush (в крайнем случае — финальным)
+        try:
+            await flush()
+        except Exception as e:
+            logger.error(f"Reminder outbox flush failed, will retry: {e}")
+
+    async def producer() -> None:
+        try:
+            async for chunk in chunks:
+                for delivery in chunk:
+                    await queue.put(delivery)
+        finally:
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def worker() -> None:
+        while True:
+            delivery = await queue.get()
+            if delivery is None:
+                return
+            try:
+                await deliver_reminder(delivery)
+            except Exception as e:
+                counts["failed"] += 1
+                reason = classify_send_error(e)
+                REMINDER_FAILURES.inc(error_class=reason or type(e).__name__)
+                if reason is None:
+                    try:
+                        counts[await _record_failure(delivery, e)] += 1
+                    except Exception as record_error:
+                        # Доставка осталась pending под арендой захвата:
+                        # когда аренда истечёт, её повторит следующий тик
+                        logger.error(
+                            f"Failed to record reminder failure for "
+                            f"{delivery.telegram_id}: {record_error}"
+                        )
+                        counts["retry_scheduled"] += 1
+                    continue
+                logger.info(f"User {delivery.telegram_id} is unreachable: {reason}")
+                counts["unreachable"] += 1
+                unreachable[reason].append((delivery.id, delivery.user_id))
+                if len(unreachable[reason]) >= batch_size:
+                    await flush_in_worker()
+                continue
+
+            late_by = datetime.utcnow() - _as_naive_utc(delivery.due_at)
+            lateness = max(0.0, late_by.total_seconds())
+            REMINDER_LATENESS.observe(lateness, kind=delivery.kind)
+            REMINDER_SENT.inc(kind=delivery.kind)
+            counts[f"{delivery.kind}_sent"] += 1
+            counts["lateness_max_sec"] = max(counts["lateness_max_sec"], lateness)
+            sent_ids.append(delivery.id)
+            if len(sent_ids) >= batch_size:
+                await flush_in_worker()
+
+    # AICODE-NOTE: Ни одна задача не переживает тик: при ошибке (или отмене
+    # тика) оставшиеся задачи отменяются, а уже отправленные доставки всё
+    # равно отмечаются sent финальным flush — иначе после истечения аренды
+    # пользователи получили бы то же напоминание повторно.
+    tasks = [
+        asyncio.create_task(producer()),
+        *(asyncio.create_task(worker()) for _ in range(concurrency)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for attempt in range(1, _FLUSH_ATTEMPTS + 1):
+            try:
+                await flush()
+                break
+            except Exception as e:
+                if attempt == _FLUSH_ATTEMPTS:
+                    raise
+                logger.warning(f"Reminder outbox flush failed (attempt {attempt}): {e}")
+                await asyncio.sleep(_FLUSH_RETRY_DELAY * attempt)
+    counts["lateness_max_sec"] = round(counts["lateness_max_sec"], 3)
+    return counts
+
+
+async def mark_user_reachable(telegram_id: int) -> bool:
+    """
+    Реактивация: пользователь снова прислал апдейт.
 
-async def process_reminders() -> dict[str, int]:
+    Снимает флаг недоступности и заново планирует напоминания.
+    Вызывается из ReachabilityMiddleware на каждый входящий апдейт.
+
+    Returns:
+        True если пользователь был недоступен
+    """
+    user = await reminder_repo.mark_reachable(telegram_id)
+    if user is None:
+        return False
+    logger.info(f"User {telegram_id} is reachable again")
+    await setup_user_reminders(user)
+    return True
+
+
+async def process_reminders(shard: Shard | None = None) -> dict[str, int | float]:
     """
     Обработать все напоминания (вызывается из /cron/tick).
 
+    1. Due-напоминания захватываются страницами и вместе с переназначением
+       на следующий день кладутся в reminder_outbox (enqueue_due_reminders).
+    2. Доставки outbox, у которых наступила попытка (новые и ретраи),
+       рассылаются одним пулом воркеров с общим лимитом скорости.
+       Неудачные — повтор с экспоненциальным backoff, после
+       REMINDER_OUTBOX_MAX_ATTEMPTS попыток — failed с причиной.
+       Заблокировавшие бота сразу помечаются недоступными и выпадают
+       из due-множества до следующего входящего апдейта.
+    После простоя устаревшие напоминания только переназначаются,
+    а пара утро+вечер уходит одним сообщением (см. plan_catch_up).
+
+    Args:
+        shard: Обработать только срез telegram_id % count == index
+            (None — всех). Шарды можно запускать параллельно: в одном
+            процессе (process_reminders_sharded) или в разных воркерах.
+
     Returns:
-        Статистика: {"morning_sent": N, "evening_sent": N}
+        Статистика: {"morning_sent": N, "evening_sent": N, "digest_sent": N,
+        "failed": N, "retry_scheduled": N, "gave_up": N, "unreachable": N,
+        "enqueued": N, "skipped_stale": N, "merged": N,
+        "lateness_max_sec": S, "duration_sec": S, "sends_per_sec": R}
+        Те же величины накапливаются в метриках процесса (/cron/metrics).
     """
+    started = time_module.monotonic()
     now_utc = datetime.utcnow()
-    stats = {"morning_sent": 0, "evening_sent": 0}
-
-    # Найти пользователей с просроченными утренними напоминаниями
-    morning_users = await User.filter(
-        reminders_enabled=True,
-        next_morning_reminder_at__lte=now_utc,
-    ).all()
 
-    for user in morning_users:
-        await send_morning_reminder(user)
-        stats["morning_sent"] += 1
+    enqueued = await enqueue_due_reminders(now_utc, shard)
+    stats: dict[str, int | float] = dict(
+        await _fan_out(_iter_deliveries(now_utc, shard), config.REMINDER_CONCURRENCY)
+    )
+    stats.update(enqueued)
 
-    # Найти пользователей с просроченными вечерними напоминаниями
-    evening_users = await User.filter(
-        reminders_enabled=True,
-        next_evening_reminder_at__lte=now_utc,
-    ).all()
+    # Старые завершённые доставки больше не нужны ни для идемпотентности, ни для метрик
+    # (чистит один шард — остальным повторять незачем)
+    if shard is None or shard.index == 0:
+        await outbox_repo.purge_finished(
+            now_utc.date() - timedelta(days=config.REMINDER_OUTBOX_RETENTION_DAYS)
+        )
 
-    for user in evening_users:
-        await send_evening_reminder(user)
-        stats["evening_sent"] += 1
+    duration = time_module.monotonic() - started
+    REMINDER_TICK_DURATION.observe(duration)
+    sent = sum(stats[f"{kind}_sent"] for kind in _REMINDER_TEXTS)
+    stats["duration_sec"] = round(duration, 3)
+    stats["sends_per_sec"] = round(sent / duration, 2) if duration > 0 else 0.0
 
+    shard_label = f"[shard {shard.index}/{shard.count}] " if shard else ""
     logger.info(
-        f"Reminders processed: {stats['morning_sent']} morning, {stats['evening_sent']} evening"
+        f"{shard_label}Reminders processed: {stats['morning_sent']} morning, "
+        f"{stats['evening_sent']} evening, {stats['digest_sent']} digest "
+        f"({stats['skipped_stale']} stale skipped), {stats['failed']} failed "
+        f"({stats['retry_scheduled']} to retry, {stats['gave_up']} gave up, "
+        f"{stats['unreachable']} unreachable) "
+        f"in {stats['duration_sec']}s ({stats['sends_per_sec']} msg/s, "
+        f"max lateness {stats['lateness_max_sec']}s)"
     )
 
     return stats
+
+
+async def process_reminders_sharded(count: int) -> dict[str, int | float]:
+    """
+    Обработать все напоминания `count` параллельными шардами в этом процессе.
+
+    Каждый шард сам захватывает и рассылает свой срез telegram_id;
+    сканирование БД и сетевые задержки перекрываются. TokenBucket общий,
+    поэтому суммарная скорость не превышает REMINDER_RATE_LIMIT —
+    ускорение линейно, пока тик не упирается в лимит Telegram.
+
+    Returns:
+        Сумма статистик шардов; lateness_max_sec — максимум,
+        duration_sec и sends_per_sec — по всему тику, плюс "shards": count
+    """
+    if count <= 1:
+        return await process_reminders()
+
+    started = time_module.monotonic()
+    results = await asyncio.gather(
+        *(process_reminders(Shard(index, count)) for index in range(count))
+    )
+
+    stats: dict[str, int | float] = defaultdict(int)
+    for result in results:
+        for key, value in result.items():
+            if key == "lateness_max_sec":
+                stats[key] = max(stats[key], value)
+            elif key not in ("duration_sec", "sends_per_sec"):
+                stats[key] += value
+
+    duration = time_module.monotonic() - started
+    sent = sum(stats[f"{kind}_sent"] for kind in _REMINDER_TEXTS)
+    stats["duration_sec"] = round(duration, 3)
+    stats["sends_per_sec"] = round(sent / duration, 2) if duration > 0 else 0.0
+    stats["shards"] = count
+    return dict(stats)
+
+
+async def get_outbox_summary(days: int = 1) -> dict[str, dict[str, int]]:
+    """
+    Сводка доставок за последние `days` локальных дней: статусы и причины ошибок.
+
+    Returns:
+        {"status": {"sent": N, "pending": N, "failed": N},
+         "errors": {"TelegramForbiddenError": N, ...}}
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    return {
+        "status": await outbox_repo.count_by_status(since),
+        "errors": await outbox_repo.count_failure_reasons(since),
+    }
+
+
+class ReminderScheduler:
+    """
+    In-process планировщик напоминаний на min-heap.
+
+    В куче лежат напоминания с due в пределах горизонта (now + horizon),
+    загруженные из next_*_reminder_at тем же индексным запросом, что и тик.
+    Цикл спит до ближайшего due и в этот момент запускает тот же захват
+    и рассылку, что и cron (_iter_due + _fan_out): куча задаёт, когда
+    проснуться, а строки забираются арендой — поэтому планировщик
+    безопасен рядом с /cron/tick и на нескольких репликах.
+
+    Куча перечитывается из БД каждые horizon/2: так подхватываются
+    напоминания, вошедшие в горизонт, и переназначенные на завтра.
+    Неудачные отправки живут в reminder_outbox: цикл просыпается
+    к ближайшей попытке (_retry_at, outbox_repo.next_pending_at).
+    Изменения пользователя между перечитываниями приходят через
+    schedule_user().
+
+    С `shard` планировщик держит в куче, захватывает и рассылает только
+    свой срез telegram_id — реплики делят пользователей по
+    REMINDER_SCHEDULER_SHARD.
+
+    AICODE-NOTE: Устаревшие записи из кучи не удаляются (heapq так не умеет):
+    актуальная запись на (kind, user_id) хранится в _entries, при извлечении
+    запись кучи сверяется с ней и отбрасывается, если не совпадает.
+
+    AICODE-NOTE: Извлечённая запись только будит цикл: тик — полный
+    process_reminders(shard), он захватывает все due-строки шарда, а не
+    только извлечённые. Строки, которые держит аренда другой реплики или
+    cron, тик не захватит — после тика извлечённые напоминания
+    перечитываются из БД и возвращаются в кучу (_resync), иначе до
+    следующего rebuild их бы никто не ждал.
+    """
+
+    def __init__(self, horizon: timedelta, shard: Shard | None = None) -> None:
+        self.horizon = horizon
+        self.shard = shard
+        self._heap: list[tuple[datetime, int, str, int]] = []
+        self._entries: dict[tuple[str, int], DueReminder] = {}
+        self._seq = itertools.count()
+        self._horizon_end = datetime.min
+        self._retry_at: datetime | None = None  # ближайший ретрай в outbox
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, reminder: DueReminder) -> None:
+        """Добавить или сдвинуть напоминание (вне горизонта — снять)."""
+        key = (reminder.kind, reminder.user_id)
+        reminder.due_at = _as_naive_utc(reminder.due_at)
+        if reminder.due_at > self._horizon_end:
+            self._entries.pop(key, None)
+            return
+
+        self._entries[key] = reminder
+        seq = next(self._seq)
+        heapq.heappush(self._heap, (reminder.due_at, seq, *key))
+        if self._heap[0][1] == seq:
+            # Новое ближайшее напоминание — разбудить цикл раньше
+            self._wakeup.set()
+
+    def unschedule(self, kind: str, user_id: int) -> None:
+        """Снять напоминание (запись в куче станет устаревшей)."""
+        self._entries.pop((kind, user_id), None)
+
+    def schedule_user(self, user: User) -> None:
+        """Синхронизировать кучу с пользователем после setup_user_reminders."""
+        if self.shard is not None and not self.shard.contains(user.telegram_id):
+            return
+        for kind, (time_field, next_field) in reminder_repo.REMINDER_FIELDS.items():
+            next_at = getattr(user, next_field)
+            if not user.reminders_enabled or next_at is None:
+                self.unschedule(kind, user.id)
+                continue
+            self.schedule(
+                DueReminder(
+                    kind,
+                    user.id,
+                    user.telegram_id,
+                    getattr(user, time_field),
+                    user.timezone_offset,
+                    next_at,
+                    user.timezone,
+                )
+            )
+
+    async def rebuild(self, now_utc: datetime | None = None) -> int:
+        """
+        Перечитать кучу из БД: все напоминания с due <= now + horizon.
+
+        Returns:
+            Количество запланированных напоминаний
+        """
+        now_utc = now_utc or datetime.utcnow()
+        self._heap.clear()
+        self._entries.clear()
+        self._horizon_end = now_utc + self.horizon
+
+        for kind in reminder_repo.REMINDER_FIELDS:
+            async for chunk in reminder_repo.iter_due_reminders(
+                kind, self._horizon_end, config.REMINDER_BATCH_SIZE, self.shard
+            ):
+                for reminder in chunk:
+                    self.schedule(reminder)
+
+        logger.info(
+            f"Reminder scheduler rebuilt: {len(self)} reminders "
+            f"until {self._horizon_end:%H:%M:%S} UTC"
+        )
+        return len(self)
+
+    def pop_due(self, now_utc: datetime) -> list[DueReminder]:
+        """Извлечь все наступившие напоминания, пропуская устаревшие записи."""
+        due: list[DueReminder] = []
+        while self._heap and self._heap[0][0] <= now_utc:
+            due_at, _, kind, user_id = heapq.heappop(self._heap)
+            reminder = self._entries.get((kind, user_id))
+            if reminder is None or reminder.due_at != due_at:
+                continue
+            del self._entries[(kind, user_id)]
+            due.append(reminder)
+        return due
+
+    def next_due_at(self) -> datetime | None:
+        """Ближайшее актуальное due (устаревшие записи с вершины выбрасываются)."""
+        while self._heap:
+            due_at, _, kind, user_id = self._heap[0]
+            reminder = self._entries.get((kind, user_id))
+            if reminder is not None and reminder.due_at == due_at:
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    async def fire_due(self, now_utc: datetime | None = None) -> dict[str, int | float]:
+        """
+        Если наступило напоминание или ретрай outbox — выполнить тик.
+
+        Returns:
+            Статистика process_reminders ({} если будить было не за чем)
+        """
+        now_utc = now_utc or datetime.utcnow()
+        due = self.pop_due(now_utc)
+        retry_due = self._retry_at is not None and self._retry_at <= now_utc
+        if not due and not retry_due:
+            return {}
+        stats = await process_reminders(self.shard)
+        await self._resync(due)
+        return stats
+
+    async def _resync(self, fired: list[DueReminder]) -> None:
+        """Вернуть в кучу извлечённые напоминания, которые тик не забрал."""
+        by_kind: dict[str, list[int]] = defaultdict(list)
+        for reminder in fired:
+            by_kind[reminder.kind].append(reminder.user_id)
+        for kind, user_ids in by_kind.items():
+            # Забранные тиком переназначены на завтра и выпадут за горизонт;
+            # удержанные арендой вернутся со временем её истечения
+            for reminder in await reminder_repo.get_user_reminders(kind, user_ids):
+                self.schedule(reminder)
+
+    async def run(self) -> None:
+        """Основной цикл: спать до ближайшего due или перечитывания кучи."""
+        refresh_every = self.horizon / 2
+        next_refresh = datetime.min
+        while True:
+            now_utc = datetime.utcnow()
+            if now_utc >= next_refresh:
+                await self.rebuild(now_utc)
+                next_refresh = now_utc + refresh_every
+
+            try:
+                await self.fire_due(now_utc)
+                retry_at = await outbox_repo.next_pending_at(self.shard)
+                self._retry_at = _as_naive_utc(retry_at) if retry_at else None
+            except Exception as e:
+                logger.error(f"Reminder scheduler fire failed: {e}", exc_info=True)
+
+            wake_at = next_refresh
+            for candidate in (self.next_due_at(), self._retry_at):
+                if candidate is not None:
+                    wake_at = min(wake_at, candidate)
+            timeout = (wake_at - datetime.utcnow()).total_seconds()
+
+            self._wakeup.clear()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except TimeoutError:
+                    pass
+
+
+_scheduler_task: asyncio.Task | None = None
+
+
+def start_scheduler() -> ReminderScheduler:
+    """Запустить in-process планировщик (вызывается из on_startup)."""
+    global _scheduler, _scheduler_task
+    if _scheduler is None:
+        shard = None
+        if config.REMINDER_SCHEDULER_SHARD is not None:
+            shard = Shard(config.REMINDER_SCHEDULER_SHARD, config.REMINDER_SHARDS)
+        _scheduler = ReminderScheduler(
+            timedelta(minutes=config.REMINDER_SCHEDULER_HORIZON_MINUTES), shard
+        )
+        _scheduler_task = asyncio.create_task(_scheduler.run())
+        logger.info("Reminder scheduler started")
+    return _scheduler
+
+
+async def stop_scheduler() -> None:
+    """Остановить планировщик (вызывается из on_shutdown)."""
+    global _scheduler, _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+    _scheduler, _scheduler_task = None, None
@@ -14,8 +14,10 @@ import random
 from collections.abc import Iterable
 from datetime import date
 
-from src.database.models import DailyLog, Goal, Stage, Step, User
+from src.core.use_cases.assign_morning_steps import AssignMorningStepsUseCase
+from src.database.models import Goal, Stage, Step, User
 from src.services.ai import ai_service
+from src.storage import daily_log_repo, step_repo
 
 logger = logging.getLogger(__name__)
 
@@ -45,57 +47,12 @@ async def ensure_active_stage(goal: Goal) -> Stage | None:
     """
     Return current active stage for a goal.
     If active is completed (>=100) mark it completed and activate next pending.
-    """
-    active_stages = (
-        await Stage.filter(goal=goal, status="active").order_by("-order", "-id").all()
-    )
-    current = active_stages[0] if active_stages else None
-
-    if len(active_stages) > 1:
-        logger.warning(
-            "Goal %s has multiple active stages, keeping the latest", goal.id
-        )
-        stale_ids = [stage.id for stage in active_stages[1:]]
-        await Stage.filter(id__in=stale_ids).update(status="pending")
 
-    if current and current.progress >= 100:
-        # Для онбординговых целей даём возможность добавлять ещё шаги,
-        # не завершая этап после первого же микрошага.
-        if goal.status != "onboarding":
-            current.status = "completed"
-            await current.save()
-            current = None
-
-    if not current:
-        current = (
-            await Stage.filter(goal=goal, status="pending").order_by("order").first()
-        )
-        if current:
-            current.status = "active"
-            await current.save()
-        else:
-            total = await Stage.filter(goal=goal).count()
-            if total == 0:
-                start_date = goal.start_date or date.today()
-                end_date = goal.deadline or start_date
-                logger.warning(
-                    "Goal %s has no stages, creating default active stage", goal.id
-                )
-                current = await Stage.create(
-                    goal=goal,
-                    title="Стартовый этап",
-                    order=1,
-                    start_date=start_date,
-                    end_date=end_date,
-                    progress=0,
-                    status="active",
-                )
-            else:
-                completed = await Stage.filter(goal=goal, status="completed").count()
-                if total and completed == total and goal.status != "onboarding":
-                    goal.status = "completed"
-                    await goal.save()
-    return current
+    Правила и указатель Goal.active_stage_id — в
+    AssignMorningStepsUseCase.ensure_active_stage.
+    """
+    result = await AssignMorningStepsUseCase().ensure_active_stage(goal)
+    return result.stage
 
 
 async def log_antipanic_action(
@@ -111,40 +68,22 @@ async def log_antipanic_action(
     Optionally mark it as completed immediately.
     """
     today = date.today()
-    daily_log, _ = await DailyLog.get_or_create(
-        user=user,
-        date=today,
-        defaults={
-            "energy_level": energy_hint or 5,
-            "mood_text": mood_hint or "antipanic",
-            "assigned_step_ids": [step.id],
-            "completed_step_ids": [step.id] if completed else [],
-            "xp_earned": step.xp_reward if completed else 0,
-        },
+    daily_log = await daily_log_repo.get_or_create_daily_log(
+        user,
+        today,
+        energy_level=energy_hint or 5,
+        mood_text=mood_hint or "antipanic",
+    )
+    await daily_log_repo.log_step_assignment(
+        daily_log, step.id, energy_level=energy_hint or 5, mood_text=mood_hint
     )
-
-    assigned = set(daily_log.assigned_step_ids or [])
-    if step.id not in assigned:
-        assigned.add(step.id)
-        daily_log.assigned_step_ids = list(assigned)
-
     if completed:
-        completed_ids = set(daily_log.completed_step_ids or [])
-        if step.id not in completed_ids:
-            completed_ids.add(step.id)
-            daily_log.completed_step_ids = list(completed_ids)
-            daily_log.xp_earned = (daily_log.xp_earned or 0) + step.xp_reward
-
-    if daily_log.energy_level is None:
-        daily_log.energy_level = energy_hint or 5
-    if mood_hint and not daily_log.mood_text:
-        daily_log.mood_text = mood_hint
-
-    await daily_log.save()
+        await daily_log_repo.log_step_completion(daily_log, step, step.xp_reward)
 
 
 async def _create_step(
     *,
+    goal: Goal,
     stage: Stage,
     title: str,
     minutes: int,
@@ -154,8 +93,10 @@ async def _create_step(
     energy_hint: int | None,
     mood_hint: str | None,
 ) -> Step:
-    step = await Step.create(
-        stage=stage,
+    step = await step_repo.create_step(
+        stage_id=stage.id,
+        goal_id=goal.id,
+        user_id=goal.user_id,
         title=title,
         difficulty=difficulty,
         estimated_minutes=minutes,
@@ -185,6 +126,7 @@ async def create_body_step(
 
     energy_hint = _energy_from_tension(tension)
     return await _create_step(
+        goal=goal,
         stage=stage,
         title=action_text,
         minutes=2,
@@ -218,6 +160,7 @@ async def get_task_micro_action(
         xp_reward = 5
         difficulty = "easy"
         return await _create_step(
+            goal=goal,
             stage=stage,
             title=text,
             minutes=minutes,
@@ -243,6 +186,7 @@ async def get_task_micro_action(
     xp_reward = xp_map.get(difficulty, 20)
 
     return await _create_step(
+        goal=goal,
         stage=stage,
         title=picked.get("title", "Сделать шаг по этапу"),
         minutes=minutes,
@@ -1,5 +1,21 @@
 """Storage layer - тупые CRUD репозитории без бизнес-логики."""
 
-from . import daily_log_repo, goal_repo, stage_repo, step_repo, user_repo
+from . import (
+    daily_log_repo,
+    goal_repo,
+    outbox_repo,
+    reminder_repo,
+    stage_repo,
+    step_repo,
+    user_repo,
+)
 
-__all__ = ["daily_log_repo", "goal_repo", "stage_repo", "step_repo", "user_repo"]
+__all__ = [
+    "daily_log_repo",
+    "goal_repo",
+    "outbox_repo",
+    "reminder_repo",
+    "stage_repo",
+    "step_repo",
+    "user_repo",
+]
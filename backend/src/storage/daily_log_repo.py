@@ -2,17 +2,82 @@
 DailyLog Repository - тупые CRUD операции для DailyLog модели.
 
 AICODE-NOTE: Репозиторий содержит только доступ к данным, БЕЗ бизнес-логики.
+Шаги дня хранятся в daily_log_steps (DailyLogStep): каждая отметка —
+один INSERT, без чтения и перезаписи строки DailyLog, поэтому параллельные
+колбэки не затирают отметки друг друга.
 """
 
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
 from datetime import date
 
-from src.database.models import DailyLog, Step, User
+from tortoise import Tortoise, timezone
+from tortoise.expressions import F
+from tortoise.functions import Count, Sum
+from tortoise.queryset import QuerySet
 
+from src.database.models import DailyLog, DailyLogStep, Step, User
+from src.storage.upsert import get_or_insert
+
+# Роли шага в дневнике дня
+ROLE_ASSIGNED = "assigned"
+ROLE_COMPLETED = "completed"
+ROLE_SKIPPED = "skipped"
+
+
+@dataclass(slots=True)
+class DayStep:
+    """Проекция Step для списков шагов дня: только отображаемые поля."""
+
+    id: int
+    title: str
+    status: str
+
+
+_DAY_STEP_COLUMNS = ("id", "title", "status")
 
-async def get_or_create_daily_log(user: User, log_date: date) -> DailyLog:
-    """Получить или создать DailyLog за указанную дату."""
-    daily_log, _ = await DailyLog.get_or_create(user=user, date=log_date)
-    return daily_log
+
+@dataclass(slots=True)
+class DayTotals:
+    """Проекция DailyLog для статистики дня."""
+
+    energy_level: int | None
+    xp_earned: int
+
+
+# ON CONFLICT по уникальному (daily_log_id, role, step_id): повторная отметка
+# ничего не меняет (для skipped — обновляет причину). RETURNING отдаёт строку,
+# только если она вставлена или обновлена.
+_ADD_STEP_SQL = """
+INSERT INTO daily_log_steps (daily_log_id, step_id, role, reason, created_at)
+VALUES ({placeholders})
+ON CONFLICT (daily_log_id, role, step_id) DO {action}
+RETURNING id
+"""
+
+
+async def get_or_create_daily_log(
+    user: User,
+    log_date: date,
+    *,
+    energy_level: int | None = None,
+    mood_text: str | None = None,
+) -> DailyLog:
+    """
+    Получить или создать DailyLog за указанную дату (storage/upsert).
+
+    energy_level и mood_text пишутся только в новую строку.
+    """
+    return await get_or_insert(
+        DailyLog(
+            user_id=user.id,
+            date=log_date,
+            energy_level=energy_level,
+            mood_text=mood_text,
+        ),
+        ["user_id", "date"],
+    )
 
 
 async def get_daily_log(user: User, log_date: date) -> DailyLog | None:
@@ -20,25 +85,49 @@ async def get_daily_log(user: User, log_date: date) -> DailyLog | None:
     return await DailyLog.get_or_none(user=user, date=log_date)
 
 
+async def add_step(
+    daily_log_id: int, step_id: int, role: str, reason: str | None = None
+) -> bool:
+    """
+    Добавить отметку шага одним INSERT.
+
+    Returns:
+        True — отметка новая (для skipped — и при обновлении причины),
+        False — такая отметка уже была
+    """
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        placeholders = "$1, $2, $3, $4, $5"
+    else:
+        placeholders = "?, ?, ?, ?, ?"
+    action = (
+        "UPDATE SET reason = excluded.reason" if role == ROLE_SKIPPED else "NOTHING"
+    )
+    created_at = DailyLogStep._meta.fields_map["created_at"].to_db_value(
+        timezone.now(), DailyLogStep
+    )
+    rows = await conn.execute_query_dict(
+        _ADD_STEP_SQL.format(placeholders=placeholders, action=action),
+        [daily_log_id, step_id, role, reason, created_at],
+    )
+    return bool(rows)
+
+
 async def log_step_completion(
     daily_log: DailyLog, step: Step, xp_earned: int
 ) -> DailyLog:
-    """Добавить выполненный шаг в DailyLog."""
-    completed = daily_log.completed_step_ids or []
-    if step.id not in completed:
-        completed.append(step.id)
-        daily_log.completed_step_ids = completed
+    """Добавить выполненный шаг в DailyLog (XP — только при первой отметке)."""
+    if await add_step(daily_log.id, step.id, ROLE_COMPLETED):
+        await DailyLog.filter(id=daily_log.id).update(
+            xp_earned=F("xp_earned") + xp_earned
+        )
         daily_log.xp_earned = (daily_log.xp_earned or 0) + xp_earned
-        await daily_log.save()
     return daily_log
 
 
 async def log_step_skip(daily_log: DailyLog, step_id: int, reason: str) -> DailyLog:
     """Добавить пропущенный шаг в DailyLog."""
-    skip_reasons = daily_log.skip_reasons or {}
-    skip_reasons[str(step_id)] = reason
-    daily_log.skip_reasons = skip_reasons
-    await daily_log.save()
+    await add_step(daily_log.id, step_id, ROLE_SKIPPED, reason)
     return daily_log
 
 
@@ -60,22 +149,120 @@ async def log_step_assignment(
     Returns:
         Updated DailyLog
     """
-    assigned = daily_log.assigned_step_ids or []
-    if step_id not in assigned:
-        assigned.append(step_id)
-        daily_log.assigned_step_ids = assigned
+    await add_step(daily_log.id, step_id, ROLE_ASSIGNED)
 
+    changed = []
     if energy_level is not None and daily_log.energy_level is None:
         daily_log.energy_level = energy_level
+        changed.append("energy_level")
 
     if mood_text and not daily_log.mood_text:
         daily_log.mood_text = mood_text
+        changed.append("mood_text")
 
-    await daily_log.save()
+    if changed:
+        await daily_log.save(update_fields=changed)
     return daily_log
 
 
-async def save_daily_log(daily_log: DailyLog) -> DailyLog:
-    """Сохранить изменения DailyLog."""
-    await daily_log.save()
+async def get_step_ids(daily_log_id: int, role: str) -> list[int]:
+    """ID шагов дня с указанной ролью в порядке добавления."""
+    return await (
+        DailyLogStep.filter(daily_log_id=daily_log_id, role=role)
+        .order_by("id")
+        .values_list("step_id", flat=True)
+    )
+
+
+async def get_skip_reasons(daily_log_id: int) -> dict[int, str | None]:
+    """Причины пропуска: {step_id: причина}."""
+    rows = await DailyLogStep.filter(
+        daily_log_id=daily_log_id, role=ROLE_SKIPPED
+    ).values_list("step_id", "reason")
+    return dict(rows)
+
+
+async def get_logged_steps(
+    daily_log_id: int, role: str = ROLE_ASSIGNED, status: str | None = None
+) -> list[DayStep]:
+    """
+    Шаги дня с указанной ролью одним JOIN-запросом (проекция DayStep).
+
+    Args:
+        status: Дополнительно отфильтровать по Step.status (например, "pending")
+    """
+    query = Step.filter(
+        daily_log_links__daily_log_id=daily_log_id, daily_log_links__role=role
+    )
+    return await _day_steps(query, status)
+
+
+async def get_day_steps(
+    user: User, log_date: date, role: str = ROLE_ASSIGNED, status: str | None = None
+) -> list[DayStep]:
+    """Шаги пользователя за дату без отдельной загрузки DailyLog."""
+    query = Step.filter(
+        daily_log_links__daily_log__user_id=user.id,
+        daily_log_links__daily_log__date=log_date,
+        daily_log_links__role=role,
+    )
+    return await _day_steps(query, status)
+
+
+async def _day_steps(query: QuerySet[Step], status: str | None) -> list[DayStep]:
+    if status is not None:
+        query = query.filter(status=status)
+    rows = await query.order_by("id").values_list(*_DAY_STEP_COLUMNS)
+    return [DayStep(*row) for row in rows]
+
+
+async def get_day_totals(user_id: int, log_date: date) -> DayTotals | None:
+    """Энергия и XP дня без загрузки всей строки DailyLog."""
+    row = (
+        await DailyLog.filter(user_id=user_id, date=log_date)
+        .first()
+        .values_list("energy_level", "xp_earned")
+    )
+    return DayTotals(*row) if row else None
+
+
+async def count_steps_by_day(
+    user_id: int, date_from: date, date_to: date
+) -> dict[date, dict[str, int]]:
+    """
+    Количество отметок по дням и ролям — GROUP BY в БД.
+
+    Returns:
+        {дата: {роль: количество}}; дни без отметок отсутствуют
+    """
+    rows = (
+        await DailyLogStep.filter(
+            daily_log__user_id=user_id,
+            daily_log__date__gte=date_from,
+            daily_log__date__lte=date_to,
+        )
+        .annotate(count=Count("id"))
+        .group_by("daily_log__date", "role")
+        .values_list("daily_log__date", "role", "count")
+    )
+    counts: dict[date, dict[str, int]] = defaultdict(dict)
+    for log_date, role, count in rows:
+        counts[log_date][role] = count
+    return dict(counts)
+
+
+async def sum_xp(user_id: int, date_from: date, date_to: date) -> int:
+    """Сумма XP за период одним SUM-запросом."""
+    total = (
+        await DailyLog.filter(user_id=user_id, date__gte=date_from, date__lte=date_to)
+        .annotate(total=Sum("xp_earned"))
+        .first()
+        .values_list("total", flat=True)
+    )
+    return total or 0
+
+
+async def save_daily_log(daily_log: DailyLog, update_fields: Sequence[str]) -> DailyLog:
+    """Сохранить изменённые поля DailyLog."""
+    await daily_log.save(update_fields=list(update_fields))
     return daily_log
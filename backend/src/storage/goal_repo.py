@@ -6,9 +6,14 @@ no business logic. Use-cases orchestrate these operations.
 """
 
 import logging
+from collections.abc import Sequence
 from datetime import date
 
+from tortoise.expressions import Subquery
+from tortoise.transactions import in_transaction
+
 from src.database.models import Goal, Stage, User
+from src.storage import stage_repo
 
 logger = logging.getLogger(__name__)
 
@@ -56,34 +61,23 @@ async def get_active_stage(goal_or_id) -> Stage | None:
     """
     Get current active stage for a goal.
 
-    Returns first active stage ordered by order DESC, id DESC.
-    This matches the logic from session.ensure_active_stage().
+    Reads the Goal.active_stage_id pointer, so this is a primary-key fetch.
+    A stale in-memory pointer to a stage that is no longer active gives None.
 
     Args:
         goal_or_id: Goal instance or goal_id (int)
 
     Returns:
-        Active Stage or None if no active stages exist
+        Active Stage or None if the goal has no active stage
     """
     # Support both Goal instance and goal_id
     if isinstance(goal_or_id, int):
-        return await Stage.filter(goal_id=goal_or_id, status="active").order_by("-order", "-id").first()
-    return await Stage.filter(goal=goal_or_id, status="active").order_by("-order", "-id").first()
-
-
-async def get_all_active_stages(goal: Goal) -> list[Stage]:
-    """
-    Get ALL active stages for a goal (for cleanup operations).
-
-    Args:
-        goal: Goal instance
-
-    Returns:
-        List of active Stages ordered by order DESC, id DESC
-    """
-    return (
-        await Stage.filter(goal=goal, status="active").order_by("-order", "-id").all()
-    )
+        stage_id = Subquery(Goal.filter(id=goal_or_id).values("active_stage_id"))
+    else:
+        stage_id = goal_or_id.active_stage_id
+        if stage_id is None:
+            return None
+    return await Stage.get_or_none(id=stage_id, status="active")
 
 
 async def get_pending_stages(goal: Goal) -> list[Stage]:
@@ -115,6 +109,8 @@ async def create_stage(
     """
     Create a new stage.
 
+    An active stage becomes the goal's active_stage_id in the same transaction.
+
     Args:
         goal: Parent Goal
         title: Stage title
@@ -126,20 +122,25 @@ async def create_stage(
     Returns:
         Created Stage instance
     """
-    return await Stage.create(
-        goal=goal,
-        title=title,
-        order=order,
-        start_date=start_date,
-        end_date=end_date,
-        status=status,
-        progress=0,
-    )
+    async with in_transaction():
+        stage = await Stage.create(
+            goal=goal,
+            title=title,
+            order=order,
+            start_date=start_date,
+            end_date=end_date,
+            status=status,
+            progress=0,
+        )
+        if status == "active":
+            await Goal.filter(id=goal.id).update(active_stage_id=stage.id)
+            goal.active_stage_id = stage.id
+    return stage
 
 
 async def update_stage_status(stage: Stage, status: str) -> Stage:
     """
-    Update stage status.
+    Update stage status (and the goal's active_stage_id pointer).
 
     Args:
         stage: Stage instance
@@ -148,18 +149,16 @@ async def update_stage_status(stage: Stage, status: str) -> Stage:
     Returns:
         Updated Stage instance
     """
-    stage.status = status
-    await stage.save()
-    return stage
+    return await stage_repo.set_stage_status(stage, status)
 
 
-async def save_goal(goal: Goal) -> Goal:
-    """Save goal changes."""
-    await goal.save()
+async def save_goal(goal: Goal, update_fields: Sequence[str]) -> Goal:
+    """Save changed goal fields."""
+    await goal.save(update_fields=list(update_fields))
     return goal
 
 
-async def save_stage(stage: Stage) -> Stage:
-    """Save stage changes."""
-    await stage.save()
+async def save_stage(stage: Stage, update_fields: Sequence[str]) -> Stage:
+    """Save changed stage fields."""
+    await stage.save(update_fields=list(update_fields))
     return stage
@@ -0,0 +1,212 @@
+"""
+Outbox Repository - очередь доставки напоминаний (reminder_outbox).
+
+AICODE-NOTE: Репозиторий содержит только доступ к данным, БЕЗ бизнес-логики.
+Политика ретраев (backoff, max attempts) живёт в services/reminders.py.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from tortoise import Tortoise
+from tortoise.functions import Count
+
+from src.database.models import ReminderOutbox
+from src.storage.reminder_repo import ID_CHUNK_SIZE, DueReminder, Shard, filter_shard
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+@dataclass(slots=True)
+class OutboxDelivery:
+    """Захваченная доставка: всё, что нужно воркеру для отправки."""
+
+    id: int
+    user_id: int
+    telegram_id: int
+    kind: str
+    attempts: int  # включая текущую попытку
+    due_at: datetime
+
+
+# Захват: выбрать pending-строки с наступившей попыткой, сдвинуть попытку на
+# время аренды и увеличить счётчик. Postgres пропускает строки, заблокированные
+# другой репликой; в SQLite одиночный UPDATE и так атомарен.
+_CLAIM_SQL_POSTGRES = """
+WITH batch AS (
+    SELECT id FROM reminder_outbox
+    WHERE status = 'pending' AND next_attempt_at <= $1 {shard_filter}
+    ORDER BY next_attempt_at, id
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE reminder_outbox
+SET next_attempt_at = $3, attempts = reminder_outbox.attempts + 1
+FROM batch
+WHERE reminder_outbox.id = batch.id
+RETURNING reminder_outbox.id, reminder_outbox.user_id, reminder_outbox.telegram_id,
+          reminder_outbox.kind, reminder_outbox.attempts, reminder_outbox.due_at
+"""
+
+_CLAIM_SQL_SQLITE = """
+UPDATE reminder_outbox
+SET next_attempt_at = ?, attempts = attempts + 1
+WHERE id IN (
+    SELECT id FROM reminder_outbox
+    WHERE status = 'pending' AND next_attempt_at <= ? {shard_filter}
+    ORDER BY next_attempt_at, id
+    LIMIT ?
+)
+RETURNING id, user_id, telegram_id, kind, attempts, due_at
+"""
+
+
+async def enqueue_deliveries(
+    items: list[tuple[DueReminder, date]], now_utc: datetime
+) -> int:
+    """
+    Положить напоминания в outbox (идемпотентно).
+
+    Строка с тем же (user, kind, local_date) уже есть — вставка пропускается,
+    поэтому повторный тик за тот же локальный день не создаёт дублей.
+
+    Args:
+        items: [(напоминание, локальная дата пользователя), ...]
+        now_utc: Время первой попытки
+
+    Returns:
+        Количество переданных в INSERT строк
+    """
+    rows = [
+        ReminderOutbox(
+            user_id=reminder.user_id,
+            telegram_id=reminder.telegram_id,
+            kind=reminder.kind,
+            local_date=local_date,
+            next_attempt_at=now_utc,
+            due_at=reminder.due_at,
+        )
+        for reminder, local_date in items
+    ]
+    if rows:
+        await ReminderOutbox.bulk_create(
+            rows, batch_size=ID_CHUNK_SIZE, ignore_conflicts=True
+        )
+    return len(rows)
+
+
+async def claim_deliveries(
+    now_utc: datetime,
+    lease_until: datetime,
+    limit: int,
+    shard: Shard | None = None,
+) -> list[OutboxDelivery]:
+    """
+    Атомарно захватить до `limit` доставок с наступившей попыткой.
+
+    Захват сдвигает next_attempt_at на `lease_until` и увеличивает attempts:
+    если воркер упадёт, доставка вернётся в очередь, когда истечёт аренда.
+    С `shard` захватываются только доставки его среза telegram_id.
+    """
+    conn = Tortoise.get_connection("default")
+    fields = ReminderOutbox._meta.fields_map
+    to_db = fields["next_attempt_at"].to_db_value
+    now_db = to_db(now_utc, ReminderOutbox)
+    lease_db = to_db(lease_until, ReminderOutbox)
+    if conn.capabilities.dialect == "postgres":
+        shard_filter, shard_params = shard.sql(("$4", "$5")) if shard else ("", [])
+        rows = await conn.execute_query_dict(
+            _CLAIM_SQL_POSTGRES.format(shard_filter=shard_filter),
+            [now_db, limit, lease_db, *shard_params],
+        )
+    else:
+        shard_filter, shard_params = shard.sql(("?", "?")) if shard else ("", [])
+        rows = await conn.execute_query_dict(
+            _CLAIM_SQL_SQLITE.format(shard_filter=shard_filter),
+            [lease_db, now_db, *shard_params, limit],
+        )
+
+    to_python = fields["due_at"].to_python_value
+    return [
+        OutboxDelivery(
+            row["id"],
+            row["user_id"],
+            row["telegram_id"],
+            row["kind"],
+            row["attempts"],
+            to_python(row["due_at"]),
+        )
+        for row in rows
+    ]
+
+
+async def mark_sent(delivery_ids: list[int], sent_at: datetime) -> int:
+    """Отметить доставки отправленными (один UPDATE на ID_CHUNK_SIZE id)."""
+    updated = 0
+    for start in range(0, len(delivery_ids), ID_CHUNK_SIZE):
+        chunk = delivery_ids[start : start + ID_CHUNK_SIZE]
+        updated += await ReminderOutbox.filter(id__in=chunk).update(
+            status=SENT, sent_at=sent_at
+        )
+    return updated
+
+
+async def mark_retry(
+    delivery_id: int, next_attempt_at: datetime, error_kind: str, error: str
+) -> None:
+    """Запланировать следующую попытку после ошибки."""
+    await ReminderOutbox.filter(id=delivery_id).update(
+        next_attempt_at=next_attempt_at, error_kind=error_kind, last_error=error
+    )
+
+
+async def mark_failed(delivery_ids: list[int], error_kind: str, error: str) -> int:
+    """Окончательно отказаться от доставок (исчерпаны попытки / недоступен)."""
+    updated = 0
+    for start in range(0, len(delivery_ids), ID_CHUNK_SIZE):
+        chunk = delivery_ids[start : start + ID_CHUNK_SIZE]
+        updated += await ReminderOutbox.filter(id__in=chunk).update(
+            status=FAILED, error_kind=error_kind, last_error=error
+        )
+    return updated
+
+
+async def next_pending_at(shard: Shard | None = None) -> datetime | None:
+    """Время ближайшей запланированной попытки шарда (для планировщика)."""
+    return (
+        await filter_shard(ReminderOutbox.filter(status=PENDING), shard)
+        .order_by("next_attempt_at")
+        .first()
+        .values_list("next_attempt_at", flat=True)
+    )
+
+
+async def count_by_status(since: date) -> dict[str, int]:
+    """Количество доставок по статусам начиная с локальной даты `since`."""
+    rows = (
+        await ReminderOutbox.filter(local_date__gte=since)
+        .annotate(count=Count("id"))
+        .group_by("status")
+        .values("status", "count")
+    )
+    return {row["status"]: row["count"] for row in rows}
+
+
+async def count_failure_reasons(since: date) -> dict[str, int]:
+    """Количество доставок с ошибкой по типу ошибки (последней)."""
+    rows = (
+        await ReminderOutbox.filter(local_date__gte=since, error_kind__isnull=False)
+        .annotate(count=Count("id"))
+        .group_by("error_kind")
+        .values("error_kind", "count")
+    )
+    return {row["error_kind"]: row["count"] for row in rows}
+
+
+async def purge_finished(before: date) -> int:
+    """Удалить завершённые доставки с локальной датой раньше `before`."""
+    return await ReminderOutbox.filter(
+        status__in=(SENT, FAILED), local_date__lt=before
+    ).delete()
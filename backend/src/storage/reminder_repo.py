@@ -0,0 +1,643 @@
+"""
+Reminder Repository - запросы для рассылки напоминаний.
+
+AICODE-NOTE: Репозиторий содержит только доступ к данным, БЕЗ бизнес-логики.
+Расчёт времени следующего напоминания живёт в services/reminders.py.
+"""
+
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from tortoise import Tortoise
+from tortoise.expressions import F, Q
+from tortoise.queryset import QuerySet
+
+from src.database.models import User
+
+# kind -> (поле локального времени HH:MM, поле следующего напоминания в UTC)
+REMINDER_FIELDS: dict[str, tuple[str, str]] = {
+    "morning": ("reminder_morning", "next_morning_reminder_at"),
+    "evening": ("reminder_evening", "next_evening_reminder_at"),
+}
+
+# Размер страницы при чтении due-пользователей
+DUE_CHUNK_SIZE = 500
+
+_MINUTE = timedelta(minutes=1)
+
+# Размер IN (...) списка в одном UPDATE (лимит параметров SQLite/asyncpg)
+ID_CHUNK_SIZE = 500
+
+
+@dataclass(slots=True)
+class DueReminder:
+    """Проекция User с полями, нужными для отправки одного напоминания."""
+
+    kind: str
+    user_id: int
+    telegram_id: int
+    reminder_time: str
+    timezone_offset: int
+    due_at: datetime
+    timezone: str | None = None  # IANA-зона, важнее timezone_offset
+
+
+def _due_columns(kind: str) -> tuple[str, ...]:
+    """Колонки User для DueReminder(kind, *row) — в порядке полей."""
+    time_field, next_field = REMINDER_FIELDS[kind]
+    return ("id", "telegram_id", time_field, "timezone_offset", next_field, "timezone")
+
+
+def _due_from_dict(kind: str, row: dict) -> DueReminder:
+    """DueReminder из строки RETURNING сырого SQL (due_at — колонка due_at)."""
+    time_field, _ = REMINDER_FIELDS[kind]
+    return DueReminder(
+        kind,
+        row["id"],
+        row["telegram_id"],
+        row[time_field],
+        row["timezone_offset"],
+        row["due_at"],
+        row["timezone"],
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class Shard:
+    """
+    Срез пользователей для параллельной рассылки: telegram_id % count == index.
+
+    Условие по остатку проверяется поверх range scan частичного индекса
+    idx_users_due_<kind>: каждый шард читает тот же диапазон due,
+    но захватывает и отправляет только свои строки.
+    """
+
+    index: int
+    count: int
+
+    def __post_init__(self) -> None:
+        if self.count < 1 or not 0 <= self.index < self.count:
+            raise ValueError(f"Invalid shard {self.index}/{self.count}")
+
+    def sql(self, placeholders: tuple[str, str]) -> tuple[str, list[int]]:
+        """Условие для сырого SQL и его параметры: ("$4", "$5") или ("?", "?")."""
+        count, index = placeholders
+        return f"AND telegram_id % {count} = {index}", [self.count, self.index]
+
+    def contains(self, telegram_id: int) -> bool:
+        """Принадлежит ли пользователь шарду."""
+        return telegram_id % self.count == self.index
+
+
+def filter_shard(query: QuerySet, shard: Shard | None) -> QuerySet:
+    """Ограничить запрос по User/ReminderOutbox строками шарда."""
+    if shard is None or shard.count == 1:
+        return query
+    return query.annotate(shard_bucket=F("telegram_id") % shard.count).filter(
+        shard_bucket=shard.index
+    )
+
+
+async def iter_due_reminders(
+    kind: str,
+    now_utc: datetime,
+    chunk_size: int = DUE_CHUNK_SIZE,
+    shard: Shard | None = None,
+) -> AsyncIterator[list[DueReminder]]:
+    """
+    Стримить пользователей с просроченным напоминанием страницами.
+
+    Keyset-пагинация по (next_*_reminder_at, id) вместо OFFSET: порядок
+    совпадает с частичным индексом idx_users_due_<kind> (см.
+    database/migrations.py), поэтому каждая страница — один range scan
+    по индексу без сортировки. Переназначенные по ходу тика строки уходят
+    за now_utc и не сдвигают следующие страницы.
+    Из БД читаются только нужные колонки, без ORM-объектов.
+    """
+    _, next_field = REMINDER_FIELDS[kind]
+    last_due_at: datetime | None = None
+    last_id = 0
+    while True:
+        query = filter_shard(
+            User.filter(reminders_enabled=True, **{f"{next_field}__lte": now_utc}),
+            shard,
+        )
+        if last_due_at is not None:
+            # (due_at, id) > (last_due_at, last_id) в форме, понятной индексу
+            query = query.filter(
+                ~Q(**{next_field: last_due_at, "id__lte": last_id}),
+                **{f"{next_field}__gte": last_due_at},
+            )
+        rows = (
+            await query.order_by(next_field, "id")
+            .limit(chunk_size)
+            .values_list(*_due_columns(kind))
+        )
+        if not rows:
+            return
+
+        yield [DueReminder(kind, *row) for row in rows]
+
+        if len(rows) < chunk_size:
+            return
+        last_id, last_due_at = rows[-1][0], rows[-1][4]
+
+
+# Postgres: выбрать страницу due-строк, пропуская заблокированные другими
+# репликами, и сразу сдвинуть их на время аренды. Старое due_at берётся из CTE.
+_CLAIM_SQL_POSTGRES = """
+WITH due AS (
+    SELECT id, {next_field} AS due_at
+    FROM users
+    WHERE reminders_enabled AND {next_field} <= $1 {shard_filter}
+    ORDER BY {next_field}, id
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE users SET {next_field} = $3
+FROM due
+WHERE users.id = due.id
+RETURNING users.id, users.telegram_id, users.{time_field},
+          users.timezone_offset, due.due_at, users.timezone
+"""
+
+# SQLite: RETURNING видит только новые значения, поэтому due_at читается
+# заранее, а захват — условный UPDATE (строку забирает тот, кто первым
+# сдвинул её за now; запись в SQLite сериализуется блокировкой БД).
+_CLAIM_SQL_SQLITE = """
+UPDATE users SET {next_field} = ?
+WHERE {next_field} <= ? AND id IN ({placeholders})
+RETURNING id
+"""
+
+
+async def claim_due_reminders(
+    kind: str,
+    now_utc: datetime,
+    lease_until: datetime,
+    limit: int = DUE_CHUNK_SIZE,
+    shard: Shard | None = None,
+) -> list[DueReminder]:
+    """
+    Атомарно захватить до `limit` просроченных напоминаний.
+
+    Захват = next_*_reminder_at сдвигается на `lease_until`: строка выходит
+    из due-множества, и параллельный тик (другая реплика, двойной вызов
+    cron) её уже не выберет. Постановка в outbox перезаписывает аренду
+    временем следующего напоминания; если процесс упал до этого — строка
+    снова станет due, когда аренда истечёт.
+
+    Args:
+        shard: Захватывать только строки этого шарда (None — все)
+
+    Returns:
+        Захваченные напоминания (due_at — время до захвата).
+        Пустой список — захватывать больше нечего.
+    """
+    time_field, next_field = REMINDER_FIELDS[kind]
+    conn = Tortoise.get_connection("default")
+    to_db = User._meta.fields_map[next_field].to_db_value
+    now_db, lease_db = to_db(now_utc, User), to_db(lease_until, User)
+
+    if conn.capabilities.dialect == "postgres":
+        shard_filter, shard_params = shard.sql(("$4", "$5")) if shard else ("", [])
+        sql = _CLAIM_SQL_POSTGRES.format(
+            next_field=next_field, time_field=time_field, shard_filter=shard_filter
+        )
+        rows = await conn.execute_query_dict(
+            sql, [now_db, limit, lease_db, *shard_params]
+        )
+        return [_due_from_dict(kind, row) for row in rows]
+
+    due = User.filter(reminders_enabled=True, **{f"{next_field}__lte": now_utc})
+    while True:
+        candidates = (
+            await filter_shard(due, shard)
+            .order_by(next_field, "id")
+            .limit(limit)
+            .values_list(*_due_columns(kind))
+        )
+        if not candidates:
+            return []
+        claimed = await _claim_sqlite(kind, candidates, now_db, lease_db)
+        # Всю страницу перехватил другой тик — берём следующую
+        if claimed:
+            return claimed
+
+
+async def _claim_sqlite(
+    kind: str, candidates: list[tuple], now_db: datetime, lease_db: datetime
+) -> list[DueReminder]:
+    """Условный UPDATE по прочитанным кандидатам: вернуть захваченных."""
+    _, next_field = REMINDER_FIELDS[kind]
+    conn = Tortoise.get_connection("default")
+    sql = _CLAIM_SQL_SQLITE.format(
+        next_field=next_field, placeholders=", ".join("?" * len(candidates))
+    )
+    rows = await conn.execute_query_dict(
+        sql, [lease_db, now_db, *(row[0] for row in candidates)]
+    )
+    claimed = {row["id"] for row in rows}
+    return [DueReminder(kind, *row) for row in candidates if row[0] in claimed]
+
+
+# Postgres: то же, что _CLAIM_SQL_POSTGRES, но по заданному списку id
+_CLAIM_USERS_SQL_POSTGRES = """
+WITH due AS (
+    SELECT id, {next_field} AS due_at
+    FROM users
+    WHERE reminders_enabled AND {next_field} <= $1 AND id = ANY($2)
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE users SET {next_field} = $3
+FROM due
+WHERE users.id = due.id
+RETURNING users.id, users.telegram_id, users.{time_field},
+          users.timezone_offset, due.due_at, users.timezone
+"""
+
+
+async def claim_reminders_for_users(
+    kind: str, user_ids: list[int], now_utc: datetime, lease_until: datetime
+) -> list[DueReminder]:
+    """
+    Захватить просроченные напоминания `kind` только у перечисленных пользователей.
+
+    Нужен, чтобы увидеть у одной страницы пользователей сразу оба
+    просроченных напоминания (утро и вечер после простоя). Аренда та же,
+    что у claim_due_reminders. Один UPDATE на ID_CHUNK_SIZE id.
+    """
+    time_field, next_field = REMINDER_FIELDS[kind]
+    conn = Tortoise.get_connection("default")
+    to_db = User._meta.fields_map[next_field].to_db_value
+    now_db, lease_db = to_db(now_utc, User), to_db(lease_until, User)
+
+    claimed: list[DueReminder] = []
+    for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+        chunk = user_ids[start : start + ID_CHUNK_SIZE]
+        if conn.capabilities.dialect == "postgres":
+            sql = _CLAIM_USERS_SQL_POSTGRES.format(
+                next_field=next_field, time_field=time_field
+            )
+            rows = await conn.execute_query_dict(sql, [now_db, chunk, lease_db])
+            claimed.extend(_due_from_dict(kind, row) for row in rows)
+            continue
+
+        candidates = await User.filter(
+            id__in=chunk, reminders_enabled=True, **{f"{next_field}__lte": now_utc}
+        ).values_list(*_due_columns(kind))
+        if candidates:
+            claimed.extend(await _claim_sqlite(kind, candidates, now_db, lease_db))
+    return claimed
+
+
+async def iter_claimed_reminders(
+    kind: str,
+    now_utc: datetime,
+    lease_until: datetime,
+    chunk_size: int = DUE_CHUNK_SIZE,
+    shard: Shard | None = None,
+) -> AsyncIterator[list[DueReminder]]:
+    """Захватывать страницы due-напоминаний, пока они не кончатся."""
+    while True:
+        chunk = await claim_due_reminders(kind, now_utc, lease_until, chunk_size, shard)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def mark_unreachable(reason: str, user_ids: list[int]) -> int:
+    """
+    Массово пометить пользователей недоступными.
+
+    next_*_reminder_at обнуляются — пользователи выпадают из due-множества
+    (и из частичных индексов) до реактивации.
+    """
+    updated = 0
+    for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+        chunk = user_ids[start : start + ID_CHUNK_SIZE]
+        updated += await User.filter(id__in=chunk).update(
+            is_reachable=False,
+            unreachable_reason=reason,
+            next_morning_reminder_at=None,
+            next_evening_reminder_at=None,
+        )
+    return updated
+
+
+async def mark_reachable(telegram_id: int) -> User | None:
+    """
+    Снять флаг недоступности по входящему апдейту.
+
+    Returns:
+        Пользователь, если он был недоступен (иначе None — частый случай,
+        стоит одного чтения по уникальному индексу telegram_id)
+    """
+    if not await User.filter(telegram_id=telegram_id, is_reachable=False).exists():
+        return None
+    await User.filter(telegram_id=telegram_id).update(
+        is_reachable=True, unreachable_reason=None
+    )
+    return await User.get(telegram_id=telegram_id)
+
+
+async def get_user_reminders(kind: str, user_ids: list[int]) -> list[DueReminder]:
+    """Текущие назначенные напоминания `kind` указанных пользователей."""
+    _, next_field = REMINDER_FIELDS[kind]
+    reminders: list[DueReminder] = []
+    for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+        rows = await User.filter(
+            id__in=user_ids[start : start + ID_CHUNK_SIZE],
+            reminders_enabled=True,
+            **{f"{next_field}__isnull": False},
+        ).values_list(*_due_columns(kind))
+        reminders.extend(DueReminder(kind, *row) for row in rows)
+    return reminders
+
+
+async def set_next_reminders(kind: str, groups: dict[datetime, list[int]]) -> int:
+    """
+    Массово переназначить next_*_reminder_at.
+
+    Один UPDATE на группу пользователей с одинаковым следующим временем
+    (и на каждые ID_CHUNK_SIZE id внутри группы). Пишется только колонка
+    напоминания — остальные поля User не трогаем.
+
+    Args:
+        kind: "morning" или "evening"
+        groups: {следующее время (UTC): [user.id, ...]}
+
+    Returns:
+        Количество обновлённых строк
+    """
+    _, next_field = REMINDER_FIELDS[kind]
+    updated = 0
+    for next_at, user_ids in groups.items():
+        for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+            chunk = user_ids[start : start + ID_CHUNK_SIZE]
+            updated += await User.filter(id__in=chunk).update(**{next_field: next_at})
+    return updated
+
+
+@dataclass(slots=True)
+class ReminderSettings:
+    """Проекция User: настройки одного вида напоминаний."""
+
+    user_id: int
+    telegram_id: int
+    reminder_time: str
+    timezone_offset: int
+    active: bool  # reminders_enabled и пользователь достижим
+    timezone: str | None = None
+
+
+# Первая активность пользователя за каждый его локальный день (выполненный шаг
+# или дневной лог) -> сколько дней она пришлась на каждый локальный час.
+# Гистограмма строится в БД: наружу уходит не больше 24 строк на пользователя.
+_FIRST_ACTIVITY_SQL_POSTGRES = """
+WITH activity AS (
+    SELECT goals.user_id, steps.completed_at AS ts
+    FROM steps
+    JOIN stages ON stages.id = steps.stage_id
+    JOIN goals ON goals.id = stages.goal_id
+    WHERE steps.completed_at >= $1
+    UNION ALL
+    SELECT user_id, created_at FROM daily_logs WHERE created_at >= $1
+), local AS (
+    SELECT activity.user_id,
+           CASE WHEN users.timezone IS NULL
+                THEN (activity.ts AT TIME ZONE 'UTC')
+                     + users.timezone_offset * INTERVAL '1 hour'
+                ELSE activity.ts AT TIME ZONE users.timezone
+           END AS local_ts
+    FROM activity JOIN users ON users.id = activity.user_id
+), first_daily AS (
+    SELECT user_id, MIN(local_ts) AS first_at
+    FROM local
+    GROUP BY user_id, CAST(local_ts AS date)
+)
+SELECT user_id, CAST(EXTRACT(HOUR FROM first_at) AS integer) AS hour,
+       COUNT(*) AS days
+FROM first_daily
+GROUP BY user_id, hour
+"""
+
+# SQLite не знает IANA-зон: смещения зон на окне (с переходами DST)
+# передаются таблицей zone_spans, см. _zone_spans
+_FIRST_ACTIVITY_SQL_SQLITE = """
+WITH zone_spans(name, start_at, end_at, offset_min) AS (
+    {zone_spans}
+), activity AS (
+    SELECT goals.user_id, steps.completed_at AS ts
+    FROM steps
+    JOIN stages ON stages.id = steps.stage_id
+    JOIN goals ON goals.id = stages.goal_id
+    WHERE steps.completed_at >= ?
+    UNION ALL
+    SELECT user_id, created_at FROM daily_logs WHERE created_at >= ?
+), local AS (
+    SELECT activity.user_id,
+           datetime(activity.ts, printf('%+d minutes', COALESCE(
+               (SELECT offset_min FROM zone_spans
+                WHERE zone_spans.name = users.timezone
+                  AND activity.ts >= zone_spans.start_at
+                  AND (zone_spans.end_at IS NULL OR activity.ts < zone_spans.end_at)),
+               users.timezone_offset * 60
+           ))) AS local_ts
+    FROM activity JOIN users ON users.id = activity.user_id
+), first_daily AS (
+    SELECT user_id, MIN(local_ts) AS first_at
+    FROM local
+    GROUP BY user_id, date(local_ts)
+)
+SELECT user_id, CAST(strftime('%H', first_at) AS integer) AS hour,
+       COUNT(*) AS days
+FROM first_daily
+GROUP BY user_id, hour
+"""
+
+
+async def first_activity_hours(
+    since: datetime, now_utc: datetime | None = None
+) -> list[tuple[int, int, int]]:
+    """
+    Гистограммы часа первой активности за день по всем пользователям сразу.
+
+    Активность — Step.completed_at и DailyLog.created_at начиная с `since`,
+    час — локальный: по IANA-зоне пользователя с учётом DST, если она
+    задана, иначе по timezone_offset.
+
+    Args:
+        since: Начало окна активности (naive UTC)
+        now_utc: Конец окна — до него считаются переходы DST на SQLite
+
+    Returns:
+        [(user_id, локальный час 0-23, количество дней), ...]
+    """
+    conn = Tortoise.get_connection("default")
+    to_db = User._meta.fields_map["created_at"].to_db_value
+    since_db = to_db(since, User)
+    if conn.capabilities.dialect == "postgres":
+        rows = await conn.execute_query_dict(_FIRST_ACTIVITY_SQL_POSTGRES, [since_db])
+        return [(row["user_id"], row["hour"], row["days"]) for row in rows]
+
+    until = (now_utc or datetime.now(UTC).replace(tzinfo=None)) + timedelta(days=1)
+    spans = [
+        (name, to_db(start, User), to_db(end, User) if end else None, offset)
+        for name in await distinct_timezones()
+        for start, end, offset in _zone_spans(name, since, until)
+    ]
+    if spans:
+        zone_spans = "VALUES " + ", ".join("(?, ?, ?, ?)" for _ in spans)
+    else:
+        zone_spans = "SELECT NULL, NULL, NULL, NULL WHERE 0"
+    rows = await conn.execute_query_dict(
+        _FIRST_ACTIVITY_SQL_SQLITE.format(zone_spans=zone_spans),
+        [*(value for span in spans for value in span), since_db, since_db],
+    )
+    return [(row["user_id"], row["hour"], row["days"]) for row in rows]
+
+
+def _zone_spans(
+    tz_name: str, start: datetime, end: datetime
+) -> list[tuple[datetime, datetime | None, int]]:
+    """
+    Интервалы постоянного смещения зоны на [start, end) (naive UTC).
+
+    Returns:
+        [(начало, конец или None для последнего, смещение в минутах), ...]
+    """
+    zone = ZoneInfo(tz_name)
+
+    def offset(at: datetime) -> int:
+        return int(at.replace(tzinfo=UTC).astimezone(zone).utcoffset() // _MINUTE)
+
+    spans: list[tuple[datetime, datetime | None, int]] = []
+    span_start, current = start, offset(start)
+    day = start
+    while day < end:
+        next_day = min(day + timedelta(days=1), end)
+        if offset(next_day) != current:
+            # Переход внутри суток: делением пополам до минуты
+            low, high = day, next_day
+            while high - low > _MINUTE:
+                middle = low + (high - low) / 2
+                if offset(middle) == current:
+                    low = middle
+                else:
+                    high = middle
+            switch = high.replace(second=0, microsecond=0)
+            spans.append((span_start, switch, current))
+            span_start, current = switch, offset(switch)
+        day = next_day
+    spans.append((span_start, None, current))
+    return spans
+
+
+async def get_reminder_settings(
+    kind: str, user_ids: list[int]
+) -> list[ReminderSettings]:
+    """Настройки напоминания `kind` для пользователей (по ID_CHUNK_SIZE за запрос)."""
+    time_field, _ = REMINDER_FIELDS[kind]
+    settings: list[ReminderSettings] = []
+    for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+        rows = await User.filter(
+            id__in=user_ids[start : start + ID_CHUNK_SIZE]
+        ).values_list(
+            "id",
+            "telegram_id",
+            time_field,
+            "timezone_offset",
+            "reminders_enabled",
+            "is_reachable",
+            "timezone",
+        )
+        settings.extend(
+            ReminderSettings(user_id, telegram_id, time_, offset, enabled and ok, zone)
+            for user_id, telegram_id, time_, offset, enabled, ok, zone in rows
+        )
+    return settings
+
+
+async def set_reminder_times(kind: str, groups: dict[str, list[int]]) -> int:
+    """
+    Массово сменить локальное время напоминания `kind`.
+
+    Один UPDATE на группу с одинаковым новым временем (и на каждые
+    ID_CHUNK_SIZE id). next_*_reminder_at не трогает — его пересчитывает
+    сервис через set_next_reminders.
+
+    Args:
+        groups: {"HH:MM": [user.id, ...]}
+    """
+    time_field, _ = REMINDER_FIELDS[kind]
+    updated = 0
+    for reminder_time, user_ids in groups.items():
+        for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+            chunk = user_ids[start : start + ID_CHUNK_SIZE]
+            updated += await User.filter(id__in=chunk).update(
+                **{time_field: reminder_time}
+            )
+    return updated
+
+
+async def distinct_timezones() -> list[str]:
+    """Все IANA-зоны, заданные пользователями."""
+    return (
+        await User.filter(timezone__isnull=False)
+        .distinct()
+        .values_list("timezone", flat=True)
+    )
+
+
+async def iter_zone_reminders(
+    kind: str,
+    zones: list[str],
+    after_utc: datetime,
+    chunk_size: int = DUE_CHUNK_SIZE,
+) -> AsyncIterator[list[DueReminder]]:
+    """
+    Стримить запланированные напоминания пользователей из зон `zones`.
+
+    Только включённые и ещё не наступившие (next_* > after_utc): due
+    и захваченные тиком строки не трогаем. Keyset по id, индекс
+    idx_users_timezone.
+    """
+    _, next_field = REMINDER_FIELDS[kind]
+    last_id = 0
+    while True:
+        rows = (
+            await User.filter(
+                timezone__in=zones,
+                reminders_enabled=True,
+                id__gt=last_id,
+                **{f"{next_field}__gt": after_utc},
+            )
+            .order_by("id")
+            .limit(chunk_size)
+            .values_list(*_due_columns(kind))
+        )
+        if not rows:
+            return
+        yield [DueReminder(kind, *row) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+async def set_timezone_offsets(offsets: dict[str, int]) -> int:
+    """
+    Синхронизировать timezone_offset с текущим смещением IANA-зоны.
+
+    timezone_offset остаётся приближением для SQL-агрегаций по локальному
+    часу (first_activity_hours). Один UPDATE на зону.
+
+    Args:
+        offsets: {"Europe/Berlin": 2, ...}
+    """
+    updated = 0
+    for zone, offset in offsets.items():
+        updated += await User.filter(timezone=zone).update(timezone_offset=offset)
+    return updated
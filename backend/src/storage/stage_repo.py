@@ -4,7 +4,125 @@ Stage Repository - тупые CRUD операции для Stage модели.
 AICODE-NOTE: Репозиторий содержит только доступ к данным, БЕЗ бизнес-логики.
 """
 
-from src.database.models import Stage
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from src.database.models import Goal, Stage
+
+# Фактические счётчики по steps против сохранённых в stages
+_COUNTER_DRIFT_SQL = """
+SELECT s.id AS stage_id,
+       s.total_count, s.completed_count, s.skipped_count,
+       COUNT(st.id) AS actual_total,
+       COALESCE(SUM(CASE WHEN st.status = 'completed' THEN 1 ELSE 0 END), 0)
+           AS actual_completed,
+       COALESCE(SUM(CASE WHEN st.status = 'skipped' THEN 1 ELSE 0 END), 0)
+           AS actual_skipped
+FROM stages s
+LEFT JOIN steps st ON st.stage_id = s.id
+GROUP BY s.id, s.total_count, s.completed_count, s.skipped_count
+HAVING s.total_count <> COUNT(st.id)
+    OR s.completed_count <> COALESCE(
+        SUM(CASE WHEN st.status = 'completed' THEN 1 ELSE 0 END), 0
+    )
+    OR s.skipped_count <> COALESCE(
+        SUM(CASE WHEN st.status = 'skipped' THEN 1 ELSE 0 END), 0
+    )
+ORDER BY s.id
+"""
+
+# {ids} — плейсхолдеры диалекта по числу этапов
+_RECONCILE_COUNTERS_SQL = """
+UPDATE stages SET
+    total_count = (SELECT COUNT(*) FROM steps WHERE stage_id = stages.id),
+    completed_count = (
+        SELECT COUNT(*) FROM steps
+        WHERE stage_id = stages.id AND status = 'completed'
+    ),
+    skipped_count = (
+        SELECT COUNT(*) FROM steps
+        WHERE stage_id = stages.id AND status = 'skipped'
+    )
+WHERE id IN ({ids})
+RETURNING id
+"""
+
+# Пачка этапов (keyset по id) с фактическими счётчиками шагов и статусом цели.
+# {lock} — FOR UPDATE на PostgreSQL: переход шага в параллельном запросе
+# ждёт конца транзакции пачки и затем пересчитывает прогресс сам.
+_STEP_COUNTS_BATCH_SQL = """
+WITH batch AS (
+    SELECT id FROM stages WHERE id > {p1} ORDER BY id LIMIT {p2}{lock}
+)
+SELECT s.id AS stage_id, s.goal_id, s.progress, s.status, g.status AS goal_status,
+       COUNT(st.id) AS total_count,
+       COALESCE(SUM(CASE WHEN st.status = 'completed' THEN 1 ELSE 0 END), 0)
+           AS completed_count,
+       COALESCE(SUM(CASE WHEN st.status = 'skipped' THEN 1 ELSE 0 END), 0)
+           AS skipped_count
+FROM batch b
+JOIN stages s ON s.id = b.id
+JOIN goals g ON g.id = s.goal_id
+LEFT JOIN steps st ON st.stage_id = s.id
+GROUP BY s.id, s.goal_id, s.progress, s.status, g.status
+ORDER BY s.id
+"""
+
+
+# Цели, у которых указатель не совпадает с активными этапами: несколько
+# active, active без указателя или указатель на неактивный/чужой этап
+_ACTIVE_STAGE_CONFLICTS_SQL = """
+SELECT g.id AS goal_id, g.active_stage_id, COUNT(s.id) AS active_count
+FROM goals g
+LEFT JOIN stages s ON s.goal_id = g.id AND s.status = 'active'
+GROUP BY g.id, g.active_stage_id
+HAVING COUNT(s.id) > 1
+    OR (COUNT(s.id) = 1 AND g.active_stage_id IS NULL)
+    OR (
+        g.active_stage_id IS NOT NULL
+        AND SUM(CASE WHEN s.id = g.active_stage_id THEN 1 ELSE 0 END) = 0
+    )
+ORDER BY g.id
+"""
+
+
+@dataclass(slots=True)
+class ActiveStageConflict:
+    """Цель с несогласованными активными этапами."""
+
+    goal_id: int
+    active_stage_id: int | None
+    active_count: int
+
+
+@dataclass(slots=True)
+class StageStepCounts:
+    """Этап с фактическими счётчиками шагов (одна строка GROUP BY)."""
+
+    stage_id: int
+    goal_id: int
+    progress: int
+    status: str
+    goal_status: str
+    total_count: int
+    completed_count: int
+    skipped_count: int
+
+
+@dataclass(slots=True)
+class CounterDrift:
+    """Расхождение счётчиков этапа с фактическими шагами."""
+
+    stage_id: int
+    total_count: int
+    completed_count: int
+    skipped_count: int
+    actual_total: int
+    actual_completed: int
+    actual_skipped: int
 
 
 async def get_stage(stage_id: int) -> Stage | None:
@@ -12,28 +130,195 @@ async def get_stage(stage_id: int) -> Stage | None:
     return await Stage.get_or_none(id=stage_id).prefetch_related("goal")
 
 
+async def get_stage_for_update(stage_id: int) -> Stage | None:
+    """
+    Получить этап с целью; строка этапа блокируется до конца транзакции.
+
+    Цель подтягивается тем же запросом (JOIN), блокируется только stages.
+    """
+    return (
+        await Stage.filter(id=stage_id)
+        .select_related("goal")
+        .select_for_update(of=("stages",))
+        .first()
+    )
+
+
 async def update_stage_progress(stage: Stage, progress: int) -> Stage:
     """Обновить прогресс этапа."""
     stage.progress = progress
-    await stage.save()
+    await stage.save(update_fields=["progress"])
+    return stage
+
+
+async def set_stage_status(
+    stage: Stage, status: str, extra_fields: Sequence[str] = ()
+) -> Stage:
+    """
+    Сменить статус этапа вместе с указателем Goal.active_stage_id.
+
+    Активный этап становится указателем цели; этап, переставший быть
+    активным, снимается с указателя, если стоял на нём.
+
+    Args:
+        stage: Этап
+        status: Новый статус ("pending", "active", "completed")
+        extra_fields: Другие изменённые поля этапа, сохраняемые тем же UPDATE
+    """
+    async with in_transaction():
+        return await set_stage_status_locked(stage, status, extra_fields)
+
+
+async def set_stage_status_locked(
+    stage: Stage, status: str, extra_fields: Sequence[str] = ()
+) -> Stage:
+    """
+    Сменить статус этапа и указатель цели внутри unit_of_work.
+
+    То же, что set_stage_status, но без вложенной транзакции (SAVEPOINT):
+    строка этапа уже заблокирована (get_stage_for_update), атомарность
+    даёт транзакция сценария.
+    """
+    stage.status = status
+    await stage.save(update_fields=["status", *extra_fields])
+    if status == "active":
+        await Goal.filter(id=stage.goal_id).update(active_stage_id=stage.id)
+    else:
+        await Goal.filter(id=stage.goal_id, active_stage_id=stage.id).update(
+            active_stage_id=None
+        )
     return stage
 
 
 async def mark_stage_completed(stage: Stage) -> Stage:
     """Отметить этап как завершенный."""
-    stage.status = "completed"
-    await stage.save()
-    return stage
+    return await set_stage_status(stage, "completed")
 
 
 async def mark_stage_active(stage: Stage) -> Stage:
     """Отметить этап как активный."""
-    stage.status = "active"
-    await stage.save()
-    return stage
+    return await set_stage_status(stage, "active")
 
 
-async def save_stage(stage: Stage) -> Stage:
-    """Сохранить изменения этапа."""
-    await stage.save()
+async def save_stage(stage: Stage, update_fields: Sequence[str]) -> Stage:
+    """Сохранить изменённые поля этапа."""
+    await stage.save(update_fields=list(update_fields))
     return stage
+
+
+async def find_counter_drift() -> list[CounterDrift]:
+    """Этапы, у которых счётчики шагов не совпадают с таблицей steps."""
+    conn = Tortoise.get_connection("default")
+    rows = await conn.execute_query_dict(_COUNTER_DRIFT_SQL)
+    return [CounterDrift(**row) for row in rows]
+
+
+async def reconcile_counters(stage_ids: Sequence[int]) -> int:
+    """
+    Пересчитать счётчики этапов по таблице steps.
+
+    Пересчёт идёт в одном UPDATE, а не из значений find_counter_drift:
+    шаги, сменившие статус между проверкой и исправлением, тоже учтутся.
+
+    Returns:
+        Количество обновлённых этапов
+    """
+    if not stage_ids:
+        return 0
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        placeholders = ", ".join(f"${i}" for i in range(1, len(stage_ids) + 1))
+    else:
+        placeholders = ", ".join("?" for _ in stage_ids)
+    rows = await conn.execute_query_dict(
+        _RECONCILE_COUNTERS_SQL.format(ids=placeholders), list(stage_ids)
+    )
+    return len(rows)
+
+
+async def get_step_counts_batch(
+    after_id: int, batch_size: int, lock: bool = False
+) -> list[StageStepCounts]:
+    """
+    Следующая пачка этапов с фактическими счётчиками шагов (один GROUP BY).
+
+    Args:
+        after_id: Этапы с id > after_id
+        batch_size: Размер пачки
+        lock: Заблокировать строки пачки до конца транзакции (PostgreSQL)
+    """
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        sql = _STEP_COUNTS_BATCH_SQL.format(
+            p1="$1", p2="$2", lock=" FOR UPDATE" if lock else ""
+        )
+    else:
+        sql = _STEP_COUNTS_BATCH_SQL.format(p1="?", p2="?", lock="")
+    rows = await conn.execute_query_dict(sql, [after_id, batch_size])
+    return [StageStepCounts(**row) for row in rows]
+
+
+async def bulk_update_stages(stages: Sequence[Stage], fields: Sequence[str]) -> None:
+    """Обновить поля пачки этапов одним UPDATE ... CASE."""
+    if stages:
+        await Stage.bulk_update(stages, fields=list(fields))
+
+
+async def move_active_pointers(stages: Sequence[Stage]) -> None:
+    """
+    Направить Goal.active_stage_id по новым статусам пачки этапов.
+
+    То же правило, что в set_stage_status, для этапов, сменивших статус
+    пакетно (bulk_update_stages): указатели на ставшие неактивными этапы
+    снимаются одним UPDATE, активные этапы ставятся указателем своей цели
+    одним bulk UPDATE. Вызывается в транзакции, где записаны статусы.
+    """
+    left = [stage.id for stage in stages if stage.status != "active"]
+    if left:
+        await Goal.filter(active_stage_id__in=left).update(active_stage_id=None)
+    activated = {
+        stage.goal_id: stage.id for stage in stages if stage.status == "active"
+    }
+    if activated:
+        await Goal.bulk_update(
+            [
+                Goal(id=goal_id, active_stage_id=stage_id)
+                for goal_id, stage_id in activated.items()
+            ],
+            fields=["active_stage_id"],
+        )
+
+
+async def find_active_stage_conflicts() -> list[ActiveStageConflict]:
+    """Цели, где Goal.active_stage_id расходится со статусами этапов."""
+    conn = Tortoise.get_connection("default")
+    rows = await conn.execute_query_dict(_ACTIVE_STAGE_CONFLICTS_SQL)
+    return [ActiveStageConflict(**row) for row in rows]
+
+
+async def repair_active_stage(goal_id: int) -> Stage | None:
+    """
+    Оставить у цели один активный этап и направить на него указатель.
+
+    Остаётся этап из указателя, если он активен, иначе последний active
+    по (order, id); остальные активные возвращаются в pending.
+
+    Returns:
+        Оставшийся активный этап или None, если активных нет
+    """
+    async with in_transaction():
+        goal = await Goal.get(id=goal_id)
+        active = (
+            await Stage.filter(goal_id=goal_id, status="active")
+            .select_for_update()
+            .order_by("-order", "-id")
+        )
+        keep = next(
+            (stage for stage in active if stage.id == goal.active_stage_id),
+            active[0] if active else None,
+        )
+        stale_ids = [stage.id for stage in active if stage is not keep]
+        if stale_ids:
+            await Stage.filter(id__in=stale_ids).update(status="pending")
+        await Goal.filter(id=goal_id).update(active_stage_id=keep.id if keep else None)
+    return keep
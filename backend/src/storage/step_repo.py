@@ -5,16 +5,62 @@ AICODE-NOTE: Репозиторий содержит только доступ 
 Бизнес-логика находится в core/domain и core/use_cases.
 """
 
+from dataclasses import dataclass
 from datetime import date, datetime
 
+from tortoise import Tortoise
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
 from src.database.models import Stage, Step
 
+# Статус шага -> счётчик этапа (pending отдельно не считается)
+_STAGE_COUNTERS = {"completed": "completed_count", "skipped": "skipped_count"}
+
+
+@dataclass(slots=True)
+class HistoryItem:
+    """Проекция выполненного Step для истории: только отдаваемые поля."""
+
+    id: int
+    title: str
+    completed_at: datetime
+    xp_reward: int
+    difficulty: str
+
+
+_HISTORY_COLUMNS = ("id", "title", "completed_at", "xp_reward", "difficulty")
+
+# Заполнить владельца пачке шагов без него (keyset по id).
+# Коррелированные подзапросы вместо UPDATE ... FROM — один SQL для
+# PostgreSQL и SQLite; {p} — плейсхолдер диалекта.
+_BACKFILL_OWNER_SQL = """
+UPDATE steps
+SET goal_id = (SELECT st.goal_id FROM stages st WHERE st.id = steps.stage_id),
+    user_id = (
+        SELECT g.user_id FROM stages st JOIN goals g ON g.id = st.goal_id
+        WHERE st.id = steps.stage_id
+    )
+WHERE id IN (
+    SELECT id FROM steps
+    WHERE user_id IS NULL AND id > {p1}
+    ORDER BY id
+    LIMIT {p2}
+)
+RETURNING id
+"""
+
 
 async def get_step(step_id: int) -> Step | None:
     """Получить шаг по ID."""
     return await Step.get_or_none(id=step_id).prefetch_related("stage__goal")
 
 
+async def get_step_for_update(step_id: int) -> Step | None:
+    """Получить шаг с блокировкой строки до конца транзакции (unit_of_work)."""
+    return await Step.filter(id=step_id).select_for_update().first()
+
+
 async def get_stage(stage_id: int) -> Stage | None:
     """Получить этап по ID."""
     return await Stage.get_or_none(id=stage_id)
@@ -25,19 +71,91 @@ async def get_steps_by_stage(stage_id: int) -> list[Step]:
     return await Step.filter(stage_id=stage_id).all()
 
 
-async def mark_completed(step: Step) -> Step:
-    """Отметить шаг как выполненный."""
-    step.status = "completed"
-    step.completed_at = datetime.now()
-    await step.save()
-    return step
+async def _bump_stage_counters(stage_id: int, deltas: dict[str, int]) -> None:
+    """Атомарно изменить счётчики этапа: total_count = total_count + n, ..."""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        await Stage.filter(id=stage_id).update(**changes)
 
 
-async def mark_skipped(step: Step) -> Step:
-    """Отметить шаг как пропущенный."""
-    step.status = "skipped"
-    await step.save()
-    return step
+async def _transition(step: Step, status: str, **fields) -> bool:
+    """
+    Сменить статус шага и счётчики его этапа в одной транзакции.
+
+    UPDATE условный (WHERE status = прежний): если шаг уже перевёл
+    параллельный запрос, ничего не пишем и счётчики не двигаем.
+
+    Returns:
+        True если статус сменили мы
+    """
+    previous = step.status
+    async with in_transaction():
+        updated = await Step.filter(id=step.id, status=previous).update(
+            status=status, **fields
+        )
+        if updated:
+            deltas = {_STAGE_COUNTERS[status]: 1}
+            if previous in _STAGE_COUNTERS:
+                deltas[_STAGE_COUNTERS[previous]] = -1
+            await _bump_stage_counters(step.stage_id, deltas)
+    if updated:
+        step.status = status
+        for name, value in fields.items():
+            setattr(step, name, value)
+    return bool(updated)
+
+
+def _shift_counters(stage: Stage, previous: str, status: str) -> list[str]:
+    """Сдвинуть счётчики этапа в памяти; вернуть изменённые поля."""
+    changed = []
+    for old_or_new, delta in ((previous, -1), (status, 1)):
+        field = _STAGE_COUNTERS.get(old_or_new)
+        if field:
+            setattr(stage, field, getattr(stage, field) + delta)
+            changed.append(field)
+    return changed
+
+
+async def transition_locked(
+    step: Step, stage: Stage, status: str, **fields
+) -> list[str]:
+    """
+    Сменить статус шага внутри unit_of_work.
+
+    Строки шага и этапа уже заблокированы (get_step_for_update,
+    stage_repo.get_stage_for_update), поэтому UPDATE безусловный и без
+    вложенной транзакции. Счётчики этапа меняются только в памяти —
+    вызывающий сохраняет их одним UPDATE вместе с прогрессом этапа.
+
+    Returns:
+        Изменённые поля счётчиков этапа
+    """
+    previous = step.status
+    step.status = status
+    for name, value in fields.items():
+        setattr(step, name, value)
+    await step.save(update_fields=["status", *fields])
+    return _shift_counters(stage, previous, status)
+
+
+async def mark_completed(step: Step) -> bool:
+    """
+    Отметить шаг как выполненный.
+
+    Returns:
+        False — шаг уже перевёл другой запрос (статус в БД не тот, что в step)
+    """
+    return await _transition(step, "completed", completed_at=datetime.now())
+
+
+async def mark_skipped(step: Step) -> bool:
+    """
+    Отметить шаг как пропущенный.
+
+    Returns:
+        False — шаг уже перевёл другой запрос (статус в БД не тот, что в step)
+    """
+    return await _transition(step, "skipped")
 
 
 async def get_completed_count(stage_id: int) -> int:
@@ -57,8 +175,43 @@ async def get_finished_count(stage_id: int) -> int:
     ).count()
 
 
+async def get_history(user_id: int, limit: int) -> list[HistoryItem]:
+    """Последние выполненные шаги пользователя (индекс idx_steps_user_history)."""
+    rows = (
+        await Step.filter(
+            user_id=user_id, status="completed", completed_at__isnull=False
+        )
+        .order_by("-completed_at")
+        .limit(limit)
+        .values_list(*_HISTORY_COLUMNS)
+    )
+    return [HistoryItem(*row) for row in rows]
+
+
+async def backfill_owner(after_id: int, batch_size: int) -> list[int]:
+    """
+    Проставить user_id/goal_id следующей пачке шагов без владельца.
+
+    Args:
+        after_id: Обработать шаги с id > after_id
+        batch_size: Размер пачки
+
+    Returns:
+        id обновлённых шагов (пусто — заполнять больше нечего)
+    """
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        sql = _BACKFILL_OWNER_SQL.format(p1="$1", p2="$2")
+    else:
+        sql = _BACKFILL_OWNER_SQL.format(p1="?", p2="?")
+    rows = await conn.execute_query_dict(sql, [after_id, batch_size])
+    return sorted(row["id"] for row in rows)
+
+
 async def create_step(
     stage_id: int,
+    goal_id: int,
+    user_id: int,
     title: str,
     difficulty: str,
     estimated_minutes: int,
@@ -71,6 +224,8 @@ async def create_step(
 
     Args:
         stage_id: ID этапа
+        goal_id: ID цели этапа (денормализация)
+        user_id: ID владельца цели (денормализация, goal.user_id)
         title: Название шага
         difficulty: Сложность ("easy", "medium", "hard")
         estimated_minutes: Ожидаемое время в минутах
@@ -81,12 +236,20 @@ async def create_step(
     Returns:
         Созданный Step
     """
-    return await Step.create(
-        stage_id=stage_id,
-        title=title,
-        difficulty=difficulty,
-        estimated_minutes=estimated_minutes,
-        xp_reward=xp_reward,
-        scheduled_date=scheduled_date,
-        status=status,
-    )
+    async with in_transaction():
+        step = await Step.create(
+            stage_id=stage_id,
+            goal_id=goal_id,
+            user_id=user_id,
+            title=title,
+            difficulty=difficulty,
+            estimated_minutes=estimated_minutes,
+            xp_reward=xp_reward,
+            scheduled_date=scheduled_date,
+            status=status,
+        )
+        deltas = {"total_count": 1}
+        if status in _STAGE_COUNTERS:
+            deltas[_STAGE_COUNTERS[status]] = 1
+        await _bump_stage_counters(stage_id, deltas)
+    return step
@@ -0,0 +1,29 @@
+"""
+Unit of Work - одна транзакция на весь use-case.
+
+AICODE-NOTE: Репозитории, вызванные внутри unit_of_work(), работают в той же
+транзакции: Tortoise берёт соединение транзакции из контекста, поэтому
+передавать его в репозитории не нужно. Сценарий фиксируется одним COMMIT
+или откатывается целиком.
+
+Правила для use-case внутри unit_of_work():
+- строки, которые сценарий меняет по прочитанным значениям, читаются через
+  *_for_update репозиториев (SELECT ... FOR UPDATE на PostgreSQL; SQLite
+  и так сериализует запись);
+- ошибки не глушатся: исключение откатывает всю транзакцию;
+- вложенный in_transaction() в репозитории становится SAVEPOINT — лишние
+  round trip'ы, поэтому в горячем пути используются функции без него.
+"""
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[BaseDBAsyncClient]:
+    """Открыть транзакцию сценария; COMMIT при выходе, ROLLBACK при ошибке."""
+    async with in_transaction() as connection:
+        yield connection
@@ -0,0 +1,74 @@
+"""
+Upsert - get-or-create без гонки на уникальном ключе.
+
+AICODE-NOTE: Tortoise get_or_create делает SELECT, затем INSERT и под
+гонкой параллельных колбэков падает на уникальном ключе (IntegrityError).
+get_or_insert читает строку по ключу и только если её нет вставляет
+INSERT ... ON CONFLICT DO NOTHING RETURNING (PostgreSQL, SQLite >= 3.35);
+проигравший гонку перечитывает строку победителя.
+
+Существующая строка (частый случай) — один SELECT: без UPDATE, блокировки
+строки, новой версии кортежа и WAL на PostgreSQL и без расхода значения
+последовательности id (DEFAULT nextval вычисляется до проверки конфликта,
+поэтому INSERT «на всякий случай» тратил бы id на каждый вызов).
+"""
+
+from collections.abc import Sequence
+from typing import TypeVar
+
+from tortoise import Tortoise
+from tortoise.models import Model
+
+MODEL = TypeVar("MODEL", bound=Model)
+
+_INSERT_SQL = """
+INSERT INTO "{table}" ({columns}) VALUES ({placeholders})
+ON CONFLICT ({conflict}) DO NOTHING
+RETURNING *
+"""
+
+
+async def get_or_insert(instance: MODEL, conflict_fields: Sequence[str]) -> MODEL:
+    """
+    Вернуть строку с ключом instance или вставить instance.
+
+    Значения instance (включая defaults модели) пишутся только при вставке,
+    существующая строка не меняется.
+
+    Args:
+        instance: Несохранённая модель со значениями для новой строки
+        conflict_fields: Поля уникального ключа (как в unique/unique_together)
+
+    Returns:
+        Сохранённая модель из БД (существующая или вставленная)
+    """
+    model = type(instance)
+    key = {name: getattr(instance, name) for name in conflict_fields}
+    existing = await model.filter(**key).first()
+    if existing is not None:
+        return existing
+
+    meta = instance._meta
+    projection = meta.fields_db_projection
+    names = [name for name in projection if not meta.fields_map[name].generated]
+    values = [
+        meta.fields_map[name].to_db_value(getattr(instance, name), instance)
+        for name in names
+    ]
+
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        placeholders = ", ".join(f"${i}" for i in range(1, len(names) + 1))
+    else:
+        placeholders = ", ".join("?" for _ in names)
+    sql = _INSERT_SQL.format(
+        table=meta.db_table,
+        columns=", ".join(f'"{projection[name]}"' for name in names),
+        placeholders=placeholders,
+        conflict=", ".join(f'"{projection[name]}"' for name in conflict_fields),
+    )
+    rows = await conn.execute_query_dict(sql, values)
+    if rows:
+        return model._init_from_db(**rows[0])
+    # Строку вставил параллельный вызов между SELECT и INSERT
+    return await model.get(**key)
@@ -3,9 +3,54 @@ User Repository - тупые CRUD операции для User модели.
 
 AICODE-NOTE: Репозиторий содержит только доступ к данным, БЕЗ бизнес-логики.
 Бизнес-логика (расчет streak, level) находится в core/domain/gamification.py.
+XP и streak меняются одним UPDATE в БД (xp = xp + n, RETURNING новых
+значений), а не перезаписью всей строки из памяти: параллельные выполнения
+шагов не теряют XP друг друга.
 """
 
+from collections.abc import Sequence
+from datetime import date
+
+from tortoise import Tortoise
+
 from src.database.models import User
+from src.storage.upsert import get_or_insert
+
+# Одним UPDATE: прибавить XP и засчитать день streak, если сегодня он ещё не
+# засчитан (иначе streak_days не меняется). {p} — префикс параметра
+# диалекта, {distinct} — NULL-безопасное «не равно».
+_UPDATE_XP_STREAK_SQL = """
+UPDATE users
+SET xp = xp + {p}1,
+    streak_days = CASE WHEN streak_last_date {distinct} {p}2
+                       THEN {p}3 ELSE streak_days END,
+    streak_last_date = {p}2
+WHERE id = {p}4
+RETURNING xp, streak_days
+"""
+
+# То же без XP
+_UPDATE_STREAK_SQL = """
+UPDATE users
+SET streak_days = CASE WHEN streak_last_date {distinct} {p}1
+                       THEN {p}2 ELSE streak_days END,
+    streak_last_date = {p}1
+WHERE id = {p}3
+RETURNING xp, streak_days
+"""
+
+_UPDATE_XP_SQL = "UPDATE users SET xp = xp + {p}1 WHERE id = {p}2 RETURNING xp"
+
+
+async def _execute_returning(sql: str, params: list) -> dict | None:
+    """Выполнить UPDATE ... RETURNING в синтаксисе текущего диалекта."""
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect == "postgres":
+        sql = sql.format(p="$", distinct="IS DISTINCT FROM")
+    else:
+        sql = sql.format(p="?", distinct="IS NOT")
+    rows = await conn.execute_query_dict(sql, params)
+    return rows[0] if rows else None
 
 
 async def get_user(telegram_id: int) -> User | None:
@@ -13,21 +58,65 @@ async def get_user(telegram_id: int) -> User | None:
     return await User.get_or_none(telegram_id=telegram_id)
 
 
+async def get_or_create_user(
+    telegram_id: int, username: str | None = None, first_name: str | None = None
+) -> User:
+    """
+    Получить или создать пользователя по telegram_id (storage/upsert).
+
+    username и first_name пишутся только при создании.
+    """
+    return await get_or_insert(
+        User(telegram_id=telegram_id, username=username, first_name=first_name),
+        ["telegram_id"],
+    )
+
+
 async def update_xp(user: User, xp_delta: int) -> User:
-    """Добавить XP пользователю."""
-    user.xp += xp_delta
-    await user.save()
+    """Атомарно добавить XP пользователю (user.xp — новое значение из БД)."""
+    row = await _execute_returning(_UPDATE_XP_SQL, [xp_delta, user.id])
+    if row:
+        user.xp = row["xp"]
     return user
 
 
-async def update_streak(user: User, new_streak: int) -> User:
-    """Обновить streak пользователя."""
-    user.streak_days = new_streak
-    await user.save()
+async def update_xp_and_streak(
+    user: User, xp_delta: int, new_streak: int, today: date
+) -> User:
+    """
+    Добавить XP и засчитать день streak одним запросом.
+
+    Условное обновление: если streak за `today` уже засчитан (например,
+    параллельным выполнением другого шага), streak_days остаётся прежним,
+    а XP всё равно прибавляется.
+
+    Args:
+        new_streak: Streak с учётом `today` (gamification.calculate_streak)
+
+    Returns:
+        user с xp, streak_days и streak_last_date из БД
+    """
+    row = await _execute_returning(
+        _UPDATE_XP_STREAK_SQL, [xp_delta, today, new_streak, user.id]
+    )
+    return _apply_streak_row(user, row, today)
+
+
+async def update_streak(user: User, new_streak: int, today: date) -> User:
+    """Засчитать день streak (если за `today` ещё не засчитан)."""
+    row = await _execute_returning(_UPDATE_STREAK_SQL, [today, new_streak, user.id])
+    return _apply_streak_row(user, row, today)
+
+
+def _apply_streak_row(user: User, row: dict | None, today: date) -> User:
+    if row:
+        user.xp = row["xp"]
+        user.streak_days = row["streak_days"]
+        user.streak_last_date = today
     return user
 
 
-async def save_user(user: User) -> User:
-    """Сохранить изменения пользователя."""
-    await user.save()
+async def save_user(user: User, update_fields: Sequence[str]) -> User:
+    """Сохранить изменённые поля пользователя."""
+    await user.save(update_fields=list(update_fields))
     return user
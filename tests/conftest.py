@@ -1,9 +1,14 @@
+import logging
 import os
+import re
 import sys
+from collections import defaultdict
 from datetime import date, timedelta
 
+import pytest
 import pytest_asyncio
 from tortoise import Tortoise
+from tortoise.log import db_client_logger
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if PROJECT_ROOT not in sys.path:
@@ -17,10 +22,53 @@ async def db() -> None:
         db_url="sqlite://:memory:", modules={"models": ["src.database.models"]}
     )
     await Tortoise.generate_schemas()
+    from src.database.migrations import apply_schema_updates
+
+    await apply_schema_updates()
     yield
     await Tortoise.close_connections()
 
 
+class ColumnWrites(logging.Handler):
+    """Collects the columns written by UPDATE statements, per table.
+
+    Reads the DEBUG query log of tortoise.db_client, so it sees ORM saves,
+    queryset updates and raw SQL alike.
+    """
+
+    _UPDATE = re.compile(
+        r'^\s*UPDATE\s+"?(\w+)"?\s+SET\s+(.*?)\s+(?:FROM|WHERE)\b',
+        re.IGNORECASE | re.DOTALL,
+    )
+    _ASSIGNMENT = re.compile(r'(?:^|,)\s*"?(\w+)"?\s*=')
+
+    def __init__(self) -> None:
+        super().__init__(logging.DEBUG)
+        self.tables: dict[str, set[str]] = defaultdict(set)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        query = record.args[0] if record.args else record.msg
+        match = self._UPDATE.match(str(query))
+        if match:
+            table, assignments = match.groups()
+            self.tables[table].update(self._ASSIGNMENT.findall(assignments))
+
+    def clear(self) -> None:
+        self.tables.clear()
+
+
+@pytest.fixture
+def column_writes():
+    """Record which columns the code under test UPDATEs (``.tables``)."""
+    recorder = ColumnWrites()
+    saved_level = db_client_logger.level
+    db_client_logger.setLevel(logging.DEBUG)
+    db_client_logger.addHandler(recorder)
+    yield recorder
+    db_client_logger.removeHandler(recorder)
+    db_client_logger.setLevel(saved_level)
+
+
 @pytest_asyncio.fixture(scope="function")
 async def test_user():
     """Create a test user for API tests."""
@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+
+import pytest
+
+from src.core.use_cases.complete_daily_reflection import (
+    CompleteDailyReflectionUseCase,
+)
+from src.core.use_cases.complete_step import CompleteStepUseCase
+from src.core.use_cases.skip_step import SkipStepUseCase
+from src.database.models import Goal, Stage, Step, User
+from src.services import reminders
+from src.storage import daily_log_repo, step_repo
+
+
+async def _user_with_steps(telegram_id: int) -> tuple[User, list[Step]]:
+    user = await User.create(
+        telegram_id=telegram_id,
+        streak_days=2,
+        streak_last_date=date.today() - timedelta(days=1),
+    )
+    goal = await Goal.create(
+        user=user,
+        title="Цель",
+        start_date=date.today(),
+        deadline=date.today() + timedelta(days=14),
+        status="active",
+    )
+    stage = await Stage.create(
+        goal=goal,
+        title="Этап",
+        order=1,
+        start_date=date.today(),
+        end_date=goal.deadline,
+        status="active",
+    )
+    steps = [
+        await step_repo.create_step(
+            stage_id=stage.id,
+            goal_id=goal.id,
+            user_id=user.id,
+            title=f"Шаг {i}",
+            difficulty="easy",
+            estimated_minutes=5,
+            xp_reward=10,
+            scheduled_date=date.today(),
+        )
+        for i in range(2)
+    ]
+    log = await daily_log_repo.get_or_create_daily_log(user, date.today())
+    for step in steps:
+        await daily_log_repo.log_step_assignment(log, step.id)
+    return user, steps
+
+
+@pytest.mark.asyncio
+async def test_complete_step_writes_only_changed_columns(
+    db: None, column_writes
+) -> None:
+    """Completing a step touches the status/progress/XP/streak columns only."""
+    user, steps = await _user_with_steps(15001)
+
+    column_writes.clear()
+    result = await CompleteStepUseCase().execute(steps[0].id, user)
+
+    assert result.success
+    assert column_writes.tables == {
+        "steps": {"status", "completed_at"},
+        "stages": {"progress", "status", "completed_count"},
+        "daily_logs": {"xp_earned"},
+        "users": {"xp", "streak_days", "streak_last_date"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_skip_step_writes_only_changed_columns(db: None, column_writes) -> None:
+    user, steps = await _user_with_steps(15002)
+
+    column_writes.clear()
+    assert (await SkipStepUseCase().execute(steps[0].id, user, "нет сил")).success
+
+    assert column_writes.tables == {
+        "steps": {"status"},
+        "stages": {"progress", "status", "skipped_count"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_evening_and_reminder_writes_are_column_scoped(
+    db: None, column_writes
+) -> None:
+    user, _ = await _user_with_steps(15003)
+
+    column_writes.clear()
+    result = await CompleteDailyReflectionUseCase().complete_day(user, date.today())
+    assert result.success
+    assert column_writes.tables == {"users": {"streak_days", "streak_last_date"}}
+
+    column_writes.clear()
+    await reminders.set_user_timezone(user, "Europe/Berlin")
+    assert column_writes.tables == {
+        "users": {
+            "timezone",
+            "timezone_offset",
+            "next_morning_reminder_at",
+            "next_evening_reminder_at",
+        }
+    }
@@ -0,0 +1,167 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from src.database.migrations import apply_schema_updates
+from src.database.models import DailyLog, DailyLogStep, Goal, Stage, Step, User
+from src.storage import daily_log_repo
+
+
+async def _steps(telegram_id: int, count: int) -> tuple[User, list[Step]]:
+    user = await User.create(telegram_id=telegram_id)
+    goal = await Goal.create(
+        user=user,
+        title="Цель",
+        start_date=date.today(),
+        deadline=date.today() + timedelta(days=14),
+        status="active",
+    )
+    stage = await Stage.create(
+        goal=goal,
+        title="Этап",
+        order=1,
+        start_date=date.today(),
+        end_date=goal.deadline,
+        status="active",
+    )
+    steps = [await Step.create(stage=stage, title=f"Шаг {i}") for i in range(count)]
+    return user, steps
+
+
+@pytest.mark.asyncio
+async def test_backfill_moves_json_lists_once(db: None) -> None:
+    """Legacy JSON lists become daily_log_steps rows; dangling ids are dropped."""
+    user, (first, second) = await _steps(13001, 2)
+    log = await DailyLog.create(
+        user=user,
+        date=date.today() - timedelta(days=1),
+        assigned_step_ids=[first.id, second.id, 99999],
+        completed_step_ids=[first.id],
+        skip_reasons={str(second.id): "нет сил"},
+    )
+
+    await apply_schema_updates()
+    await apply_schema_updates()
+
+    rows = await DailyLogStep.filter(daily_log=log).values_list(
+        "step_id", "role", "reason"
+    )
+    assert sorted(rows) == sorted(
+        [
+            (first.id, "assigned", None),
+            (second.id, "assigned", None),
+            (first.id, "completed", None),
+            (second.id, "skipped", "нет сил"),
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_backfill_not_blocked_by_existing_links(db: None) -> None:
+    """Legacy JSON still migrates when other days already have link rows."""
+    user, (first, second) = await _steps(13006, 2)
+    today_log = await daily_log_repo.get_or_create_daily_log(user, date.today())
+    await daily_log_repo.add_step(today_log.id, first.id, "assigned")
+    legacy = await DailyLog.create(
+        user=user,
+        date=date.today() - timedelta(days=1),
+        assigned_step_ids=[second.id],
+    )
+
+    await apply_schema_updates()
+
+    assert await daily_log_repo.get_step_ids(legacy.id, "assigned") == [second.id]
+    assert await daily_log_repo.get_step_ids(today_log.id, "assigned") == [first.id]
+
+
+@pytest.mark.asyncio
+async def test_repeated_marks_are_idempotent(db: None) -> None:
+    """A second completion adds no row and no XP; a second skip updates the reason."""
+    user, (step,) = await _steps(13002, 1)
+    log = await daily_log_repo.get_or_create_daily_log(user, date.today())
+
+    await daily_log_repo.log_step_assignment(log, step.id, energy_level=4)
+    await daily_log_repo.log_step_assignment(log, step.id)
+    await daily_log_repo.log_step_completion(log, step, 20)
+    await daily_log_repo.log_step_completion(log, step, 20)
+    await daily_log_repo.log_step_skip(log, step.id, "устал")
+    await daily_log_repo.log_step_skip(log, step.id, "заболел")
+
+    await log.refresh_from_db()
+    assert log.xp_earned == 20
+    assert log.energy_level == 4
+    assert await daily_log_repo.get_step_ids(log.id, "assigned") == [step.id]
+    assert await daily_log_repo.get_skip_reasons(log.id) == {step.id: "заболел"}
+    assert await DailyLogStep.filter(daily_log=log).count() == 3
+
+
+@pytest.mark.asyncio
+async def test_count_steps_by_day_groups_in_sql(db: None) -> None:
+    """Counts are grouped by day and role and limited to the date range."""
+    user, steps = await _steps(13003, 3)
+    today = date.today()
+    for days_ago, completed in ((0, 2), (1, 1), (10, 3)):
+        log = await daily_log_repo.get_or_create_daily_log(
+            user, today - timedelta(days=days_ago)
+        )
+        for step in steps:
+            await daily_log_repo.log_step_assignment(log, step.id)
+        for step in steps[:completed]:
+            await daily_log_repo.log_step_completion(log, step, 10)
+
+    counts = await daily_log_repo.count_steps_by_day(
+        user.id, today - timedelta(days=6), today
+    )
+
+    assert counts == {
+        today: {"assigned": 3, "completed": 2},
+        today - timedelta(days=1): {"assigned": 3, "completed": 1},
+    }
+    assert await daily_log_repo.sum_xp(user.id, today - timedelta(days=6), today) == 30
+    pending = await daily_log_repo.get_day_steps(user, today, status="pending")
+    assert [s.id for s in pending] == [s.id for s in steps]
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_daily_log_upserts_once(db: None) -> None:
+    """Concurrent first touches of a day share one row; hints only seed it."""
+    user = await User.create(telegram_id=13004)
+
+    logs = await asyncio.gather(
+        daily_log_repo.get_or_create_daily_log(
+            user, date.today(), energy_level=3, mood_text="antipanic"
+        ),
+        *(daily_log_repo.get_or_create_daily_log(user, date.today()) for _ in range(4)),
+    )
+
+    assert len({log.id for log in logs}) == 1
+    assert await DailyLog.filter(user=user).count() == 1
+    again = await daily_log_repo.get_or_create_daily_log(
+        user, date.today(), energy_level=9
+    )
+    assert again.id == logs[0].id
+    assert again.energy_level != 9
+    assert (await DailyLog.get(id=again.id)).energy_level != 9
+
+
+@pytest.mark.asyncio
+async def test_day_reads_return_projections(db: None) -> None:
+    """Day steps and totals come back as light projections, not models."""
+    user, steps = await _steps(13005, 2)
+    log = await daily_log_repo.get_or_create_daily_log(user, date.today())
+    for step in steps:
+        await daily_log_repo.log_step_assignment(log, step.id, energy_level=6)
+    await daily_log_repo.log_step_completion(log, steps[0], xp_earned=15)
+
+    day_steps = await daily_log_repo.get_day_steps(user, date.today())
+    totals = await daily_log_repo.get_day_totals(user.id, date.today())
+
+    assert day_steps == [
+        daily_log_repo.DayStep(step.id, step.title, step.status) for step in steps
+    ]
+    assert totals == daily_log_repo.DayTotals(energy_level=6, xp_earned=15)
+    assert (
+        await daily_log_repo.get_day_totals(user.id, date.today() - timedelta(1))
+        is None
+    )
@@ -0,0 +1,38 @@
+import pytest
+
+from src.services import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch) -> list:
+    """Metrics created by a test stay out of the process-wide registry."""
+    isolated = list(metrics._REGISTRY)
+    monkeypatch.setattr(metrics, "_REGISTRY", isolated)
+    return isolated
+
+
+def test_histogram_exposes_cumulative_buckets() -> None:
+    """Observations land in the first bucket whose bound is >= the value."""
+    histogram = metrics.Histogram("test_latency_seconds", "Test", (1, 10), ("kind",))
+    for value in (0.5, 1, 3, 30):
+        histogram.observe(value, kind="morning")
+
+    lines = histogram.expose()
+
+    assert 'test_latency_seconds_bucket{kind="morning",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{kind="morning",le="10.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{kind="morning",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{kind="morning"} 4' in lines
+    assert histogram.quantile(0.5, kind="morning") == 1
+    assert histogram.quantile(0.99, kind="morning") == float("inf")
+
+
+def test_counter_requires_declared_labels() -> None:
+    counter = metrics.Counter("test_events_total", "Test", ("error_class",))
+    counter.inc(error_class="blocked")
+    counter.inc(2, error_class="blocked")
+
+    assert counter.value(error_class="blocked") == 3
+    with pytest.raises(ValueError):
+        counter.inc(kind="morning")
+    assert "# TYPE test_events_total counter" in metrics.render_prometheus()
@@ -5,6 +5,7 @@ import pytest
 from src.bot.handlers.morning import _get_or_create_onboarding_sprint_goal
 from src.database.models import DailyLog, Goal, Stage, User
 from src.services import session as session_service
+from src.storage import daily_log_repo, goal_repo, stage_repo
 
 
 @pytest.mark.asyncio
@@ -17,6 +18,7 @@ async def test_onboarding_sprint_goal_created_with_stage(db: None) -> None:
 
     assert goal.status == "onboarding"
     assert stage.status == "active"
+    assert (await Goal.get(id=goal.id)).active_stage_id == stage.id
     assert stage.title == "Мини-спринт"
     assert stage.end_date == goal.deadline
 
@@ -60,14 +62,13 @@ async def test_morning_creates_new_log_even_if_evening_missing(db: None) -> None
         deadline=date.today() + timedelta(days=14),
         status="active",
     )
-    stage = await Stage.create(
+    stage = await goal_repo.create_stage(
         goal=goal,
         title="Stage A",
         order=1,
         start_date=date.today(),
         end_date=date.today() + timedelta(days=7),
         status="active",
-        progress=0,
     )
     await DailyLog.create(
         user=user,
@@ -81,8 +82,45 @@ async def test_morning_creates_new_log_even_if_evening_missing(db: None) -> None
     )
 
     today_log = await DailyLog.get(user=user, date=date.today())
-    assert step.id in today_log.assigned_step_ids
-    assert today_log.completed_step_ids == []
+    assert step.id in await daily_log_repo.get_step_ids(today_log.id, "assigned")
+    assert await daily_log_repo.get_step_ids(today_log.id, "completed") == []
     await stage.refresh_from_db()
     assert stage.status == "active"
 
+
+@pytest.mark.asyncio
+async def test_active_stage_pointer_follows_stage_transitions(db: None) -> None:
+    """A finished stage hands the goal pointer to the next pending stage."""
+    user = await User.create(telegram_id=704)
+    goal = await Goal.create(
+        user=user,
+        title="Main goal",
+        start_date=date.today(),
+        deadline=date.today() + timedelta(days=14),
+        status="active",
+    )
+    first = await goal_repo.create_stage(
+        goal=goal,
+        title="Stage A",
+        order=1,
+        start_date=date.today(),
+        end_date=goal.deadline,
+        status="active",
+    )
+    second = await goal_repo.create_stage(
+        goal=goal,
+        title="Stage B",
+        order=2,
+        start_date=date.today(),
+        end_date=goal.deadline,
+    )
+    assert (await goal_repo.get_active_stage(goal.id)).id == first.id
+
+    first.progress = 100
+    await stage_repo.save_stage(first, ["progress"])
+    assert (await session_service.ensure_active_stage(goal)).id == second.id
+
+    goal = await Goal.get(id=goal.id)
+    assert goal.active_stage_id == second.id
+    assert (await Stage.get(id=first.id)).status == "completed"
+    assert (await goal_repo.get_active_stage(goal)).id == second.id
@@ -0,0 +1,112 @@
+from datetime import UTC, date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.database.models import DailyLog, Goal, Stage, Step, User
+from src.services import reminder_timing, reminders
+from src.storage import reminder_repo
+
+
+async def _active_user(telegram_id: int, days: int, **overrides) -> User:
+    """User (UTC+3) who starts every day at ~07:20 local and works until noon."""
+    now = datetime.utcnow()
+    fields = {
+        "telegram_id": telegram_id,
+        "timezone_offset": 3,
+        "next_morning_reminder_at": now + timedelta(hours=1),
+    }
+    fields.update(overrides)
+    user = await User.create(**fields)
+    goal = await Goal.create(
+        user=user,
+        title="Цель",
+        deadline=date.today() + timedelta(days=30),
+        start_date=date.today() - timedelta(days=days),
+        status="active",
+    )
+    stage = await Stage.create(
+        goal=goal,
+        title="Этап",
+        order=1,
+        start_date=goal.start_date,
+        end_date=goal.deadline,
+        status="active",
+    )
+
+    today_utc = datetime.combine(now.date(), datetime.min.time())
+    for day in range(1, days + 1):
+        first_utc = today_utc - timedelta(days=day, hours=-4, minutes=-20)
+        log = await DailyLog.create(user=user, date=first_utc.date())
+        # created_at is auto_now_add: move it to the simulated time
+        await DailyLog.filter(id=log.id).update(created_at=first_utc)
+        await Step.create(
+            stage=stage,
+            title="Шаг",
+            status="completed",
+            completed_at=first_utc + timedelta(hours=4, minutes=40),
+        )
+    return user
+
+
+def test_suggest_picks_earliest_peak_hour_in_morning_window() -> None:
+    histogram = [0] * 24
+    histogram[3] = 50  # night owl activity is outside the window
+    histogram[7] = 4
+    histogram[8] = 4
+    histogram[10] = 1
+
+    assert reminder_timing.suggest_morning_time(histogram) == "07:00"
+    assert reminder_timing.suggest_morning_time(histogram, min_days=10) is None
+
+
+@pytest.mark.asyncio
+async def test_nightly_tuning_moves_default_users_only(db: None) -> None:
+    """Users still on 09:00 get their first-activity hour; custom times are kept."""
+    default_user = await _active_user(12001, days=6)
+    custom_user = await _active_user(12002, days=6, reminder_morning="10:30")
+    sparse_user = await _active_user(12003, days=2)
+    now = datetime.utcnow()
+
+    suggestions = await reminder_timing.compute_suggestions(now)
+    by_user = {s.user_id: s for s in suggestions}
+
+    assert by_user[default_user.id].suggested == "07:00"
+    assert by_user[default_user.id].active_days == 6
+    assert by_user[custom_user.id].suggested == "07:00"
+    assert sparse_user.id not in by_user
+
+    assert await reminder_timing.apply_suggestions(suggestions, now) == 1
+
+    await default_user.refresh_from_db()
+    await custom_user.refresh_from_db()
+    assert default_user.reminder_morning == "07:00"
+    assert reminders._as_naive_utc(
+        default_user.next_morning_reminder_at
+    ) == reminders.calculate_next_reminder_time("07:00", 3, now, default_user.id)
+    assert custom_user.reminder_morning == "10:30"
+
+    assert await reminder_timing.apply_suggestions(suggestions, now, override=True) == 2
+    await custom_user.refresh_from_db()
+    assert custom_user.reminder_morning == "07:00"
+
+
+@pytest.mark.asyncio
+async def test_activity_hours_follow_iana_zone_across_dst(db: None) -> None:
+    """07:20 in New York stays hour 7 on both sides of the DST switch."""
+    user = await User.create(
+        telegram_id=12004, timezone="America/New_York", timezone_offset=-4
+    )
+    zone = ZoneInfo("America/New_York")
+    # 2026-11-01: EDT (-4) -> EST (-5)
+    for day in range(25, 35):
+        local = datetime(2026, 10, 1, 7, 20, tzinfo=zone) + timedelta(days=day)
+        log = await DailyLog.create(user=user, date=local.date())
+        first_utc = local.astimezone(UTC).replace(tzinfo=None)
+        await DailyLog.filter(id=log.id).update(created_at=first_utc)
+
+    rows = await reminder_repo.first_activity_hours(
+        datetime(2026, 10, 20), datetime(2026, 11, 5)
+    )
+
+    assert rows == [(user.id, 7, 10)]
@@ -0,0 +1,677 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from aiogram.types import User as TelegramUser
+from tortoise import Tortoise
+
+from src.bot.middlewares.reachability import ReachabilityMiddleware
+from src.database.models import ReminderOutbox, User
+from src.services import metrics, reminders
+from src.storage import outbox_repo, reminder_repo
+from src.storage.reminder_repo import DueReminder, Shard
+
+
+class FakeBot:
+    """Minimal Bot stand-in: records sends, can fail selected chats."""
+
+    def __init__(self, fail_chat_ids: set[int] | None = None, flood_once: bool = False):
+        self.sent: list[int] = []
+        self.texts: dict[int, str] = {}
+        self.fail_chat_ids = fail_chat_ids or set()
+        self.blocked_chat_ids: set[int] = set()
+        self.flood_once = flood_once
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        if self.flood_once:
+            self.flood_once = False
+            raise TelegramRetryAfter(
+                method=SendMessage(chat_id=chat_id, text=text),
+                message="Too Many Requests",
+                retry_after=0,
+            )
+        if chat_id in self.fail_chat_ids:
+            raise RuntimeError("network down")
+        if chat_id in self.blocked_chat_ids:
+            raise TelegramForbiddenError(
+                method=SendMessage(chat_id=chat_id, text=text),
+                message="Forbidden: bot was blocked by the user",
+            )
+        self.sent.append(chat_id)
+        self.texts[chat_id] = text
+
+
+@pytest.fixture
+def fake_bot(monkeypatch):
+    bot = FakeBot()
+    monkeypatch.setattr(reminders, "_bot", bot)
+    monkeypatch.setattr(reminders, "_rate_limiter", reminders.TokenBucket(rate=1000))
+    return bot
+
+
+async def _due_user(telegram_id: int, **overrides) -> User:
+    past = datetime.utcnow() - timedelta(minutes=1)
+    fields = {
+        "telegram_id": telegram_id,
+        "timezone_offset": 0,
+        "next_morning_reminder_at": past,
+        "next_evening_reminder_at": past + timedelta(hours=12),
+    }
+    fields.update(overrides)
+    return await User.create(**fields)
+
+
+@pytest.mark.asyncio
+async def test_process_reminders_fans_out_and_reschedules(db: None, fake_bot) -> None:
+    """Every due user gets one message and a next reminder in the future."""
+    users = [await _due_user(1000 + i) for i in range(25)]
+
+    stats = await reminders.process_reminders()
+
+    assert stats["morning_sent"] == 25
+    assert stats["evening_sent"] == 0
+    assert stats["failed"] == 0
+    assert sorted(fake_bot.sent) == sorted(u.telegram_id for u in users)
+    assert "sends_per_sec" in stats and "duration_sec" in stats
+
+    now = datetime.utcnow()
+    for user in users:
+        await user.refresh_from_db()
+        assert user.next_morning_reminder_at.replace(tzinfo=None) > now
+
+
+@pytest.mark.asyncio
+async def test_process_reminders_honours_retry_after(db: None, fake_bot) -> None:
+    """A 429 pauses the bucket and the message is retried, not dropped."""
+    fake_bot.flood_once = True
+    await _due_user(2001)
+
+    stats = await reminders.process_reminders()
+
+    assert stats["morning_sent"] == 1
+    assert fake_bot.sent == [2001]
+
+
+@pytest.mark.asyncio
+async def test_process_reminders_counts_failures(db: None, fake_bot) -> None:
+    """Failed sends are reported and do not block other users."""
+    fake_bot.fail_chat_ids = {3001}
+    await _due_user(3001)
+    await _due_user(3002)
+
+    stats = await reminders.process_reminders()
+
+    assert stats["morning_sent"] == 1
+    assert stats["failed"] == 1
+    assert fake_bot.sent == [3002]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate() -> None:
+    """Bucket with capacity 1 spaces out acquisitions by 1/rate."""
+    bucket = reminders.TokenBucket(rate=50, capacity=1)
+    loop_start = reminders.time_module.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    elapsed = reminders.time_module.monotonic() - loop_start
+
+    assert elapsed >= 5 / 50 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_reschedule_reminders_groups_by_slot(db: None, monkeypatch) -> None:
+    """Bulk reschedule computes the next time per (time, offset) group."""
+    monkeypatch.setattr(reminders.config, "REMINDER_JITTER_MINUTES", 0)
+    now = datetime(2025, 12, 13, 20, 0)
+    due = []
+    for telegram_id, offset, reminder_time in (
+        (4001, 3, "09:00"),
+        (4002, 3, "09:00"),
+        (4003, 0, "21:30"),
+    ):
+        user = await User.create(
+            telegram_id=telegram_id,
+            timezone_offset=offset,
+            reminder_morning=reminder_time,
+        )
+        due.append(
+            DueReminder("morning", user.id, telegram_id, reminder_time, offset, now)
+        )
+
+    updated = await reminders.reschedule_reminders("morning", due, now)
+
+    assert updated == 3
+    expected = {
+        4001: datetime(2025, 12, 14, 6, 0),
+        4002: datetime(2025, 12, 14, 6, 0),
+        4003: datetime(2025, 12, 13, 21, 30),
+    }
+    for user in await User.filter(telegram_id__in=list(expected)):
+        assert (
+            user.next_morning_reminder_at.replace(tzinfo=None)
+            == expected[user.telegram_id]
+        )
+        assert user.next_evening_reminder_at is None
+
+
+@pytest.mark.asyncio
+async def test_failed_reminder_is_retried_with_backoff(db: None, fake_bot) -> None:
+    """A failed send moves the user to tomorrow and leaves a backed-off outbox retry."""
+    fake_bot.fail_chat_ids = {4101}
+    user = await _due_user(4101)
+    started = datetime.utcnow()
+
+    stats = await reminders.process_reminders()
+
+    assert stats["failed"] == 1 and stats["retry_scheduled"] == 1
+    await user.refresh_from_db()
+    assert user.next_morning_reminder_at.replace(
+        tzinfo=None
+    ) == reminders.calculate_next_reminder_time("09:00", 0, started, user.id)
+
+    delivery = await ReminderOutbox.get(user=user, kind="morning")
+    assert delivery.status == "pending"
+    assert delivery.attempts == 1
+    assert delivery.error_kind == "RuntimeError"
+    retry_at = delivery.next_attempt_at.replace(tzinfo=None)
+    assert retry_at >= started + reminders.retry_delay(1)
+
+
+@pytest.mark.asyncio
+async def test_outbox_gives_up_after_max_attempts(
+    db: None, fake_bot, monkeypatch
+) -> None:
+    """Retries stop at REMINDER_OUTBOX_MAX_ATTEMPTS and the reason is kept."""
+    monkeypatch.setattr(reminders.config, "REMINDER_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(reminders.config, "REMINDER_OUTBOX_MAX_ATTEMPTS", 3)
+    fake_bot.fail_chat_ids = {4150}
+    user = await _due_user(4150)
+
+    gave_up = 0
+    for _ in range(5):
+        gave_up += (await reminders.process_reminders())["gave_up"]
+
+    delivery = await ReminderOutbox.get(user=user, kind="morning")
+    assert gave_up == 1
+    assert delivery.status == "failed"
+    assert delivery.attempts == 3
+    summary = await reminders.get_outbox_summary()
+    assert summary["status"] == {"failed": 1}
+    assert summary["errors"] == {"RuntimeError": 1}
+
+
+@pytest.mark.asyncio
+async def test_outbox_is_idempotent_per_local_day(db: None, fake_bot) -> None:
+    """A second due reminder on the same local date is not delivered again."""
+    user = await _due_user(4170)
+    await reminders.process_reminders()
+    await User.filter(id=user.id).update(
+        next_morning_reminder_at=datetime.utcnow() - timedelta(seconds=30)
+    )
+
+    stats = await reminders.process_reminders()
+
+    assert stats["enqueued"] == 1
+    assert stats["morning_sent"] == 0
+    assert fake_bot.sent == [4170]
+    assert await ReminderOutbox.filter(user=user, status="sent").count() == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_ticks_do_not_duplicate(
+    db: None, fake_bot, monkeypatch
+) -> None:
+    """Overlapping ticks split the due set via claims; nobody gets two messages."""
+    monkeypatch.setattr(reminders.config, "REMINDER_BATCH_SIZE", 3)
+    for i in range(12):
+        await _due_user(4200 + i)
+
+    results = await asyncio.gather(
+        reminders.process_reminders(), reminders.process_reminders()
+    )
+
+    assert sum(stats["morning_sent"] for stats in results) == 12
+    assert sorted(fake_bot.sent) == list(range(4200, 4212))
+
+
+@pytest.mark.asyncio
+async def test_claim_keeps_original_due_at(db: None) -> None:
+    """Claimed rows leave the due set; the returned due_at is the pre-claim value."""
+    now = datetime.utcnow()
+    user = await _due_user(4300)
+    await user.refresh_from_db()
+    lease_until = now + timedelta(minutes=10)
+
+    claimed = await reminder_repo.claim_due_reminders("morning", now, lease_until)
+    again = await reminder_repo.claim_due_reminders("morning", now, lease_until)
+
+    assert [r.telegram_id for r in claimed] == [4300]
+    assert claimed[0].due_at == user.next_morning_reminder_at
+    assert again == []
+
+
+@pytest.mark.asyncio
+async def test_iter_due_reminders_pages_by_due_time(db: None) -> None:
+    """Due users are streamed in (due_at, id) pages with only needed columns."""
+    now = datetime.utcnow()
+    for i in range(7):
+        # Triples share a due time so pages have to break ties by id
+        await _due_user(
+            5000 + i, next_morning_reminder_at=now - timedelta(minutes=10 - i // 3)
+        )
+    await User.create(
+        telegram_id=5100, next_morning_reminder_at=now + timedelta(hours=1)
+    )
+    await _due_user(5200, reminders_enabled=False)
+
+    pages = [page async for page in reminder_repo.iter_due_reminders("morning", now, 2)]
+
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    flat = [reminder for page in pages for reminder in page]
+    assert [r.telegram_id for r in flat] == list(range(5000, 5007))
+    assert all(r.reminder_time == "09:00" for r in flat)
+
+
+@pytest.mark.asyncio
+async def test_process_reminders_pipelines_small_batches(
+    db: None, fake_bot, monkeypatch
+) -> None:
+    """Pipelined pages smaller than the due set still reach everyone once."""
+    monkeypatch.setattr(reminders.config, "REMINDER_BATCH_SIZE", 4)
+    for i in range(10):
+        await _due_user(5300 + i)
+
+    stats = await reminders.process_reminders()
+
+    assert stats["morning_sent"] == 10
+    assert sorted(fake_bot.sent) == list(range(5300, 5310))
+    assert (
+        await User.filter(next_morning_reminder_at__lte=datetime.utcnow()).count() == 0
+    )
+
+
+@pytest.mark.asyncio
+async def test_due_query_uses_partial_index(db: None) -> None:
+    conn = Tortoise.get_connection("default")
+    due_at = User._meta.fields_map["next_morning_reminder_at"].to_db_value(
+        datetime.utcnow(), User
+    )
+
+    plan = await conn.execute_query_dict(
+        "EXPLAIN QUERY PLAN SELECT id FROM users "
+        "WHERE reminders_enabled = ? AND next_morning_reminder_at <= ? "
+        "ORDER BY next_morning_reminder_at, id LIMIT ?",
+        [True, due_at, 500],
+    )
+
+    assert "idx_users_due_morning" in " ".join(row["detail"] for row in plan)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rebuilds_from_db_and_fires_due(db: None, fake_bot) -> None:
+    """Only reminders inside the horizon are loaded; due ones fire and reschedule."""
+    due = await _due_user(3001)
+    soon = datetime.utcnow() + timedelta(minutes=5)
+    await _due_user(3002, next_morning_reminder_at=soon)
+    await _due_user(3003, next_morning_reminder_at=soon + timedelta(hours=5))
+    scheduler = reminders.ReminderScheduler(timedelta(minutes=30))
+
+    assert await scheduler.rebuild() == 2
+
+    stats = await scheduler.fire_due()
+
+    assert stats["morning_sent"] == 1
+    assert fake_bot.sent == [3001]
+    assert len(scheduler) == 1
+    await due.refresh_from_db()
+    assert due.next_morning_reminder_at.replace(tzinfo=None) > datetime.utcnow()
+
+
+@pytest.mark.asyncio
+async def test_sharded_scheduler_requeues_leased_reminders(db: None, fake_bot) -> None:
+    """A shard scheduler fires only its users and re-queues rows leased elsewhere."""
+    now = datetime.utcnow()
+    await _due_user(3201)  # другой шард
+    await _due_user(3202)
+    leased = await _due_user(3204, next_morning_reminder_at=now - timedelta(minutes=5))
+    scheduler = reminders.ReminderScheduler(timedelta(minutes=30), Shard(0, 2))
+    assert await scheduler.rebuild() == 2
+
+    # Другая реплика успела захватить самую раннюю строку шарда
+    lease_until = now + timedelta(minutes=10)
+    claimed = await reminder_repo.claim_due_reminders(
+        "morning", now, lease_until, limit=1, shard=Shard(0, 2)
+    )
+    assert [r.telegram_id for r in claimed] == [leased.telegram_id]
+
+    stats = await scheduler.fire_due()
+
+    assert stats["morning_sent"] == 1
+    assert fake_bot.sent == [3202]
+    assert len(scheduler) == 1
+    await leased.refresh_from_db()
+    assert scheduler.next_due_at() == leased.next_morning_reminder_at.replace(
+        tzinfo=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_setup_user_reminders_updates_scheduler(
+    db: None, fake_bot, monkeypatch
+) -> None:
+    """A changed reminder time moves the heap entry; the stale one is skipped."""
+    user = await _due_user(3101, next_evening_reminder_at=None)
+    scheduler = reminders.ReminderScheduler(timedelta(days=2))
+    monkeypatch.setattr(reminders, "_scheduler", scheduler)
+    await scheduler.rebuild()
+    assert scheduler.next_due_at() is not None
+
+    await reminders.setup_user_reminders(user)
+
+    assert len(scheduler) == 2
+    assert scheduler.pop_due(datetime.utcnow()) == []
+    assert scheduler.next_due_at() == min(
+        user.next_morning_reminder_at, user.next_evening_reminder_at
+    )
+
+    user.reminders_enabled = False
+    await reminders.setup_user_reminders(user)
+
+    assert len(scheduler) == 0
+    assert scheduler.next_due_at() is None
+
+
+@pytest.mark.asyncio
+async def test_blocked_user_is_marked_unreachable(db: None, fake_bot) -> None:
+    """Blocked users are not retried and drop out of the due set."""
+    fake_bot.blocked_chat_ids = {6001}
+    blocked = await _due_user(6001)
+    await _due_user(6002)
+
+    stats = await reminders.process_reminders()
+
+    assert stats["unreachable"] == 1
+    assert stats["retry_scheduled"] == 0
+    await blocked.refresh_from_db()
+    assert blocked.is_reachable is False
+    assert blocked.unreachable_reason == "blocked"
+    assert blocked.next_morning_reminder_at is None
+    assert blocked.next_evening_reminder_at is None
+    delivery = await ReminderOutbox.get(user=blocked)
+    assert (delivery.status, delivery.error_kind) == ("failed", "blocked")
+
+
+@pytest.mark.asyncio
+async def test_inbound_update_reactivates_user(db: None, fake_bot) -> None:
+    """Any update from an unreachable user clears the flag and reschedules."""
+    user = await _due_user(
+        6101,
+        is_reachable=False,
+        unreachable_reason="blocked",
+        next_morning_reminder_at=None,
+        next_evening_reminder_at=None,
+    )
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    middleware = ReachabilityMiddleware()
+    from_user = TelegramUser(id=6101, is_bot=False, first_name="Test")
+    await middleware(handler, object(), {"event_from_user": from_user})
+
+    assert len(handled) == 1
+    await user.refresh_from_db()
+    assert user.is_reachable is True
+    assert user.unreachable_reason is None
+    assert user.next_morning_reminder_at is not None
+    assert user.next_evening_reminder_at is not None
+
+
+def test_reminder_jitter_is_deterministic_and_bounded() -> None:
+    """Each user keeps the same shift; shifts cover ±7 min roughly evenly."""
+    spread = reminders.config.REMINDER_JITTER_MINUTES
+    shifts = [reminders.reminder_jitter(user_id) for user_id in range(1, 3001)]
+
+    assert shifts == [reminders.reminder_jitter(user_id) for user_id in range(1, 3001)]
+    per_minute = Counter(shift // timedelta(minutes=1) for shift in shifts)
+    assert set(per_minute) == set(range(-spread, spread + 1))
+    expected = len(shifts) / (2 * spread + 1)
+    assert all(abs(n - expected) < expected * 0.35 for n in per_minute.values())
+
+
+def test_calculate_next_reminder_time_applies_user_jitter() -> None:
+    """The jittered slot is base time + shift and still strictly in the future."""
+    now = datetime(2025, 12, 13, 5, 0)
+    for user_id in range(1, 50):
+        shift = reminders.reminder_jitter(user_id)
+        next_at = reminders.calculate_next_reminder_time("09:00", 3, now, user_id)
+
+        assert next_at == datetime(2025, 12, 13, 6, 0) + shift
+
+    # Right after the send the next slot is tomorrow, with the same shift
+    sent_at = datetime(2025, 12, 13, 6, 0) + reminders.reminder_jitter(7)
+    assert reminders.calculate_next_reminder_time(
+        "09:00", 3, sent_at, 7
+    ) == sent_at + timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_tick_records_lateness_and_failure_metrics(db: None, fake_bot) -> None:
+    """Each delivery observes its lateness; failures are counted by error class."""
+    metrics.reset_all()
+    fake_bot.blocked_chat_ids = {7002}
+    await _due_user(
+        7001, next_morning_reminder_at=datetime.utcnow() - timedelta(minutes=3)
+    )
+    await _due_user(7002)
+
+    stats = await reminders.process_reminders()
+
+    assert 180 <= stats["lateness_max_sec"] < 300
+    assert reminders.REMINDER_LATENESS.count(kind="morning") == 1
+    assert reminders.REMINDER_LATENESS.quantile(0.5, kind="morning") == 300
+    assert reminders.REMINDER_USERS_SCANNED.value(kind="morning") == 2
+    assert reminders.REMINDER_SENT.value(kind="morning") == 1
+    assert reminders.REMINDER_FAILURES.value(error_class="blocked") == 1
+    assert reminders.REMINDER_TICK_DURATION.count() == 1
+    assert "reminder_lateness_seconds_bucket" in metrics.render_prometheus()
+
+
+@pytest.mark.asyncio
+async def test_catch_up_skips_stale_and_merges_pairs(db: None, fake_bot) -> None:
+    """After downtime: stale reminders are only rescheduled, fresh pairs merge."""
+    now = datetime.utcnow()
+    # Morning is stale, evening fresh -> only the evening reminder goes out
+    partly_stale = await _due_user(
+        8001,
+        next_morning_reminder_at=now - timedelta(hours=10),
+        next_evening_reminder_at=now - timedelta(minutes=2),
+    )
+    # Both fresh (custom close-by times) -> one digest message
+    pair = await _due_user(
+        8002,
+        next_morning_reminder_at=now - timedelta(minutes=40),
+        next_evening_reminder_at=now - timedelta(minutes=5),
+    )
+    # Both stale -> nothing is sent
+    all_stale = await _due_user(
+        8003,
+        next_morning_reminder_at=now - timedelta(hours=14),
+        next_evening_reminder_at=now - timedelta(hours=5),
+    )
+
+    stats = await reminders.process_reminders()
+
+    assert sorted(fake_bot.sent) == [8001, 8002]
+    assert fake_bot.texts[8002] == reminders.DIGEST_REMINDER_TEXT
+    assert stats["evening_sent"] == 1
+    assert stats["digest_sent"] == 1
+    assert stats["morning_sent"] == 0
+    assert stats["skipped_stale"] == 3
+    assert stats["merged"] == 2
+    assert await ReminderOutbox.filter(user_id=pair.id).count() == 1
+
+    for user in (partly_stale, pair, all_stale):
+        await user.refresh_from_db()
+        assert reminders._as_naive_utc(user.next_morning_reminder_at) > now
+        assert reminders._as_naive_utc(user.next_evening_reminder_at) > now
+
+
+@pytest.mark.asyncio
+async def test_shard_processes_only_its_slice(db: None, fake_bot) -> None:
+    """A shard sends only telegram_id % count == index; the rest stay due."""
+    users = [await _due_user(9000 + i) for i in range(12)]
+
+    stats = await reminders.process_reminders(reminder_repo.Shard(1, 3))
+
+    mine = sorted(u.telegram_id for u in users if u.telegram_id % 3 == 1)
+    assert sorted(fake_bot.sent) == mine
+    assert stats["morning_sent"] == len(mine)
+    assert await User.filter(
+        next_morning_reminder_at__lte=datetime.utcnow()
+    ).count() == len(users) - len(mine)
+
+
+@pytest.mark.asyncio
+async def test_sharded_tick_covers_all_users_once(db: None, fake_bot) -> None:
+    """N concurrent shards together deliver every due reminder exactly once."""
+    users = [await _due_user(9100 + i) for i in range(17)]
+
+    stats = await reminders.process_reminders_sharded(4)
+
+    assert stats["shards"] == 4
+    assert stats["morning_sent"] == len(users)
+    assert sorted(fake_bot.sent) == sorted(u.telegram_id for u in users)
+    assert await ReminderOutbox.filter(status="sent").count() == len(users)
+
+
+def test_shard_rejects_index_out_of_range() -> None:
+    with pytest.raises(ValueError):
+        reminder_repo.Shard(3, 3)
+
+
+def test_next_reminder_uses_zone_offset_of_reminder_date() -> None:
+    """Europe/Berlin switches to CEST on 2026-03-29: 09:00 local is 07:00 UTC."""
+    before_switch = datetime(2026, 3, 28, 12, 0)
+
+    assert reminders.calculate_next_reminder_time(
+        "09:00", 1, before_switch, tz_name="Europe/Berlin"
+    ) == datetime(2026, 3, 29, 7, 0)
+    # The fixed offset drifts by an hour
+    assert reminders.calculate_next_reminder_time(
+        "09:00", 1, before_switch
+    ) == datetime(2026, 3, 29, 8, 0)
+    # Half-hour zone
+    assert reminders.calculate_next_reminder_time(
+        "09:00", 5, before_switch, tz_name="Asia/Kolkata"
+    ) == datetime(2026, 3, 29, 3, 30)
+
+
+@pytest.mark.asyncio
+async def test_dst_job_reschedules_only_transitioning_zones(db: None) -> None:
+    """Users in a zone with an upcoming clock change are recomputed in bulk."""
+    now = datetime(2026, 3, 28, 12, 0)
+    stale_next = datetime(2026, 3, 29, 8, 0)  # computed with the winter offset
+    berlin = [
+        await _due_user(
+            13000 + i,
+            timezone="Europe/Berlin",
+            timezone_offset=1,
+            next_morning_reminder_at=stale_next,
+            next_evening_reminder_at=None,
+        )
+        for i in range(3)
+    ]
+    tokyo = await _due_user(
+        13100,
+        timezone="Asia/Tokyo",
+        timezone_offset=9,
+        next_morning_reminder_at=stale_next,
+        next_evening_reminder_at=None,
+    )
+
+    counts = await reminders.reschedule_dst_zones(now)
+
+    assert counts["zones"] == 1
+    assert counts["rescheduled"] == len(berlin)
+    for user in berlin:
+        await user.refresh_from_db()
+        assert reminders._as_naive_utc(
+            user.next_morning_reminder_at
+        ) == reminders.calculate_next_reminder_time(
+            "09:00", 1, now, user.id, "Europe/Berlin"
+        )
+    await tokyo.refresh_from_db()
+    assert reminders._as_naive_utc(tokyo.next_morning_reminder_at) == stale_next
+
+
+@pytest.mark.asyncio
+async def test_set_user_timezone_validates_and_reschedules(db: None) -> None:
+    user = await User.create(telegram_id=13200)
+
+    with pytest.raises(ValueError):
+        await reminders.set_user_timezone(user, "Mars/Olympus")
+
+    await reminders.set_user_timezone(user, "Asia/Kolkata")
+    await user.refresh_from_db()
+    assert user.timezone == "Asia/Kolkata"
+    assert user.timezone_offset == 5
+    local = reminders._as_naive_utc(user.next_morning_reminder_at) + timedelta(
+        hours=5, minutes=30
+    )
+    assert abs(
+        local - local.replace(hour=9, minute=0, second=0, microsecond=0)
+    ) <= timedelta(minutes=7)
+
+
+@pytest.mark.asyncio
+async def test_load_test_harness_counts_queries_per_send(db: None, monkeypatch) -> None:
+    """The load-test fake bot and query counter work against a real tick."""
+    from src.scripts.load_test_reminders import FakeBot as LoadBot
+    from src.scripts.load_test_reminders import QueryCounter
+
+    bot = LoadBot(latency_ms=0, error_rate=0, blocked_rate=0)
+    monkeypatch.setattr(reminders, "_bot", bot)
+    monkeypatch.setattr(reminders, "_rate_limiter", reminders.TokenBucket(rate=1000))
+    for i in range(10):
+        await _due_user(14000 + i)
+
+    with QueryCounter() as queries:
+        await reminders.process_reminders()
+
+    assert bot.sent == 10
+    # Claims, outbox and reschedule are batched: far fewer queries than sends
+    assert 0 < queries.count < 2 * bot.sent
+
+
+@pytest.mark.asyncio
+async def test_fan_out_survives_failed_sent_marking(
+    db: None, fake_bot, monkeypatch
+) -> None:
+    """A failed mark_sent neither kills the tick nor loses the sent deliveries."""
+    monkeypatch.setattr(reminders.config, "REMINDER_BATCH_SIZE", 2)
+    users = [await _due_user(7100 + i) for i in range(5)]
+    mark_sent = outbox_repo.mark_sent
+    calls = 0
+
+    async def flaky_mark_sent(ids, sent_at):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("db blip")
+        return await mark_sent(ids, sent_at)
+
+    monkeypatch.setattr(outbox_repo, "mark_sent", flaky_mark_sent)
+    tasks_before = asyncio.all_tasks()
+
+    stats = await reminders.process_reminders()
+
+    assert asyncio.all_tasks() == tasks_before
+    assert stats["morning_sent"] == 5
+    assert sorted(fake_bot.sent) == [u.telegram_id for u in users]
+    statuses = await ReminderOutbox.all().values_list("status", flat=True)
+    assert statuses == ["sent"] * 5
@@ -0,0 +1,311 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from tortoise import Tortoise
+
+from src.core.use_cases.complete_step import CompleteStepUseCase
+from src.core.use_cases.skip_step import SkipStepUseCase
+from src.database.migrations import apply_schema_updates
+from src.database.models import DailyLog, Goal, Stage, Step, User
+from src.scripts.backfill_step_owner import backfill
+from src.scripts.check_stages import check_active_stages, check_counters
+from src.scripts.recalc_progress import recalculate_all_stages
+from src.storage import goal_repo, stage_repo, step_repo, user_repo
+
+
+async def _stage(telegram_id: int) -> tuple[User, Goal, Stage]:
+    user = await User.create(telegram_id=telegram_id)
+    goal = await Goal.create(
+        user=user,
+        title="Цель",
+        start_date=date.today(),
+        deadline=date.today() + timedelta(days=14),
+        status="active",
+    )
+    stage = await Stage.create(
+        goal=goal,
+        title="Этап",
+        order=1,
+        start_date=date.today(),
+        end_date=goal.deadline,
+        status="active",
+    )
+    return user, goal, stage
+
+
+async def _create_steps(goal: Goal, stage: Stage, count: int) -> list[Step]:
+    return [
+        await step_repo.create_step(
+            stage_id=stage.id,
+            goal_id=goal.id,
+            user_id=goal.user_id,
+            title=f"Шаг {i}",
+            difficulty="easy",
+            estimated_minutes=5,
+            xp_reward=10,
+            scheduled_date=date.today(),
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_create_step_sets_owner_and_history_uses_it(db: None) -> None:
+    """History is read by the denormalized owner, newest completion first."""
+    user, goal, stage = await _stage(16001)
+    other, other_goal, other_stage = await _stage(16002)
+    now = datetime.utcnow()
+
+    created = []
+    for i in range(3):
+        step = await step_repo.create_step(
+            stage_id=stage.id,
+            goal_id=goal.id,
+            user_id=goal.user_id,
+            title=f"Шаг {i}",
+            difficulty="easy",
+            estimated_minutes=5,
+            xp_reward=10,
+            scheduled_date=date.today(),
+        )
+        created.append(step)
+    await Step.filter(id=created[0].id).update(
+        status="completed", completed_at=now - timedelta(hours=2)
+    )
+    await Step.filter(id=created[1].id).update(status="completed", completed_at=now)
+    await Step.create(
+        stage=other_stage,
+        goal=other_goal,
+        user=other,
+        title="Чужой",
+        status="completed",
+        completed_at=now,
+    )
+
+    assert (created[0].user_id, created[0].goal_id) == (user.id, goal.id)
+    history = await step_repo.get_history(user.id, limit=10)
+    assert [s.id for s in history] == [created[1].id, created[0].id]
+    assert [s.id for s in await step_repo.get_history(user.id, limit=1)] == [
+        created[1].id
+    ]
+
+
+@pytest.mark.asyncio
+async def test_backfill_fills_owner_in_batches(db: None) -> None:
+    """Legacy steps without owner are filled from stage -> goal, batch by batch."""
+    user, goal, stage = await _stage(16003)
+    other, other_goal, other_stage = await _stage(16004)
+    legacy = [await Step.create(stage=stage, title=f"Шаг {i}") for i in range(5)]
+    legacy.append(await Step.create(stage=other_stage, title="Чужой"))
+
+    assert await backfill(batch_size=2) == 6
+    assert await backfill(batch_size=2) == 0
+
+    owners = dict(await Step.all().values_list("id", "user_id"))
+    goals = dict(await Step.all().values_list("id", "goal_id"))
+    assert [owners[s.id] for s in legacy] == [user.id] * 5 + [other.id]
+    assert [goals[s.id] for s in legacy] == [goal.id] * 5 + [other_goal.id]
+
+
+@pytest.mark.asyncio
+async def test_startup_backfills_legacy_owner_for_history(db: None) -> None:
+    """Schema updates fill the owner, so legacy steps show up in history."""
+    user, _, stage = await _stage(16005)
+    legacy = await Step.create(
+        stage=stage, title="Старый", status="completed", completed_at=datetime.now()
+    )
+    assert await step_repo.get_history(user.id, limit=10) == []
+
+    await apply_schema_updates()
+
+    assert [s.id for s in await step_repo.get_history(user.id, limit=10)] == [legacy.id]
+
+
+@pytest.mark.asyncio
+async def test_stage_counters_drive_progress_and_status(db: None) -> None:
+    """Counters follow step transitions; a repeated completion is rejected."""
+    user, goal, stage = await _stage(16005)
+    first, second, third = await _create_steps(goal, stage, 3)
+    stale = await step_repo.get_step(first.id)
+
+    assert (await CompleteStepUseCase().execute(first.id, user)).success
+    assert (await SkipStepUseCase().execute(second.id, user, "нет сил")).success
+
+    stage = await stage_repo.get_stage(stage.id)
+    assert (stage.total_count, stage.completed_count, stage.skipped_count) == (
+        3,
+        1,
+        1,
+    )
+    assert (stage.progress, stage.status) == (33, "active")
+
+    # A concurrent request still holding the step as pending loses the race
+    assert stale.status == "pending"
+    assert not await step_repo.mark_completed(stale)
+    assert (await stage_repo.get_stage(stage.id)).completed_count == 1
+
+    assert (await CompleteStepUseCase().execute(third.id, user)).success
+    stage = await stage_repo.get_stage(stage.id)
+    assert (stage.progress, stage.status) == (66, "completed")
+
+
+@pytest.mark.asyncio
+async def test_check_stages_reconciles_counter_drift(db: None) -> None:
+    """Drift from writes that bypass step_repo is reported, then fixed by --fix."""
+    _, goal, stage = await _stage(16006)
+    _, other_goal, other_stage = await _stage(16007)
+    steps = await _create_steps(goal, stage, 2)
+    await _create_steps(other_goal, other_stage, 1)
+    await Step.filter(id=steps[0].id).update(status="completed")
+    await Step.create(stage=stage, title="Мимо репозитория")
+
+    [drift] = await stage_repo.find_counter_drift()
+    assert drift.stage_id == stage.id
+    assert (drift.total_count, drift.completed_count) == (2, 0)
+    assert (drift.actual_total, drift.actual_completed) == (3, 1)
+
+    assert await check_counters(fix=False) == 1
+    assert await check_counters(fix=True) == 1
+    assert await stage_repo.find_counter_drift() == []
+    stage = await stage_repo.get_stage(stage.id)
+    assert (stage.total_count, stage.completed_count) == (3, 1)
+
+
+@pytest.mark.asyncio
+async def test_recalc_progress_updates_changed_stages_in_batches(db: None) -> None:
+    """Dry run only reports; the real run fixes stale progress batch by batch."""
+    _, goal, stage = await _stage(16008)
+    _, other_goal, other_stage = await _stage(16009)
+    _, _, empty_stage = await _stage(16010)
+    steps = await _create_steps(goal, stage, 2)
+    await _create_steps(other_goal, other_stage, 1)
+    await Step.filter(id=steps[0].id).update(status="completed")
+
+    assert await recalculate_all_stages(batch_size=1, dry_run=True) == 1
+    assert (await stage_repo.get_stage(stage.id)).progress == 0
+
+    assert await recalculate_all_stages(batch_size=1) == 1
+    stage = await stage_repo.get_stage(stage.id)
+    assert (stage.progress, stage.status) == (50, "active")
+    assert (await stage_repo.get_stage(other_stage.id)).progress == 0
+    assert (await stage_repo.get_stage(empty_stage.id)).progress == 0
+    assert await recalculate_all_stages(batch_size=1) == 0
+
+
+@pytest.mark.asyncio
+async def test_recalc_progress_moves_active_stage_pointer(db: None) -> None:
+    """Status changes made by recalc keep Goal.active_stage_id consistent."""
+    finished_user = await User.create(telegram_id=16015)
+    started_user = await User.create(telegram_id=16016)
+    stages = []
+    for user, status in ((finished_user, "active"), (started_user, "pending")):
+        goal = await Goal.create(
+            user=user,
+            title="Цель",
+            start_date=date.today(),
+            deadline=date.today() + timedelta(days=14),
+            status="active",
+        )
+        stage = await goal_repo.create_stage(
+            goal=goal,
+            title="Этап",
+            order=1,
+            start_date=date.today(),
+            end_date=goal.deadline,
+            status=status,
+        )
+        steps = await _create_steps(goal, stage, 2)
+        # Step statuses change behind the counters, as in legacy data
+        await Step.filter(id=steps[0].id).update(status="completed")
+        if status == "active":
+            await Step.filter(id=steps[1].id).update(status="skipped")
+        stages.append(stage)
+
+    assert await recalculate_all_stages(batch_size=1) == 2
+
+    finished, started = [await stage_repo.get_stage(stage.id) for stage in stages]
+    assert (finished.status, finished.goal.active_stage_id) == ("completed", None)
+    assert (started.status, started.goal.active_stage_id) == ("active", started.id)
+    assert await stage_repo.find_active_stage_conflicts() == []
+
+
+@pytest.mark.asyncio
+async def test_check_stages_repairs_active_stage_pointer(db: None) -> None:
+    """Several active stages collapse to the pointed one; a missing pointer is set."""
+    _, goal, stage = await _stage(16011)
+    _, other_goal, other_stage = await _stage(16012)
+    extra = await Stage.create(
+        goal=goal,
+        title="Этап 2",
+        order=2,
+        start_date=date.today(),
+        end_date=goal.deadline,
+        status="active",
+    )
+    await Goal.filter(id=goal.id).update(active_stage_id=stage.id)
+
+    conflicts = await stage_repo.find_active_stage_conflicts()
+    assert [(c.goal_id, c.active_count) for c in conflicts] == [
+        (goal.id, 2),
+        (other_goal.id, 1),
+    ]
+
+    assert await check_active_stages(fix=True) == 2
+    assert await stage_repo.find_active_stage_conflicts() == []
+    assert (await Stage.get(id=extra.id)).status == "pending"
+    assert (await goal_repo.get_active_stage(goal.id)).id == stage.id
+    assert (await goal_repo.get_active_stage(other_goal.id)).id == other_stage.id
+
+
+@pytest.mark.asyncio
+async def test_complete_step_rolls_back_as_one_unit(db: None, monkeypatch) -> None:
+    """A failure late in the use case leaves step, stage and daily log untouched."""
+    user, goal, stage = await _stage(16013)
+    (step,) = await _create_steps(goal, stage, 1)
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(user_repo, "update_xp_and_streak", fail)
+    monkeypatch.setattr(user_repo, "update_xp", fail)
+    with pytest.raises(RuntimeError):
+        await CompleteStepUseCase().execute(step.id, user)
+
+    assert (await Step.get(id=step.id)).status == "pending"
+    stage = await stage_repo.get_stage(stage.id)
+    assert (stage.completed_count, stage.progress, stage.status) == (0, 0, "active")
+    assert not await DailyLog.exists(user=user)
+
+
+@pytest.mark.asyncio
+async def test_complete_step_finishing_stage_runs_without_savepoints(db: None) -> None:
+    """The stage status change reuses the unit of work instead of nesting one."""
+    user, goal, stage = await _stage(16017)
+    (step,) = await _create_steps(goal, stage, 1)
+    statements: list[str] = []
+    conn = Tortoise.get_connection("default")
+    await conn._connection.set_trace_callback(statements.append)
+    try:
+        result = await CompleteStepUseCase().execute(step.id, user)
+    finally:
+        await conn._connection.set_trace_callback(None)
+
+    assert result.success
+    assert (await stage_repo.get_stage(stage.id)).status == "completed"
+    assert not [sql for sql in statements if "SAVEPOINT" in sql.upper()]
+
+
+@pytest.mark.asyncio
+async def test_complete_step_without_stage_fails_cleanly(db: None, monkeypatch) -> None:
+    """A stage that vanished under the lock is a failure result, not a crash."""
+    user, goal, stage = await _stage(16018)
+    (step,) = await _create_steps(goal, stage, 1)
+
+    async def missing(stage_id: int) -> None:
+        return None
+
+    monkeypatch.setattr(stage_repo, "get_stage_for_update", missing)
+    result = await CompleteStepUseCase().execute(step.id, user)
+
+    assert not result.success
+    assert (await Step.get(id=step.id)).status == "pending"
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from src.database.models import User
+from src.storage import user_repo
+
+
+@pytest.mark.asyncio
+async def test_concurrent_xp_increments_are_not_lost(db: None) -> None:
+    """Stale in-memory copies still add up: the increment happens in the DB."""
+    await User.create(telegram_id=14001, xp=10)
+    copies = [await User.get(telegram_id=14001) for _ in range(5)]
+
+    await asyncio.gather(*(user_repo.update_xp(copy, 20) for copy in copies))
+
+    assert (await User.get(telegram_id=14001)).xp == 110
+    assert max(copy.xp for copy in copies) == 110
+
+
+@pytest.mark.asyncio
+async def test_streak_is_counted_once_per_day(db: None) -> None:
+    """The second update for the same day adds XP but keeps the streak."""
+    today = date.today()
+    user = await User.create(
+        telegram_id=14002, streak_days=3, streak_last_date=today - timedelta(days=1)
+    )
+    stale = await User.get(id=user.id)
+
+    user = await user_repo.update_xp_and_streak(user, 20, 4, today)
+    # A parallel completion computed its streak from the pre-update row
+    stale = await user_repo.update_xp_and_streak(stale, 20, 4, today)
+    later = await user_repo.update_xp_and_streak(stale, 20, 1, today)
+
+    assert (user.xp, user.streak_days) == (20, 4)
+    assert (later.xp, later.streak_days, later.streak_last_date) == (60, 4, today)
+    saved = await User.get(id=user.id)
+    assert (saved.xp, saved.streak_days, saved.streak_last_date) == (60, 4, today)
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_is_one_race_free_upsert(db: None) -> None:
+    """Concurrent first touches create one user; profile fields are insert-only."""
+    users = await asyncio.gather(
+        *(user_repo.get_or_create_user(14003, username=f"name{i}") for i in range(5))
+    )
+
+    assert len({user.id for user in users}) == 1
+    assert await User.filter(telegram_id=14003).count() == 1
+    stored = await User.get(telegram_id=14003)
+    assert {user.username for user in users} == {stored.username}
+    assert (stored.xp, stored.reminders_enabled) == (0, True)